@@ -1,11 +1,12 @@
 from django.contrib import admin
 from django.contrib.admin import AdminSite
 from django.utils.translation import gettext_lazy as _
-from django.contrib.admin.models import LogEntry
-from django.db.models import Count
 from appointment.models import Appointment, MedicalReport, Prescription
 from backapp.models import User
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from . import dashboard
+from .large_tables import AutocompleteFilter, LargeTableAdminMixin
+from appointment.transitions import transition_action
 
 # Register your models here.
 
@@ -18,17 +19,11 @@ class ZenCareAdminSite(AdminSite):
         """
         Customize the admin index page with additional context data.
         """
-        # Get model counts for the dashboard stats
-        model_count = {
-            'users': User.objects.count(),
-            'doctors': User.objects.filter(user_type='doctor').count(),
-            'appointments': Appointment.objects.count(),
-            'reports': MedicalReport.objects.count(),
-            'prescriptions': Prescription.objects.count()
-        }
+        # Counters maintained by signals, not COUNT(*) over the big tables
+        model_count = dashboard.counts()
 
-        # Get recent actions for the activity feed
-        recent_actions = LogEntry.objects.select_related('content_type', 'user')[:20]
+        # Cached activity feed, dropped whenever a new action is logged
+        recent_actions = dashboard.recent_actions()
 
         context = {
             'model_count': model_count,
@@ -44,7 +39,7 @@ class ZenCareAdminSite(AdminSite):
 zencare_admin = ZenCareAdminSite(name='zencare_admin')
 
 # Custom User Admin
-class CustomUserAdmin(BaseUserAdmin):
+class CustomUserAdmin(LargeTableAdminMixin, BaseUserAdmin):
     list_display = ('email', 'first_name', 'last_name', 'user_type', 'is_active')
     list_filter = ('user_type', 'is_active')
     search_fields = ('email', 'first_name', 'last_name')
@@ -73,21 +68,34 @@ class CustomUserAdmin(BaseUserAdmin):
             return self.fieldsets + self.doctor_fieldsets
         return self.fieldsets
 
-class AppointmentAdmin(admin.ModelAdmin):
+class AppointmentAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'patient', 'doctor', 'appointment_date', 'status')
-    list_filter = ('status', 'appointment_date')
-    search_fields = ('patient__email', 'doctor__email')
+    list_filter = ('status', 'appointment_date', ('doctor', AutocompleteFilter))
+    search_fields = ('=id', 'patient__email', 'doctor__email')
     ordering = ('-appointment_date',)
+    actions = [
+        transition_action('confirmed', 'Confirm selected appointments'),
+        transition_action('completed', 'Mark selected appointments completed'),
+        transition_action('cancelled', 'Cancel selected appointments'),
+    ]
 
-class MedicalReportAdmin(admin.ModelAdmin):
+class MedicalReportAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'appointment', 'created_at')
-    search_fields = ('appointment__patient__email', 'appointment__doctor__email')
+    # Appointment.__str__ shows the doctor's name
+    list_select_related = ('appointment__doctor',)
+    search_fields = ('=id', 'appointment__patient__email', 'appointment__doctor__email')
     ordering = ('-created_at',)
 
-class PrescriptionAdmin(admin.ModelAdmin):
+class PrescriptionAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'appointment', 'created_at')
-    search_fields = ('appointment__patient__email', 'appointment__doctor__email')
+    # Appointment.__str__ shows the doctor's name
+    list_select_related = ('appointment__doctor',)
+    search_fields = ('=id', 'appointment__patient__email', 'appointment__doctor__email')
     ordering = ('-created_at',)
+    actions = [
+        transition_action('completed', 'Mark selected prescriptions completed'),
+        transition_action('cancelled', 'Cancel selected prescriptions'),
+    ]
 
 # Register all models with the custom admin site
 zencare_admin.register(User, CustomUserAdmin)
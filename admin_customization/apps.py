@@ -1,3 +1,5 @@
+import logging
+
 from django.apps import AppConfig
 from django.contrib import admin
 
@@ -17,5 +19,8 @@ class AdminCustomizationConfig(AppConfig):
             
             # Replace the default admin site
             admin.site = zencare_admin
-        except Exception as e:
-            print(f"Error in admin_customization.apps.ready(): {e}")
+            
+            # Keep the dashboard counters current
+            import admin_customization.signals  # noqa
+        except Exception:
+            logging.getLogger(__name__).exception('Error in admin_customization.apps.ready()')
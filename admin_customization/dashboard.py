@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.contrib.admin.models import LogEntry
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from appointment.models import Appointment, MedicalReport, Prescription
+from backapp.models import User
+from .models import DashboardCounter
+
+DEFAULTS = {
+    # Seconds the activity feed may be served from cache; it's also
+    # invalidated whenever an admin action is logged
+    'FEED_TIMEOUT': 300,
+    'FEED_SIZE': 20,
+}
+
+FEED_KEY = 'admin_dashboard:recent_actions'
+
+# Counter name -> the rows it counts
+COUNTERS = {
+    'users': lambda: User.objects.all(),
+    'doctors': lambda: User.objects.filter(user_type='doctor'),
+    'appointments': lambda: Appointment.objects.all(),
+    'reports': lambda: MedicalReport.objects.all(),
+    'prescriptions': lambda: Prescription.objects.all(),
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'ADMIN_DASHBOARD', {}).get(name, DEFAULTS[name])
+
+
+def bump(name, delta=1):
+    """
+    Adjust a counter in the caller's transaction, so a rollback undoes it.
+    A counter without a row yet is left alone; counts() seeds it exactly.
+    """
+    if delta:
+        DashboardCounter.objects.filter(name=name).update(value=F('value') + delta)
+
+
+def reconcile(names=None):
+    """Recount with COUNT(*) and store the exact values. Returns {name: (old, new)}."""
+    changes = {}
+    for name in names or COUNTERS:
+        with transaction.atomic():
+            counter, _ = DashboardCounter.objects.select_for_update().get_or_create(name=name)
+            exact = COUNTERS[name]().count()
+            changes[name] = (counter.value, exact)
+            counter.value = exact
+            counter.reconciled_at = timezone.now()
+            counter.save(update_fields=['value', 'reconciled_at'])
+    return changes
+
+
+def counts():
+    """Every dashboard count in one small query; missing counters are seeded first."""
+    values = dict(DashboardCounter.objects.values_list('name', 'value'))
+    missing = [name for name in COUNTERS if name not in values]
+    if missing:
+        values.update({name: new for name, (_, new) in reconcile(missing).items()})
+    return {name: values[name] for name in COUNTERS}
+
+
+def recent_actions():
+    entries = cache.get(FEED_KEY)
+    if entries is None:
+        entries = list(LogEntry.objects.select_related('content_type', 'user')[:get_setting('FEED_SIZE')])
+        cache.set(FEED_KEY, entries, get_setting('FEED_TIMEOUT'))
+    return entries
+
+
+def invalidate_recent_actions():
+    cache.delete(FEED_KEY)
@@ -0,0 +1,272 @@
+"""
+Admin changelists that stay fast on tables with millions of rows.
+
+LargeTableAdminMixin avoids the usual full-table work of the stock
+changelist: it joins the related objects shown in list_display, counts
+approximately, pages forward with a keyset cursor instead of OFFSET, and
+turns search into prefix matches. AutocompleteFilter filters on a foreign
+key without loading every related row into the sidebar.
+
+Prefix search compiles to UPPER(column) LIKE UPPER('term%') on PostgreSQL,
+which only an index on UPPER(column) text_pattern_ops can serve; the
+migrations add one for each searched column (backapp 0009, appointment
+0019). Searching a new column on a large table needs the same.
+"""
+import base64
+import json
+
+from django import forms
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.utils import get_fields_from_path, lookup_spawns_duplicates
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import ForeignKey, Q
+from django.utils.functional import cached_property
+from django.utils.text import smart_split, unescape_string_literal
+from django.utils.translation import gettext_lazy as _
+
+CURSOR_VAR = 'cursor'
+
+SEARCH_LOOKUPS = {'^': 'istartswith', '=': 'iexact', '@': 'search'}
+
+
+def estimated_row_count(queryset):
+    """The planner's row estimate for an unfiltered PostgreSQL table, else None."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                       [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    # -1 means the table was never analyzed
+    return row[0] if row and row[0] >= 0 else None
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Counts big unfiltered tables from pg_class and stops counting filtered
+    results at `count_limit`; `is_estimate` tells whether the count is exact.
+    """
+
+    def __init__(self, *args, estimate_threshold=100_000, count_limit=10_000, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.estimate_threshold = estimate_threshold
+        self.count_limit = count_limit
+        self.is_estimate = False
+
+    @cached_property
+    def count(self):
+        estimate = estimated_row_count(self.object_list)
+        if estimate is not None and estimate >= self.estimate_threshold:
+            self.is_estimate = True
+            return estimate
+        # COUNT(*) over a LIMITed subquery does bounded work
+        count = self.object_list.order_by()[:self.count_limit].count()
+        self.is_estimate = count >= self.count_limit
+        return count
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Pages forward with ?cursor=<last row's ordering values> rather than
+    ?p=<n>, so deep pages cost the same as the first. Falls back to plain
+    page numbers when the ordering isn't plain non-null model fields.
+    """
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Filter, sort and page links start from the top again
+        return super().get_query_string(new_params, [*(remove or ()), CURSOR_VAR])
+
+    @cached_property
+    def keyset_fields(self):
+        fields = []
+        for name in self.queryset.query.order_by:
+            if not isinstance(name, str):
+                return None
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            try:
+                field = self.lookup_opts.pk if name == 'pk' else self.lookup_opts.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or field.null:
+                return None
+            fields.append((field, descending))
+        return fields or None
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.result_count_is_estimate = self.paginator.is_estimate
+        self.cursor = request.GET.get(CURSOR_VAR)
+        if self.cursor and self.keyset_fields:
+            self.result_list = self.queryset.filter(self.after(self.decode(self.cursor)))[:self.list_per_page]
+            self.multi_page = True
+            self.can_show_all = False
+
+    def after(self, values):
+        condition = Q()
+        equal = Q()
+        for (field, descending), value in zip(self.keyset_fields, values):
+            lookup = f'{field.attname}__{"lt" if descending else "gt"}'
+            condition |= equal & Q(**{lookup: value})
+            equal &= Q(**{field.attname: value})
+        return condition
+
+    def encode(self, obj):
+        values = [getattr(obj, field.attname) for field, _ in self.keyset_fields]
+        return base64.urlsafe_b64encode(json.dumps(values, cls=DjangoJSONEncoder).encode()).decode()
+
+    def decode(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.keyset_fields):
+                raise ValueError(cursor)
+            return [field.to_python(value) for (field, _), value in zip(self.keyset_fields, values)]
+        except (ValueError, TypeError, ValidationError) as e:
+            raise IncorrectLookupParameters(e)
+
+    @cached_property
+    def next_page_url(self):
+        if not self.keyset_fields or self.show_all:
+            return None
+        # Evaluates result_list; the rows are cached for the template to reuse
+        rows = list(self.result_list)
+        if len(rows) < self.list_per_page:
+            return None
+        return self.get_query_string({CURSOR_VAR: self.encode(rows[-1])}, [PAGE_VAR])
+
+    @property
+    def first_page_url(self):
+        return self.get_query_string(remove=[PAGE_VAR])
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """
+    Foreign key filter with a search-as-you-type box backed by the admin's
+    autocomplete view. The related model's admin needs search_fields.
+
+        list_filter = [('doctor', AutocompleteFilter)]
+    """
+    template = 'admin/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.attname}__exact'
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.widget = AutocompleteSelect(field, model_admin.admin_site, attrs={'class': 'admin-autocomplete-filter'})
+        self.form_field = field.formfield(widget=self.widget, required=False)
+        value = self.used_parameters.get(self.lookup_kwarg)
+        self.lookup_val = value[-1] if isinstance(value, list) else value
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': changelist.get_query_string(remove=[self.lookup_kwarg]),
+            'display': _('All'),
+        }
+
+    def rendered_widget(self):
+        return self.form_field.widget.render(self.lookup_kwarg, self.lookup_val, attrs={
+            'id': f'id_filter_{self.field_path}',
+            'data-lookup': self.lookup_kwarg,
+        })
+
+
+class LargeTableAdminMixin:
+    """
+    Put in front of ModelAdmin for tables too big for the stock changelist.
+
+    - list_select_related defaults to the foreign keys in list_display
+    - counts are approximate past estimate_threshold / count_limit rows
+    - "Next" pages with a keyset cursor
+    - search fields without a lookup prefix match from the start (^), so
+      they don't turn into '%term%' scans
+    - search fields on related rows (patient__email) become a subquery on
+      the related table (fk IN (SELECT pk ...)), so the search doesn't join
+      and OR across tables
+    """
+    show_full_result_count = False
+    estimate_threshold = 100_000
+    count_limit = 10_000
+    change_list_template = 'admin/large_table_change_list.html'
+
+    def get_list_select_related(self, request):
+        if self.list_select_related is not False:
+            return self.list_select_related
+        related = []
+        for name in self.get_list_display(request):
+            try:
+                field = self.opts.get_field(name) if isinstance(name, str) else None
+            except FieldDoesNotExist:
+                continue
+            if isinstance(field, ForeignKey):
+                related.append(name)
+        return related or False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return ApproximateCountPaginator(
+            queryset, per_page, orphans, allow_empty_first_page,
+            estimate_threshold=self.estimate_threshold, count_limit=self.count_limit,
+        )
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_search_fields(self, request):
+        return [
+            name if name[0] in '^=@' else f'^{name}'
+            for name in super().get_search_fields(request)
+        ]
+
+    def get_search_results(self, request, queryset, search_term):
+        search_fields = self.get_search_fields(request)
+        if not search_fields or not search_term:
+            return queryset, False
+        may_have_duplicates = False
+        for term in smart_split(search_term):
+            if term.startswith(('"', "'")) and term[0] == term[-1]:
+                term = unescape_string_literal(term)
+            condition = Q()
+            for name in search_fields:
+                lookup, path = SEARCH_LOOKUPS[name[0]], name[1:]
+                fields = get_fields_from_path(self.model, path)
+                if lookup == 'iexact':
+                    try:
+                        fields[-1].to_python(term)
+                    except ValidationError:
+                        # Not a valid id (or date, ...), so it can't match
+                        continue
+                relation, _, column = path.rpartition('__')
+                if not relation:
+                    condition |= Q(**{f'{path}__{lookup}': term})
+                    continue
+                related = fields[-1].model._default_manager.filter(**{f'{column}__{lookup}': term})
+                condition |= Q(**{f'{relation}__in': related.values('pk')})
+                may_have_duplicates |= lookup_spawns_duplicates(self.opts, path)
+            # A term nothing can match empties the result, as in the stock search
+            queryset = queryset.filter(condition) if condition else queryset.none()
+        return queryset, may_have_duplicates
+
+    @property
+    def media(self):
+        media = super().media
+        for list_filter in self.list_filter:
+            if isinstance(list_filter, (list, tuple)) and issubclass(list_filter[1], AutocompleteFilter):
+                field = self.opts.get_field(list_filter[0])
+                media += AutocompleteSelect(field, self.admin_site).media
+                media += forms.Media(js=['admin/js/autocomplete_filter.js'])
+                break
+        return media
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from admin_customization import dashboard
+
+
+class Command(BaseCommand):
+    help = 'Recount the admin dashboard counters exactly; run periodically (e.g. nightly from cron)'
+
+    def handle(self, *args, **options):
+        for name, (old, new) in dashboard.reconcile().items():
+            drift = f' (was {old}, drift {new - old:+d})' if old != new else ''
+            self.stdout.write(f'{name}: {new}{drift}')
+        dashboard.invalidate_recent_actions()
+        self.stdout.write(self.style.SUCCESS('Dashboard counters reconciled'))
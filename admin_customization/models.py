@@ -1,3 +1,14 @@
 from django.db import models
 
-# Create your models here.
+
+class DashboardCounter(models.Model):
+    """
+    Row counts shown on the admin dashboard, kept up to date by signals
+    (see admin_customization.dashboard) instead of COUNT(*) on every visit.
+    """
+    name = models.CharField(max_length=32, primary_key=True)
+    value = models.BigIntegerField(default=0)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
@@ -0,0 +1,60 @@
+from django.contrib.admin.models import LogEntry
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from appointment.models import Appointment, MedicalReport, Prescription
+from backapp.models import User
+from . import dashboard
+
+COUNTED_MODELS = {
+    Appointment: 'appointments',
+    MedicalReport: 'reports',
+    Prescription: 'prescriptions',
+}
+
+
+def counted_as_doctor(user):
+    # What the doctors counter currently assumes about this user
+    if hasattr(user, '_counted_as_doctor'):
+        return user._counted_as_doctor
+    return user._loaded_user_type == 'doctor'
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_save, sender=MedicalReport)
+@receiver(post_save, sender=Prescription)
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        dashboard.bump(COUNTED_MODELS[sender])
+
+
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=MedicalReport)
+@receiver(post_delete, sender=Prescription)
+def count_deleted(sender, instance, **kwargs):
+    dashboard.bump(COUNTED_MODELS[sender], -1)
+
+
+@receiver(post_save, sender=User)
+def count_user_saved(sender, instance, created, **kwargs):
+    if created:
+        dashboard.bump('users')
+    was_doctor = False if created else counted_as_doctor(instance)
+    is_doctor = instance.user_type == 'doctor'
+    if was_doctor != is_doctor:
+        dashboard.bump('doctors', 1 if is_doctor else -1)
+    instance._counted_as_doctor = is_doctor
+
+
+@receiver(post_delete, sender=User)
+def count_user_deleted(sender, instance, **kwargs):
+    dashboard.bump('users', -1)
+    if counted_as_doctor(instance) or (instance._loaded_user_type is None and instance.user_type == 'doctor'):
+        dashboard.bump('doctors', -1)
+
+
+@receiver(post_save, sender=LogEntry)
+@receiver(post_delete, sender=LogEntry)
+def refresh_recent_actions(sender, **kwargs):
+    transaction.on_commit(dashboard.invalidate_recent_actions)
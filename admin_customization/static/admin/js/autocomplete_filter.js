@@ -0,0 +1,16 @@
+'use strict';
+// Reload the changelist when a value is picked in an AutocompleteFilter
+{
+    const $ = django.jQuery;
+    $(document).on('change', 'select.admin-autocomplete-filter', function() {
+        const params = new URLSearchParams(window.location.search);
+        params.delete('p');
+        params.delete('cursor');
+        if (this.value) {
+            params.set(this.dataset.lookup, this.value);
+        } else {
+            params.delete(this.dataset.lookup);
+        }
+        window.location.search = params.toString();
+    });
+}
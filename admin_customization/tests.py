@@ -1,3 +1,155 @@
+from datetime import date, time
+from unittest import mock
+from django.contrib.admin.models import ADDITION, LogEntry
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from appointment.models import Appointment
+from backapp.models import User
+from . import dashboard
+from .models import DashboardCounter
 
-# Create your tests here.
+
+class DashboardCounterTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.doctor = User.objects.create_user(email='doc@example.com', password='x', user_type='doctor', profession='dentist')
+        self.patient = User.objects.create_user(email='pat@example.com', password='x', user_type='patient')
+
+    def test_seeded_exactly_then_maintained(self):
+        self.assertFalse(DashboardCounter.objects.exists())
+        self.assertEqual(dashboard.counts()['users'], 2)
+
+        appointment = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment_date=date(2024, 5, 1), appointment_time=time(9)
+        )
+        User.objects.create_user(email='other@example.com', password='x', user_type='doctor', profession='dentist')
+        self.assertEqual(dashboard.counts(), {
+            'users': 3, 'doctors': 2, 'appointments': 1, 'reports': 0, 'prescriptions': 0,
+        })
+
+        appointment.delete()
+        self.assertEqual(dashboard.counts()['appointments'], 0)
+
+    def test_role_changes_move_doctor_count(self):
+        dashboard.counts()
+        patient = User.objects.get(pk=self.patient.pk)
+        patient.user_type = 'doctor'
+        patient.profession = 'dentist'
+        patient.save()
+        patient.save()
+        self.assertEqual(dashboard.counts()['doctors'], 2)
+
+        patient.user_type = 'patient'
+        patient.save()
+        User.objects.get(pk=self.doctor.pk).delete()
+        self.assertEqual(dashboard.counts(), {
+            'users': 1, 'doctors': 0, 'appointments': 0, 'reports': 0, 'prescriptions': 0,
+        })
+
+    def test_reconcile_fixes_drift(self):
+        dashboard.counts()
+        dashboard.bump('users', 5)
+
+        self.assertEqual(dashboard.reconcile(['users']), {'users': (7, 2)})
+        self.assertEqual(dashboard.counts()['users'], 2)
+
+    def test_recent_actions_cached_until_logged(self):
+        self.assertEqual(dashboard.recent_actions(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            LogEntry.objects.create(
+                user=self.doctor, content_type=ContentType.objects.get_for_model(User),
+                object_id=str(self.patient.pk), object_repr=str(self.patient), action_flag=ADDITION,
+            )
+
+        self.assertEqual(dashboard.recent_actions()[0].object_repr, 'pat@example.com')
+
+        # update() logs nothing, so the cached feed is still served
+        LogEntry.objects.update(object_repr='changed')
+        self.assertEqual(dashboard.recent_actions()[0].object_repr, 'pat@example.com')
+
+    def test_admin_index(self):
+        admin = User.objects.create_superuser(email='admin@example.com', password='x', first_name='A', last_name='B')
+        self.client.force_login(admin)
+
+        response = self.client.get('/admin/', HTTP_HOST='localhost')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['model_count']['users'], 3)
+
+
+class LargeTableAdminTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email='admin@example.com', password='x', first_name='A', last_name='B')
+        cls.doctors = [
+            User.objects.create_user(email=f'doc{i}@example.com', password='x', user_type='doctor', profession='dentist')
+            for i in range(2)
+        ]
+        cls.patient = User.objects.create_user(email='pat@example.com', password='x', user_type='patient')
+        for day in range(1, 8):
+            Appointment.objects.create(
+                patient=cls.patient, doctor=cls.doctors[day % 2],
+                appointment_date=date(2024, 5, day), appointment_time=time(9),
+            )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist(self, query=''):
+        return self.client.get(f'/admin/appointment/appointment/{query}', HTTP_HOST='localhost')
+
+    def dates(self, response):
+        return [obj.appointment_date.day for obj in response.context['cl'].result_list]
+
+    @mock.patch('admin_customization.admin.AppointmentAdmin.list_per_page', 3)
+    def test_keyset_paging(self):
+        response = self.changelist()
+        self.assertEqual(self.dates(response), [7, 6, 5])
+
+        response = self.changelist(response.context['cl'].next_page_url)
+        self.assertEqual(self.dates(response), [4, 3, 2])
+        self.assertContains(response, 'First page')
+
+        response = self.changelist('?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 302)
+
+    def test_related_rows_joined(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.changelist()
+        self.assertEqual(len(response.context['cl'].result_list), 7)
+        user_queries = [q for q in queries if q['sql'].startswith('SELECT') and 'FROM "backapp_user"' in q['sql']]
+        # the session user only; patients and doctors come with the appointments
+        self.assertEqual(len(user_queries), 1)
+
+    def test_autocomplete_doctor_filter(self):
+        doctor = self.doctors[0]
+        response = self.changelist(f'?doctor__id__exact={doctor.pk}')
+
+        self.assertEqual(self.dates(response), [6, 4, 2])
+        self.assertContains(response, 'admin-autocomplete-filter')
+        # Only the chosen doctor is rendered as an option
+        self.assertContains(response, f'<option value="{doctor.pk}" selected>')
+        self.assertNotContains(response, self.doctors[1].email)
+
+    def test_search_matches_prefix(self):
+        self.assertEqual(len(self.changelist('?q=pat@').context['cl'].result_list), 7)
+        self.assertEqual(len(self.changelist('?q=example.com').context['cl'].result_list), 0)
+
+    def test_related_search_is_a_subquery(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.changelist('?q=doc1@')
+        self.assertEqual(self.dates(response), [7, 5, 3, 1])
+        appointment_queries = [q['sql'] for q in queries if 'FROM "appointment_appointment"' in q['sql']]
+        # The users are matched in a subquery, not joined and ORed with LIKE
+        self.assertTrue(appointment_queries)
+        for sql in appointment_queries:
+            self.assertIn('"doctor_id" IN (SELECT', sql)
+            self.assertNotIn('LIKE', sql.split('IN (SELECT', 1)[0])
+
+        self.assertEqual(self.dates(self.changelist('?q=nobody@')), [])
+        self.assertEqual(self.dates(self.changelist('?q=not-an-id')), [])
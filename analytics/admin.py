@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import DailyRollup
+
+
+@admin.register(DailyRollup)
+class DailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('bucket', 'metric', 'doctor_id', 'category', 'count')
+    list_filter = ('metric',)
+    ordering = ('-bucket',)
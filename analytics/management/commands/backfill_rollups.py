@@ -0,0 +1,42 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from analytics import rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the analytics rollups from the base tables, a date range at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--metric', choices=sorted(rollups.METRICS), action='append',
+                            help='Metric to rebuild; repeat for several (default: all)')
+        parser.add_argument('--date-from', type=date.fromisoformat, help='YYYY-MM-DD (default: first row)')
+        parser.add_argument('--date-to', type=date.fromisoformat, help='YYYY-MM-DD, inclusive (default: last row)')
+        parser.add_argument('--chunk-days', type=int, default=7,
+                            help='Days rebuilt per transaction (default: 7)')
+
+    def handle(self, *args, **options):
+        if options['chunk_days'] < 1:
+            raise CommandError('--chunk-days must be at least 1')
+        chunk = timedelta(days=options['chunk_days'])
+
+        for metric in options['metric'] or rollups.METRICS:
+            span = rollups.date_span(metric)
+            if span is None and not (options['date_from'] and options['date_to']):
+                self.stdout.write(f'{metric}: no rows')
+                continue
+            first = options['date_from'] or span[0]
+            last = options['date_to'] or span[1]
+
+            started = time.perf_counter()
+            counted = 0
+            start = first
+            while start <= last:
+                end = min(start + chunk, last + timedelta(days=1))
+                counted += rollups.rebuild(metric, start, end)
+                self.stdout.write(f'{metric}: {start}..{end - timedelta(days=1)} done, {counted} rows so far')
+                start = end
+            self.stdout.write(self.style.SUCCESS(
+                f'{metric}: rebuilt {first}..{last} from {counted} rows in {time.perf_counter() - started:.1f}s'
+            ))
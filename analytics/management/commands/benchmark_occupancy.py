@@ -0,0 +1,83 @@
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from analytics import occupancy
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the occupancy aggregation on synthetic appointments (no database) '
+        'against a plain Python loop over a sample'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000_000)
+        parser.add_argument('--doctors', type=int, default=500)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--chunk-size', type=int, default=occupancy.get_setting('CHUNK_SIZE'))
+        parser.add_argument('--baseline-rows', type=int, default=200_000,
+                            help='Rows for the pure Python comparison (0 to skip)')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        date_to = date.today()
+        date_from = date_to - timedelta(days=options['days'] - 1)
+        doctors = np.arange(1, options['doctors'] + 1, dtype=np.int64)
+        accumulator = occupancy.OccupancyAccumulator(doctors, date_from, date_to, date_to)
+
+        remaining = options['rows']
+        elapsed = 0.0
+        while remaining > 0:
+            chunk = self.synthetic_chunk(rng, min(remaining, options['chunk_size']), doctors, date_from, options['days'])
+            started = time.perf_counter()
+            accumulator.add(*chunk)
+            elapsed += time.perf_counter() - started
+            remaining -= len(chunk[0])
+        started = time.perf_counter()
+        report = accumulator.result()
+        elapsed += time.perf_counter() - started
+
+        rows = options['rows']
+        self.stdout.write(
+            f'NumPy: {rows:,} appointments, {len(doctors)} doctors in {elapsed:.2f}s '
+            f'({rows / elapsed:,.0f} rows/s); lead time p50 {report["lead_time_days"]["p50"]} days'
+        )
+
+        if options['baseline_rows']:
+            sample = self.synthetic_chunk(rng, options['baseline_rows'], doctors, date_from, options['days'])
+            rows = [tuple(column[i] for column in sample) for i in range(len(sample[0]))]
+            started = time.perf_counter()
+            self.python_baseline(rows, date_to)
+            baseline = time.perf_counter() - started
+            rate = len(rows) / baseline
+            self.stdout.write(
+                f'Python loop: {len(rows):,} appointments in {baseline:.2f}s ({rate:,.0f} rows/s), '
+                f'about {options["rows"] / rate:.0f}s for {options["rows"]:,}'
+            )
+
+    def synthetic_chunk(self, rng, size, doctors, date_from, days):
+        dates = np.datetime64(date_from, 'D') + rng.integers(0, days, size)
+        # Mostly inside the bookable window, on the half hour
+        minutes = occupancy.DAY_START + rng.integers(-2, occupancy.SLOTS + 2, size) * occupancy.SLOT_MINUTES
+        statuses = rng.choice(len(occupancy.STATUSES), size, p=[0.2, 0.3, 0.1, 0.4])
+        booked = dates - rng.exponential(10, size).astype(np.int64)
+        return rng.choice(doctors, size), dates, minutes, statuses, booked
+
+    def python_baseline(self, rows, today):
+        today = np.datetime64(today, 'D')
+        occupied, statuses, past, no_shows, lead = Counter(), Counter(), Counter(), Counter(), Counter()
+        for doctor, day, minute, status, booked in rows:
+            statuses[doctor, status] += 1
+            slot = (minute - occupancy.DAY_START) // occupancy.SLOT_MINUTES
+            if status != occupancy.CANCELLED and 0 <= slot < occupancy.SLOTS:
+                occupied[doctor, (day.astype(np.int64) + 3) % 7, slot] += 1
+            if day < today and status != occupancy.CANCELLED:
+                past[doctor] += 1
+                if status != occupancy.COMPLETED:
+                    no_shows[doctor] += 1
+            lead[min(max(int((day - booked).astype(np.int64)), 0), occupancy.MAX_LEAD_DAYS)] += 1
+        return occupied, statuses, past, no_shows, lead
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.15 on 2026-10-19 14:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('appointments', 'Appointments'), ('prescriptions', 'Prescriptions'), ('reports', 'Lab reports')], max_length=20)),
+                ('category', models.CharField(blank=True, max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('bucket', models.DateField()),
+                ('doctor', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('metric', 'bucket', 'doctor', 'category'), name='daily_rollup_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('appointments', 'Appointments'), ('prescriptions', 'Prescriptions'), ('reports', 'Lab reports')], max_length=20)),
+                ('category', models.CharField(blank=True, max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('bucket', models.DateTimeField()),
+                ('doctor', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('metric', 'bucket', 'doctor', 'category'), name='hourly_rollup_key')],
+            },
+        ),
+    ]
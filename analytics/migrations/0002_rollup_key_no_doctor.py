@@ -0,0 +1,44 @@
+# Generated by Django 5.1.15 on 2026-10-19 14:51
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicates(apps, schema_editor):
+    # Rows without a doctor could be duplicated before the constraint; fold
+    # each group into its first row
+    for name in ('HourlyRollup', 'DailyRollup'):
+        model = apps.get_model('analytics', name)
+        groups = (
+            model.objects.filter(doctor__isnull=True)
+            .values('metric', 'bucket', 'category')
+            .annotate(rows=Count('id'), keep=Min('id'), total=Sum('count'))
+            .filter(rows__gt=1)
+        )
+        for group in groups:
+            rows = model.objects.filter(
+                doctor__isnull=True, metric=group['metric'], bucket=group['bucket'], category=group['category']
+            )
+            rows.exclude(pk=group['keep']).delete()
+            rows.filter(pk=group['keep']).update(count=group['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('doctor__isnull', True)), fields=('metric', 'bucket', 'category'), name='daily_rollup_key_no_doctor'),
+        ),
+        migrations.AddConstraint(
+            model_name='hourlyrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('doctor__isnull', True)), fields=('metric', 'bucket', 'category'), name='hourly_rollup_key_no_doctor'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.db import models
+
+
+class Rollup(models.Model):
+    """
+    Pre-aggregated counts, kept current by signals (analytics.rollups) so
+    reports sum a few rows per bucket instead of scanning the base tables.
+
+    `category` is the appointment or prescription status, or the report
+    type for lab reports.
+    """
+    METRIC_CHOICES = (
+        ('appointments', 'Appointments'),
+        ('prescriptions', 'Prescriptions'),
+        ('reports', 'Lab reports'),
+    )
+
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    doctor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, blank=True, related_name='+'
+    )
+    category = models.CharField(max_length=20, blank=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class HourlyRollup(Rollup):
+    # Start of the hour, in the project's time zone
+    bucket = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['metric', 'bucket', 'doctor', 'category'], name='hourly_rollup_key'),
+            # NULLs are distinct in the key above, so rows without a doctor need their own
+            models.UniqueConstraint(
+                fields=['metric', 'bucket', 'category'], condition=models.Q(doctor__isnull=True),
+                name='hourly_rollup_key_no_doctor',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.metric} {self.bucket:%Y-%m-%d %H:00} {self.category}: {self.count}'
+
+
+class DailyRollup(Rollup):
+    bucket = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['metric', 'bucket', 'doctor', 'category'], name='daily_rollup_key'),
+            # NULLs are distinct in the key above, so rows without a doctor need their own
+            models.UniqueConstraint(
+                fields=['metric', 'bucket', 'category'], condition=models.Q(doctor__isnull=True),
+                name='daily_rollup_key_no_doctor',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.metric} {self.bucket} {self.category}: {self.count}'
@@ -0,0 +1,196 @@
+"""
+Doctor occupancy, cancellation/no-show ratios and booking lead times.
+
+Appointment rows are read with values_list() in chunks, turned into NumPy
+arrays and folded into fixed-size count arrays with bincount, so memory
+stays bounded and there is no per-row Python work. Results are cached per
+date range.
+"""
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.functions import ExtractHour, ExtractMinute, TruncDate
+from django.utils import timezone
+
+from appointment.models import Appointment
+from backapp.models import User
+
+DEFAULTS = {
+    'CACHE_TIMEOUT': 10 * 60,
+    'CHUNK_SIZE': 50_000,
+}
+
+# Bookable window from AppointmentSerializer.validate: 09:00 to 17:00
+# inclusive, so the last slot starts at 17:00
+DAY_START = 9 * 60
+DAY_END = 17 * 60
+SLOT_MINUTES = 30
+SLOTS = (DAY_END - DAY_START) // SLOT_MINUTES + 1
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+STATUSES = tuple(status for status, _ in Appointment.STATUS_CHOICES)
+CANCELLED = STATUSES.index('cancelled')
+COMPLETED = STATUSES.index('completed')
+
+# Lead time (days from booking to appointment) histogram edges; the last bin is open
+LEAD_TIME_EDGES = (0, 1, 2, 4, 8, 15, 31, 61, 91)
+MAX_LEAD_DAYS = 365
+
+
+def get_setting(name):
+    return getattr(settings, 'ANALYTICS', {}).get(name, DEFAULTS[name])
+
+
+def slot_labels():
+    return [f'{minute // 60:02d}:{minute % 60:02d}' for minute in range(DAY_START, DAY_END + 1, SLOT_MINUTES)]
+
+
+class OccupancyAccumulator:
+    """
+    Running counts over chunks of appointments for `doctors` (sorted ids)
+    between date_from and date_to. Appointments before `today` that were
+    neither completed nor cancelled count as no-shows.
+    """
+
+    def __init__(self, doctors, date_from, date_to, today):
+        self.doctors = np.asarray(doctors, dtype=np.int64)
+        self.date_from, self.date_to = date_from, date_to
+        self.today = np.datetime64(today, 'D')
+        count = len(self.doctors)
+        self.occupancy = np.zeros(count * len(WEEKDAYS) * SLOTS, dtype=np.int64)
+        self.statuses = np.zeros(count * len(STATUSES), dtype=np.int64)
+        self.past = np.zeros(count, dtype=np.int64)
+        self.no_shows = np.zeros(count, dtype=np.int64)
+        self.lead_days = np.zeros(MAX_LEAD_DAYS + 1, dtype=np.int64)
+
+    def add(self, doctor_ids, dates, minutes, statuses, booked):
+        """
+        One chunk as equal-length arrays: doctor ids, appointment dates and
+        booking dates (datetime64[D]), minutes past midnight and indexes
+        into STATUSES.
+        """
+        doctor = np.searchsorted(self.doctors, doctor_ids)
+        doctor_count = len(self.doctors)
+
+        self.statuses += np.bincount(doctor * len(STATUSES) + statuses, minlength=doctor_count * len(STATUSES))
+
+        # 1970-01-01 was a Thursday
+        weekday = (dates.astype(np.int64) + 3) % 7
+        slot = (minutes - DAY_START) // SLOT_MINUTES
+        booked_slot = (statuses != CANCELLED) & (slot >= 0) & (slot < SLOTS)
+        cell = (doctor * len(WEEKDAYS) + weekday) * SLOTS + slot
+        self.occupancy += np.bincount(cell[booked_slot], minlength=self.occupancy.size)
+
+        past = (dates < self.today) & (statuses != CANCELLED)
+        self.past += np.bincount(doctor[past], minlength=doctor_count)
+        no_show = past & (statuses != COMPLETED)
+        self.no_shows += np.bincount(doctor[no_show], minlength=doctor_count)
+
+        lead = np.clip((dates - booked).astype(np.int64), 0, MAX_LEAD_DAYS)
+        self.lead_days += np.bincount(lead, minlength=MAX_LEAD_DAYS + 1)
+
+    def weekday_counts(self):
+        """How many of each weekday fall in the date range."""
+        days = np.arange(np.datetime64(self.date_from, 'D'), np.datetime64(self.date_to, 'D') + 1)
+        return np.bincount((days.astype(np.int64) + 3) % 7, minlength=len(WEEKDAYS))
+
+    def result(self, doctor_names=None):
+        doctor_count = len(self.doctors)
+        occupancy = self.occupancy.reshape(doctor_count, len(WEEKDAYS), SLOTS)
+        statuses = self.statuses.reshape(doctor_count, len(STATUSES))
+        totals = statuses.sum(axis=1)
+        # Share of that weekday's slots in the range that were booked
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate = np.nan_to_num(occupancy / self.weekday_counts()[None, :, None])
+            cancellation = np.nan_to_num(statuses[:, CANCELLED] / totals)
+            no_show = np.nan_to_num(self.no_shows / self.past)
+
+        edges = np.array(LEAD_TIME_EDGES)
+        histogram = np.add.reduceat(self.lead_days, edges)
+        cumulative = np.cumsum(self.lead_days)
+        bookings = int(cumulative[-1])
+        percentiles = {
+            f'p{p}': int(np.searchsorted(cumulative, bookings * p / 100)) if bookings else None
+            for p in (50, 90, 99)
+        }
+        labels = [f'{low}-{high - 1}' for low, high in zip(edges, edges[1:])] + [f'{edges[-1]}+']
+
+        doctor_names = doctor_names or {}
+        return {
+            'date_from': self.date_from,
+            'date_to': self.date_to,
+            'weekdays': list(WEEKDAYS),
+            'slots': slot_labels(),
+            'doctors': [
+                {
+                    'id': int(doctor_id),
+                    'name': doctor_names.get(int(doctor_id), ''),
+                    'appointments': int(totals[i]),
+                    'statuses': dict(zip(STATUSES, statuses[i].tolist())),
+                    'cancellation_ratio': round(float(cancellation[i]), 4),
+                    'no_show_ratio': round(float(no_show[i]), 4),
+                    'occupancy': occupancy[i].tolist(),
+                    'occupancy_rate': np.round(rate[i], 4).tolist(),
+                }
+                for i, doctor_id in enumerate(self.doctors)
+            ],
+            'lead_time_days': {
+                'bins': dict(zip(labels, histogram.tolist())),
+                **percentiles,
+            },
+        }
+
+
+def appointment_chunks(queryset, chunk_size):
+    """(doctor ids, dates, minutes, status indexes, booking dates) arrays, chunk by chunk."""
+    status_index = Case(
+        *(When(status=status, then=Value(i)) for i, status in enumerate(STATUSES)),
+        default=Value(STATUSES.index('pending')), output_field=IntegerField(),
+    )
+    rows = queryset.order_by().values_list(
+        'doctor_id', 'appointment_date', ExtractHour('appointment_time'), ExtractMinute('appointment_time'),
+        status_index, TruncDate('created_at', tzinfo=timezone.get_current_timezone()),
+    ).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                break
+        if not chunk:
+            return
+        doctor_ids, dates, hours, minutes, statuses, booked = zip(*chunk)
+        yield (
+            np.fromiter(doctor_ids, dtype=np.int64, count=len(chunk)),
+            np.array(dates, dtype='datetime64[D]'),
+            np.fromiter(hours, dtype=np.int64, count=len(chunk)) * 60 + np.fromiter(minutes, dtype=np.int64, count=len(chunk)),
+            np.fromiter(statuses, dtype=np.int64, count=len(chunk)),
+            np.array(booked, dtype='datetime64[D]'),
+        )
+        if len(chunk) < chunk_size:
+            return
+
+
+def compute(date_from, date_to):
+    appointments = Appointment.objects.filter(appointment_date__gte=date_from, appointment_date__lte=date_to)
+    doctors = sorted(appointments.order_by().values_list('doctor_id', flat=True).distinct())
+    accumulator = OccupancyAccumulator(doctors, date_from, date_to, timezone.localdate())
+    if doctors:
+        for chunk in appointment_chunks(appointments, get_setting('CHUNK_SIZE')):
+            accumulator.add(*chunk)
+    names = {
+        pk: f'{first} {last}'.strip() or email
+        for pk, first, last, email in User.objects.filter(pk__in=doctors).values_list('pk', 'first_name', 'last_name', 'email')
+    }
+    return accumulator.result(names)
+
+
+def occupancy_report(date_from, date_to):
+    """compute() for the range, from cache when it was computed recently."""
+    key = f'analytics:occupancy:{date_from.isoformat()}:{date_to.isoformat()}'
+    report = cache.get(key)
+    if report is None:
+        report = compute(date_from, date_to)
+        cache.set(key, report, get_setting('CACHE_TIMEOUT'))
+    return report
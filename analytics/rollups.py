@@ -0,0 +1,254 @@
+"""
+Hourly and daily rollups of appointments, prescriptions and lab reports.
+
+Every create, delete or change of a counted field moves one count between
+rollup rows (record_change, called from analytics.signals). rebuild()
+recomputes a date range from the base tables; the backfill_rollups command
+runs it over history in chunks.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import ExtractHour, TruncDate
+from django.utils import timezone
+
+from appointment.models import Appointment, MedicalReport, Prescription
+from .models import DailyRollup, HourlyRollup
+
+METRICS = {
+    'appointments': Appointment,
+    'prescriptions': Prescription,
+    'reports': MedicalReport,
+}
+MODEL_METRICS = {model: metric for metric, model in METRICS.items()}
+
+GROUP_FIELDS = {
+    'doctor': 'doctor_id',
+    'profession': 'doctor__profession',
+    'category': 'category',
+}
+
+
+def rollup_key(model, state):
+    """(start of the hour, doctor_id, category) a row counts under, or None."""
+    if state is None:
+        return None
+    if model is Appointment:
+        doctor_id, category, day, at = state
+        if day is None or at is None:
+            return None
+        moment = timezone.make_aware(datetime.combine(day, time(at.hour)))
+    else:
+        doctor_id, category, created_at = state
+        if created_at is None:
+            return None
+        moment = timezone.localtime(created_at).replace(minute=0, second=0, microsecond=0)
+    return moment, doctor_id, category or ''
+
+
+def saved_states(instance, created):
+    """
+    (state the rollups counted, state now) for a row that was just saved.
+    Deferred fields weren't written by the save, so they're loaded and
+    taken as unchanged.
+    """
+    deferred = instance.get_deferred_fields() & set(instance.ROLLUP_FIELDS)
+    if deferred:
+        instance.refresh_from_db(fields=deferred)
+    current = instance.rollup_state()
+    loaded = instance._loaded_rollup_state
+    if created or loaded is None:
+        return None, current
+    loaded = tuple(
+        current[i] if field in deferred else loaded[i]
+        for i, field in enumerate(instance.ROLLUP_FIELDS)
+    )
+    return loaded, current
+
+
+def record_change(model, old_state, new_state):
+    old_key, new_key = rollup_key(model, old_state), rollup_key(model, new_state)
+    if old_key == new_key:
+        return
+    metric = MODEL_METRICS[model]
+    if old_key:
+        add(metric, old_key, -1)
+    if new_key:
+        add(metric, new_key, 1)
+
+
+def record_changes(model, changes):
+    """
+    record_change() for many rows at once, e.g. after a bulk status update:
+    `changes` is (old state, new state) pairs. Each rollup table gets one
+    read, one UPDATE and at most one INSERT however many rows changed.
+    """
+    deltas = Counter()
+    for old_state, new_state in changes:
+        old_key, new_key = rollup_key(model, old_state), rollup_key(model, new_state)
+        if old_key == new_key:
+            continue
+        if old_key:
+            deltas[old_key] -= 1
+        if new_key:
+            deltas[new_key] += 1
+    metric = MODEL_METRICS[model]
+    for rollup, bucket_of in ((HourlyRollup, lambda moment: moment), (DailyRollup, lambda moment: timezone.localtime(moment).date())):
+        merged = Counter()
+        for (moment, doctor_id, category), delta in deltas.items():
+            merged[bucket_of(moment), doctor_id, category] += delta
+        merged = {key: delta for key, delta in merged.items() if delta}
+        if merged:
+            add_many(rollup, metric, merged)
+
+
+def add_many(rollup, metric, deltas):
+    matches = {
+        key: Q(bucket=key[0], doctor_id=key[1], category=key[2])
+        for key in deltas
+    }
+    rows = rollup.objects.filter(metric=metric).filter(Q(*matches.values(), _connector=Q.OR))
+    existing = set(rows.values_list('bucket', 'doctor_id', 'category'))
+    if existing:
+        rows.update(count=F('count') + Case(
+            *(When(matches[key], then=Value(deltas[key])) for key in existing),
+            default=Value(0), output_field=IntegerField(),
+        ))
+    missing = [key for key in deltas if key not in existing]
+    if not missing:
+        return
+    try:
+        with transaction.atomic():
+            rollup.objects.bulk_create([
+                rollup(metric=metric, bucket=bucket, doctor_id=doctor_id, category=category, count=deltas[bucket, doctor_id, category])
+                for bucket, doctor_id, category in missing
+            ])
+    except IntegrityError:
+        # Some were created concurrently; go one by one
+        for bucket, doctor_id, category in missing:
+            add_one(rollup, metric, bucket, doctor_id, category, deltas[bucket, doctor_id, category])
+
+
+def add(metric, key, delta):
+    """Add `delta` to the hourly and daily rows for `key`, creating them as needed."""
+    moment, doctor_id, category = key
+    for rollup, bucket in ((HourlyRollup, moment), (DailyRollup, timezone.localtime(moment).date())):
+        add_one(rollup, metric, bucket, doctor_id, category, delta)
+
+
+def add_one(rollup, metric, bucket, doctor_id, category, delta):
+    rows = rollup.objects.filter(metric=metric, bucket=bucket, doctor_id=doctor_id, category=category)
+    if rows.update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            rollup.objects.create(metric=metric, bucket=bucket, doctor_id=doctor_id, category=category, count=delta)
+    except IntegrityError:
+        # Created concurrently
+        rows.update(count=F('count') + delta)
+
+
+def base_counts(metric, start, end):
+    """{(hour start, doctor_id, category): count} from the base table for dates [start, end)."""
+    model = METRICS[metric]
+    category = 'report_type' if model is MedicalReport else 'status'
+    if model is Appointment:
+        rows = (
+            model.objects.filter(appointment_date__gte=start, appointment_date__lt=end)
+            .values_list('appointment_date', ExtractHour('appointment_time'), 'doctor_id', category)
+        )
+    else:
+        tz = timezone.get_current_timezone()
+        rows = (
+            model.objects.filter(
+                created_at__gte=timezone.make_aware(datetime.combine(start, time.min)),
+                created_at__lt=timezone.make_aware(datetime.combine(end, time.min)),
+            )
+            .values_list(TruncDate('created_at', tzinfo=tz), ExtractHour('created_at', tzinfo=tz), 'doctor_id', category)
+        )
+    counts = rows.order_by().annotate(n=Count('id'))
+    return {
+        (timezone.make_aware(datetime.combine(day, time(hour))), doctor_id, category or ''): n
+        for day, hour, doctor_id, category, n in counts
+    }
+
+
+@transaction.atomic
+def rebuild(metric, start, end):
+    """
+    Replace the rollups of `metric` for dates [start, end) with counts from
+    the base table. Returns the number of base rows counted.
+
+    On PostgreSQL the rollup tables are locked against writes first, so a
+    signal's increment either lands before the base table is read (and is
+    replaced) or waits until the rebuilt rows are committed (and adds to
+    them). A row committed just before the read whose signal hasn't run yet
+    is still counted twice; for exact counts on other databases, or for
+    large backfills, run it with writes quiesced.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'LOCK TABLE {HourlyRollup._meta.db_table}, {DailyRollup._meta.db_table} IN EXCLUSIVE MODE'
+            )
+    hourly = base_counts(metric, start, end)
+    daily = Counter()
+    for (moment, doctor_id, category), n in hourly.items():
+        daily[moment.date(), doctor_id, category] += n
+
+    HourlyRollup.objects.filter(
+        metric=metric,
+        bucket__gte=timezone.make_aware(datetime.combine(start, time.min)),
+        bucket__lt=timezone.make_aware(datetime.combine(end, time.min)),
+    ).delete()
+    DailyRollup.objects.filter(metric=metric, bucket__gte=start, bucket__lt=end).delete()
+    HourlyRollup.objects.bulk_create([
+        HourlyRollup(metric=metric, bucket=moment, doctor_id=doctor_id, category=category, count=n)
+        for (moment, doctor_id, category), n in hourly.items()
+    ], batch_size=1000)
+    DailyRollup.objects.bulk_create([
+        DailyRollup(metric=metric, bucket=day, doctor_id=doctor_id, category=category, count=n)
+        for (day, doctor_id, category), n in daily.items()
+    ], batch_size=1000)
+    return sum(hourly.values())
+
+
+def date_span(metric):
+    """(first, last) date with rows for `metric`, or None when there are none."""
+    model = METRICS[metric]
+    if model is Appointment:
+        first = model.objects.order_by('appointment_date').values_list('appointment_date', flat=True).first()
+        last = model.objects.order_by('-appointment_date').values_list('appointment_date', flat=True).first()
+    else:
+        first = model.objects.order_by('created_at').values_list('created_at', flat=True).first()
+        last = model.objects.order_by('-created_at').values_list('created_at', flat=True).first()
+        first, last = (timezone.localtime(value).date() if value else None for value in (first, last))
+    return (first, last) if first else None
+
+
+def query(metric, date_from, date_to, granularity='day', group_by=()):
+    """
+    Summed rollup rows for dates date_from..date_to (inclusive), one per
+    bucket and combination of `group_by` (doctor, profession, category).
+    """
+    if granularity == 'hour':
+        rows = HourlyRollup.objects.filter(
+            bucket__gte=timezone.make_aware(datetime.combine(date_from, time.min)),
+            bucket__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min)),
+        )
+    else:
+        rows = DailyRollup.objects.filter(bucket__gte=date_from, bucket__lte=date_to)
+    paths = [GROUP_FIELDS[name] for name in group_by]
+    rows = (
+        rows.filter(metric=metric)
+        .values('bucket', *paths)
+        .annotate(total=Sum('count'))
+        .filter(total__gt=0)
+        .order_by('bucket', *paths)
+    )
+    return [
+        {'bucket': row['bucket'], **{name: row[GROUP_FIELDS[name]] for name in group_by}, 'count': row['total']}
+        for row in rows
+    ]
@@ -0,0 +1,31 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from appointment.models import Appointment, MedicalReport, Prescription
+from appointment.transitions import statuses_changed
+from . import rollups
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_save, sender=MedicalReport)
+@receiver(post_save, sender=Prescription)
+def update_rollups_on_save(sender, instance, created, **kwargs):
+    """Move the row's count when it's created or a counted field changes"""
+    old_state, new_state = rollups.saved_states(instance, created)
+    rollups.record_change(sender, old_state, new_state)
+    instance._loaded_rollup_state = new_state
+
+
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=MedicalReport)
+@receiver(post_delete, sender=Prescription)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    rollups.record_change(sender, instance._loaded_rollup_state or instance.rollup_state(), None)
+
+
+@receiver(statuses_changed, sender=Appointment)
+@receiver(statuses_changed, sender=Prescription)
+def update_rollups_on_bulk_change(sender, instances, **kwargs):
+    rollups.record_changes(sender, [(instance._loaded_rollup_state, instance.rollup_state()) for instance in instances])
+    for instance in instances:
+        instance._loaded_rollup_state = instance.rollup_state()
@@ -0,0 +1,192 @@
+from datetime import date, datetime, time
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from appointment.models import Appointment, Prescription
+from backapp.models import User
+from . import occupancy
+from .models import DailyRollup, HourlyRollup
+
+
+class RollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(email='admin@example.com', password='x', user_type='admin', is_staff=True)
+        cls.dentist = User.objects.create_user(email='dent@example.com', password='x', user_type='doctor', profession='dentist')
+        cls.surgeon = User.objects.create_user(email='surg@example.com', password='x', user_type='doctor', profession='surgeon')
+        cls.patient = User.objects.create_user(email='pat@example.com', password='x', user_type='patient')
+
+    def book(self, doctor, day, hour=10, status='pending'):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=doctor, status=status,
+            appointment_date=date(2024, 5, day), appointment_time=time(hour, 30),
+        )
+
+    def daily(self, **filters):
+        return {
+            (row.bucket.day, row.doctor_id, row.category): row.count
+            for row in DailyRollup.objects.filter(metric='appointments', count__gt=0, **filters)
+        }
+
+    def test_maintained_on_write(self):
+        first = self.book(self.dentist, 1)
+        self.book(self.dentist, 1, hour=11)
+        self.assertEqual(self.daily(), {(1, self.dentist.pk, 'pending'): 2})
+        self.assertEqual(HourlyRollup.objects.filter(metric='appointments').count(), 2)
+
+        appointment = Appointment.objects.only('id', 'status').get(pk=first.pk)
+        appointment.status = 'completed'
+        appointment.save()
+        self.assertEqual(self.daily(), {(1, self.dentist.pk, 'pending'): 1, (1, self.dentist.pk, 'completed'): 1})
+
+        appointment = Appointment.objects.get(pk=first.pk)
+        appointment.appointment_date = date(2024, 5, 2)
+        appointment.save()
+        appointment.delete()
+        self.assertEqual(self.daily(), {(1, self.dentist.pk, 'pending'): 1})
+
+    def test_created_at_metrics(self):
+        Prescription.objects.create(doctor=self.surgeon, patient=self.patient, prescription_text='Rest')
+        today = timezone.localdate()
+
+        row = DailyRollup.objects.get(metric='prescriptions')
+        self.assertEqual((row.bucket, row.doctor_id, row.category, row.count), (today, self.surgeon.pk, 'pending', 1))
+
+    def test_one_row_without_a_doctor(self):
+        for _ in range(2):
+            Prescription.objects.create(patient=self.patient, prescription_text='Rest')
+
+        row = DailyRollup.objects.get(metric='prescriptions')
+        self.assertEqual((row.doctor_id, row.count), (None, 2))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DailyRollup.objects.create(metric='prescriptions', bucket=row.bucket, category=row.category)
+
+    def test_backfill_matches_incremental(self):
+        for day, doctor, status in ((1, self.dentist, 'pending'), (3, self.surgeon, 'completed'), (9, self.dentist, 'pending')):
+            self.book(doctor, day, status=status)
+        expected = self.daily()
+        hourly = HourlyRollup.objects.filter(metric='appointments').count()
+
+        DailyRollup.objects.update(count=0)
+        HourlyRollup.objects.all().delete()
+        call_command('backfill_rollups', metric=['appointments'], chunk_days=2, stdout=StringIO())
+
+        self.assertEqual(self.daily(), expected)
+        self.assertEqual(HourlyRollup.objects.filter(metric='appointments').count(), hourly)
+        bucket = HourlyRollup.objects.filter(metric='appointments').earliest('bucket').bucket
+        self.assertEqual(bucket, timezone.make_aware(datetime(2024, 5, 1, 10)))
+
+    def test_api_sums_rollups(self):
+        self.book(self.dentist, 1)
+        self.book(self.surgeon, 1, status='cancelled')
+        self.book(self.dentist, 2)
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/v1/analytics/rollups/', {
+                'metric': 'appointments', 'date_from': '2024-05-01', 'date_to': '2024-05-31',
+                'group_by': 'profession',
+            }, HTTP_HOST='localhost')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if 'appointment_appointment' in q['sql']])
+        self.assertEqual(response.data['total'], 3)
+        self.assertEqual(
+            [(str(row['bucket']), row['profession'], row['count']) for row in response.data['results']],
+            [('2024-05-01', 'dentist', 1), ('2024-05-01', 'surgeon', 1), ('2024-05-02', 'dentist', 1)],
+        )
+
+        response = client.get('/api/v1/analytics/rollups/', {
+            'metric': 'appointments', 'date_from': '2024-05-01', 'date_to': '2024-05-01', 'granularity': 'hour',
+        }, HTTP_HOST='localhost')
+        self.assertEqual([row['count'] for row in response.data['results']], [2])
+
+    def test_api_validation_and_access(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get('/api/v1/analytics/rollups/', {'metric': 'appointments', 'group_by': 'city'}, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 400)
+
+        client.force_authenticate(self.dentist)
+        response = client.get('/api/v1/analytics/rollups/', {'metric': 'appointments'}, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 403)
+
+
+class OccupancyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(email='admin@example.com', password='x', user_type='admin', is_staff=True)
+        cls.doctor = User.objects.create_user(
+            email='doc@example.com', password='x', user_type='doctor', profession='dentist', first_name='Ann', last_name='Lee'
+        )
+        cls.patient = User.objects.create_user(email='pat@example.com', password='x', user_type='patient')
+        # 2024-05-06 is a Monday
+        for day, at, status in (
+            (6, time(9), 'completed'),
+            (6, time(9, 45), 'confirmed'),
+            (13, time(9, 15), 'cancelled'),
+            (14, time(17), 'completed'),
+            (14, time(18), 'pending'),
+        ):
+            Appointment.objects.create(
+                patient=cls.patient, doctor=cls.doctor, status=status, appointment_date=date(2024, 5, day), appointment_time=at
+            )
+        Appointment.objects.filter(appointment_date=date(2024, 5, 6)).update(
+            created_at=timezone.make_aware(datetime(2024, 5, 1, 12))
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def get(self, **params):
+        params = {'date_from': '2024-05-01', 'date_to': '2024-05-31', **params}
+        return self.client.get('/api/v1/analytics/occupancy/', params, HTTP_HOST='localhost')
+
+    def test_report(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['slots']), occupancy.SLOTS)
+        doctor, = response.data['doctors']
+        self.assertEqual(doctor['name'], 'Ann Lee')
+        self.assertEqual(doctor['appointments'], 5)
+        self.assertEqual(doctor['cancellation_ratio'], 0.2)
+        # Past and not cancelled: 4, of which the confirmed and pending ones never completed
+        self.assertEqual(doctor['no_show_ratio'], 0.5)
+
+        monday, tuesday = doctor['occupancy'][0], doctor['occupancy'][1]
+        self.assertEqual(monday[:3], [1, 1, 0])  # 09:00 and 09:30 slots; the cancelled one isn't counted
+        self.assertEqual(tuesday[-1], 1)  # 17:00; 18:00 is outside the window
+        # May 2024 has four Mondays
+        self.assertEqual(doctor['occupancy_rate'][0][0], 0.25)
+
+        lead = response.data['lead_time_days']
+        self.assertEqual(lead['bins']['4-7'], 2)
+        self.assertEqual(sum(lead['bins'].values()), 5)
+
+    def test_cached_per_range(self):
+        self.get()
+        Appointment.objects.all().delete()
+        self.assertEqual(self.get().data['doctors'][0]['appointments'], 5)
+        self.assertEqual(self.get(date_to='2024-05-30').data['doctors'], [])
+
+    def test_chunks_add_up(self):
+        with self.settings(ANALYTICS={'CHUNK_SIZE': 2}):
+            chunked = occupancy.compute(date(2024, 5, 1), date(2024, 5, 31))
+        self.assertEqual(chunked, occupancy.compute(date(2024, 5, 1), date(2024, 5, 31)))
+
+    def test_admin_only(self):
+        self.client.force_authenticate(self.doctor)
+        self.assertEqual(self.get().status_code, 403)
@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import OccupancyView, RollupView
+
+urlpatterns = [
+    path('rollups/', RollupView.as_view(), name='analytics-rollups'),
+    path('occupancy/', OccupancyView.as_view(), name='analytics-occupancy'),
+]
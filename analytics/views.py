@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import generics
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from appointment.permissions import HasRole
+from . import occupancy, rollups
+
+
+def parse_date_range(params, default_days=30):
+    """{'date_from', 'date_to'} from the query string, defaulting to the last `default_days` days."""
+    today = timezone.localdate()
+    dates = {}
+    for param, default in (('date_from', today - timedelta(days=default_days - 1)), ('date_to', today)):
+        value = params.get(param)
+        try:
+            dates[param] = parse_date(value) if value else default
+        except ValueError:
+            dates[param] = None
+        if dates[param] is None:
+            raise ValidationError({param: 'Use the YYYY-MM-DD format.'})
+    if dates['date_from'] > dates['date_to']:
+        raise ValidationError({'date_from': 'Must not be after date_to.'})
+    return dates
+
+
+class RollupView(generics.GenericAPIView):
+    """
+    Admin-only counts from the rollup tables, never the base tables.
+
+    ?metric=appointments|prescriptions|reports (required)
+    ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD (inclusive; default the last 30 days)
+    ?granularity=day|hour
+    ?group_by=doctor,profession,category (any combination)
+    """
+    permission_classes = [IsAuthenticated, HasRole]
+    allowed_roles = ()  # admins only
+    max_hourly_days = 31
+
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        metric = params.get('metric')
+        if metric not in rollups.METRICS:
+            raise ValidationError({'metric': f'One of: {", ".join(rollups.METRICS)}.'})
+        granularity = params.get('granularity', 'day')
+        if granularity not in ('day', 'hour'):
+            raise ValidationError({'granularity': 'Use day or hour.'})
+        group_by = [name for name in params.get('group_by', '').split(',') if name]
+        unknown = set(group_by) - set(rollups.GROUP_FIELDS)
+        if unknown:
+            raise ValidationError({'group_by': f'Unknown: {", ".join(sorted(unknown))}.'})
+
+        dates = parse_date_range(params)
+        if granularity == 'hour' and (dates['date_to'] - dates['date_from']).days >= self.max_hourly_days:
+            raise ValidationError({'granularity': f'Hourly data is limited to {self.max_hourly_days} days.'})
+
+        results = rollups.query(metric, dates['date_from'], dates['date_to'], granularity, group_by)
+        return Response({
+            'metric': metric,
+            'granularity': granularity,
+            'date_from': dates['date_from'],
+            'date_to': dates['date_to'],
+            'total': sum(row['count'] for row in results),
+            'results': results,
+        })
+
+
+class OccupancyView(generics.GenericAPIView):
+    """
+    Admin-only doctor utilization for ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD
+    (default the last 30 days): doctor x weekday x 30-minute slot occupancy,
+    cancellation and no-show ratios, and the booking lead time distribution.
+    Results are cached per date range for ANALYTICS['CACHE_TIMEOUT'] seconds.
+    """
+    permission_classes = [IsAuthenticated, HasRole]
+    allowed_roles = ()  # admins only
+    max_days = 366
+
+    def get(self, request, *args, **kwargs):
+        dates = parse_date_range(request.query_params)
+        if (dates['date_to'] - dates['date_from']).days >= self.max_days:
+            raise ValidationError({'date_to': f'The range is limited to {self.max_days} days.'})
+        return Response(occupancy.occupancy_report(dates['date_from'], dates['date_to']))
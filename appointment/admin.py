@@ -1,28 +1,39 @@
 from django.contrib import admin
-from .models import Appointment, MedicalReport, Prescription
+from admin_customization.large_tables import AutocompleteFilter, LargeTableAdminMixin
+from .models import Appointment, MedicalReport, Prescription, UnparsedPrescriptionDate
+from .transitions import transition_action
 
 @admin.register(Appointment)
-class AppointmentAdmin(admin.ModelAdmin):
+class AppointmentAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'patient', 'doctor', 'appointment_date', 'appointment_time', 'status')
-    list_filter = ('status', 'appointment_date', 'doctor')
-    search_fields = ('patient__email', 'doctor__email', 'symptoms')
+    list_filter = ('status', 'appointment_date', ('doctor', AutocompleteFilter))
+    search_fields = ('=id', 'patient__email', 'doctor__email')
     readonly_fields = ('created_at', 'updated_at')
     ordering = ('-appointment_date', '-appointment_time')
+    actions = [
+        transition_action('confirmed', 'Confirm selected appointments'),
+        transition_action('completed', 'Mark selected appointments completed'),
+        transition_action('cancelled', 'Cancel selected appointments'),
+    ]
 
 @admin.register(MedicalReport)
-class MedicalReportAdmin(admin.ModelAdmin):
+class MedicalReportAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'patient', 'doctor', 'lab_technician', 'report_type', 'created_at')
     list_filter = ('report_type', 'created_at')
-    search_fields = ('patient__email', 'doctor__email', 'lab_technician__email', 'description')
+    search_fields = ('=id', 'patient__email', 'doctor__email', 'lab_technician__email')
     readonly_fields = ('created_at', 'updated_at')
     ordering = ('-created_at',)
 
 @admin.register(Prescription)
-class PrescriptionAdmin(admin.ModelAdmin):
+class PrescriptionAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'patient_name', 'doctor_name', 'appointment_date', 'appointment_time', 'status', 'created_at')
     list_filter = ('lab_tests_required', 'status', 'created_at')
-    search_fields = ('patient_name', 'doctor_name', 'symptoms', 'prescription_text')
+    search_fields = ('=id', 'patient_name', 'doctor_name')
     readonly_fields = ('created_at', 'updated_at')
+    actions = [
+        transition_action('completed', 'Mark selected prescriptions completed'),
+        transition_action('cancelled', 'Cancel selected prescriptions'),
+    ]
     fieldsets = (
         ('Patient & Doctor', {
             'fields': ('patient', 'patient_name', 'doctor', 'doctor_name', 'doctor_profession')
@@ -41,3 +52,9 @@ class PrescriptionAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+@admin.register(UnparsedPrescriptionDate)
+class UnparsedPrescriptionDateAdmin(admin.ModelAdmin):
+    list_display = ('prescription', 'field', 'value', 'created_at')
+    list_filter = ('field',)
+    raw_id_fields = ('prescription',)
@@ -0,0 +1,133 @@
+import hashlib
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.http import content_disposition_header, parse_etags, quote_etag
+
+DEFAULTS = {
+    # 'nginx' (X-Accel-Redirect), 'apache' (X-Sendfile) or None to stream from Django
+    'OFFLOAD': None,
+    # nginx `internal` location that maps onto MEDIA_ROOT
+    'NGINX_LOCATION': '/protected-media/',
+}
+
+BLOCK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Names under these prefixes are content addressed, so they never change in place
+IMMUTABLE_PREFIXES = ('blobs/', 'renditions/')
+
+
+def get_setting(name):
+    return getattr(settings, 'REPORT_DOWNLOADS', {}).get(name, DEFAULTS[name])
+
+
+def file_etag(name, modified=None):
+    is_immutable = name.startswith(IMMUTABLE_PREFIXES)
+    key = name if is_immutable else f'{name}:{modified.timestamp() if modified else ""}'
+    return quote_etag(hashlib.sha256(key.encode()).hexdigest()[:32]), is_immutable
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single `bytes=` range, None to send the
+    whole file, or False if the range can't be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # bytes=-N is the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def iter_range(handle, start, length):
+    try:
+        handle.seek(start)
+        while length > 0:
+            block = handle.read(min(BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+    finally:
+        handle.close()
+
+
+def serve_file(request, storage, name, modified=None, filename=None):
+    """
+    Send a stored file after the caller has checked access.
+
+    Answers If-None-Match with 304, hands the transfer to the web server
+    when REPORT_DOWNLOADS['OFFLOAD'] is set, redirects to the backend URL
+    for storages without local files (Cloudinary), and otherwise streams
+    it from disk with single-range Range support.
+    """
+    etag, is_immutable = file_etag(name, modified)
+    cache_control = 'private, max-age=31536000, immutable' if is_immutable else 'private, no-cache'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
+
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        return HttpResponseRedirect(storage.url(name))
+
+    filename = filename or os.path.basename(name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    offload = get_setting('OFFLOAD')
+    if offload:
+        response = HttpResponse(content_type=content_type)
+        if offload == 'nginx':
+            response['X-Accel-Redirect'] = get_setting('NGINX_LOCATION') + name
+        else:
+            response['X-Sendfile'] = path
+    else:
+        response = _stream(request, path, content_type, etag)
+        if response.status_code == 416:
+            return response
+
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    response['Content-Disposition'] = content_disposition_header(False, filename)
+    return response
+
+
+def _stream(request, path, content_type, etag):
+    size = os.path.getsize(path)
+    byte_range = parse_range(request.headers.get('Range'), size)
+    # A stale If-Range means the client's partial copy is outdated; send it all
+    if_range = request.headers.get('If-Range')
+    if byte_range and if_range and if_range != etag:
+        byte_range = None
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            iter_range(open(path, 'rb'), start, length), status=206, content_type=content_type
+        )
+        response['Content-Length'] = length
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,113 @@
+import csv
+import io
+import zlib
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import Appointment, MedicalReport, Prescription
+
+# name: (model, columns, date column, filterable by status)
+EXPORTS = {
+    'appointments': (
+        Appointment,
+        ('id', 'patient_id', 'doctor_id', 'appointment_date', 'appointment_time', 'status',
+         'gender', 'blood_group', 'symptoms', 'insurance_provider', 'created_at', 'updated_at'),
+        'appointment_date',
+        True,
+    ),
+    'prescriptions': (
+        Prescription,
+        ('id', 'patient_id', 'doctor_id', 'appointment_id', 'lab_technician_id', 'appointment_date',
+         'appointment_time', 'status', 'lab_tests_required', 'lab_test_type', 'created_at', 'updated_at'),
+        'created_at',
+        True,
+    ),
+    'reports': (
+        MedicalReport,
+        ('id', 'appointment_id', 'patient_id', 'doctor_id', 'lab_technician_id', 'report_type',
+         'report_file', 'created_at', 'updated_at'),
+        'created_at',
+        False,
+    ),
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+CHUNK_SIZE = 2000
+
+
+def export_queryset(name, date_from=None, date_to=None, status=None):
+    """
+    Rows of one export as tuples, in primary key order.
+
+    date_from/date_to are inclusive dates. On datetime columns they become
+    a half-open range so the created_at index can be used.
+    """
+    model, columns, date_column, has_status = EXPORTS[name]
+    queryset = model.objects.order_by('pk')
+    is_datetime = model._meta.get_field(date_column).get_internal_type() == 'DateTimeField'
+    if date_from:
+        start = timezone.make_aware(datetime.combine(date_from, time.min)) if is_datetime else date_from
+        queryset = queryset.filter(**{f'{date_column}__gte': start})
+    if date_to:
+        if is_datetime:
+            end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+            queryset = queryset.filter(**{f'{date_column}__lt': end})
+        else:
+            queryset = queryset.filter(**{f'{date_column}__lte': date_to})
+    if status and has_status:
+        queryset = queryset.filter(status=status)
+    return columns, queryset.values_list(*columns)
+
+
+def iter_rows(queryset):
+    # values_list + iterator: a server-side cursor on PostgreSQL, no model instances
+    return queryset.iterator(chunk_size=CHUNK_SIZE)
+
+
+def csv_lines(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % CHUNK_SIZE == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def jsonl_lines(columns, rows):
+    encoder = DjangoJSONEncoder()
+    lines = []
+    for row in rows:
+        lines.append(encoder.encode(dict(zip(columns, row))))
+        if len(lines) == CHUNK_SIZE:
+            yield ('\n'.join(lines) + '\n').encode()
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode()
+
+
+def gzipped(chunks, level=6):
+    """Compress a stream of byte chunks into one gzip stream as it goes."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(name, fmt, compress=False, **filters):
+    """Byte chunks of a whole export; memory use stays flat however many rows there are."""
+    columns, queryset = export_queryset(name, **filters)
+    writer = csv_lines if fmt == 'csv' else jsonl_lines
+    chunks = writer(columns, iter_rows(queryset))
+    return gzipped(chunks) if compress else chunks
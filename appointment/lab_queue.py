@@ -0,0 +1,319 @@
+import heapq
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .models import Prescription
+
+User = get_user_model()
+
+DEFAULTS = {
+    # How long a claim holds a prescription before it returns to the queue (seconds)
+    'LEASE_SECONDS': 30 * 60,
+    'MAX_CLAIM': 20,
+    # Put new lab prescriptions on the least-loaded technician automatically
+    'AUTO_ASSIGN': True,
+    # Relative effort per lab_test_type (MedicalReport.REPORT_TYPE_CHOICES)
+    'TEST_COSTS': {
+        'blood_test': 1,
+        'urine_test': 1,
+        'ecg': 1,
+        'x_ray': 2,
+        'ultrasound': 2,
+        'ct_scan': 4,
+        'mri': 5,
+        'other': 1,
+    },
+    'DEFAULT_TEST_COST': 1,
+    # Serve earlier appointments first when claiming and rebalancing
+    'PRIORITIZE_BY_APPOINTMENT_DATE': False,
+    # The load table is rebuilt from the database this often, correcting any drift (seconds)
+    'LOAD_TABLE_TIMEOUT': 300,
+}
+
+PERCENTILES = (50, 90, 99)
+
+TECHNICIANS_KEY = 'lab_queue:technicians'
+LOAD_KEY = 'lab_queue:load:{technician_id}'
+
+
+def get_setting(name):
+    return getattr(settings, 'LAB_QUEUE', {}).get(name, DEFAULTS[name])
+
+
+def priority_order():
+    if get_setting('PRIORITIZE_BY_APPOINTMENT_DATE'):
+        return [F('appointment_date').asc(nulls_last=True), 'created_at']
+    return ['created_at']
+
+
+def test_cost(test_type):
+    return get_setting('TEST_COSTS').get(test_type, get_setting('DEFAULT_TEST_COST'))
+
+
+def cost_expression():
+    """test_cost() as a database expression, for summing loads in one query"""
+    return Case(
+        *[When(lab_test_type=test_type, then=Value(cost)) for test_type, cost in get_setting('TEST_COSTS').items()],
+        default=Value(get_setting('DEFAULT_TEST_COST')),
+        output_field=IntegerField(),
+    )
+
+
+def load_contribution(state):
+    """(technician_id, cost) a prescription in the given lab_state() adds to the load table."""
+    if state is None:
+        return None
+    technician_id, lab_tests_required, status, test_type = state
+    if not (technician_id and lab_tests_required and status == 'pending'):
+        return None
+    return technician_id, test_cost(test_type)
+
+
+# Load table: open lab work per active technician, weighted by test cost.
+# Each technician's load is its own cache key so updates can use cache.incr
+# instead of rewriting the whole table.
+
+def build_load_table():
+    technicians = list(
+        User.objects.filter(user_type='lab_technician', is_active=True).order_by('pk').values_list('pk', flat=True)
+    )
+    loads = dict.fromkeys(technicians, 0)
+    rows = (
+        Prescription.objects.lab_queue()
+        .filter(lab_technician__in=technicians)
+        .order_by()
+        .values('lab_technician')
+        .annotate(load=Sum(cost_expression()))
+    )
+    for row in rows:
+        loads[row['lab_technician']] = row['load']
+
+    cache.set_many({LOAD_KEY.format(technician_id=pk): load for pk, load in loads.items()}, None)
+    # Technicians are listed with a timeout, so the whole table is rebuilt now and then
+    cache.set(TECHNICIANS_KEY, technicians, get_setting('LOAD_TABLE_TIMEOUT'))
+    return loads
+
+
+def get_load_table():
+    technicians = cache.get(TECHNICIANS_KEY)
+    if technicians is None:
+        return build_load_table()
+    keys = {pk: LOAD_KEY.format(technician_id=pk) for pk in technicians}
+    values = cache.get_many(keys.values())
+    if len(values) < len(keys):
+        return build_load_table()
+    return {pk: values[key] for pk, key in keys.items()}
+
+
+def adjust_load(technician_id, delta):
+    if not technician_id or not delta:
+        return
+    try:
+        cache.incr(LOAD_KEY.format(technician_id=technician_id), delta)
+    except ValueError:
+        # Not in the table yet; the next rebuild counts it
+        pass
+
+
+def record_change(old_state, new_state):
+    """Move a prescription's cost between technicians after it was saved or deleted."""
+    old = load_contribution(old_state)
+    new = load_contribution(new_state)
+    if old == new:
+        return
+    if old:
+        adjust_load(old[0], -old[1])
+    if new:
+        adjust_load(new[0], new[1])
+
+
+def record_changes(changes):
+    """record_change() for (old state, new state) pairs, one cache update per technician."""
+    deltas = Counter()
+    for old_state, new_state in changes:
+        old, new = load_contribution(old_state), load_contribution(new_state)
+        if old == new:
+            continue
+        if old:
+            deltas[old[0]] -= old[1]
+        if new:
+            deltas[new[0]] += new[1]
+    for technician_id, delta in deltas.items():
+        adjust_load(technician_id, delta)
+
+
+def invalidate_technicians():
+    cache.delete(TECHNICIANS_KEY)
+
+
+def pick_technician():
+    """Active lab technician with the least open work, or None if there are none."""
+    loads = get_load_table()
+    if not loads:
+        return None
+    return min(loads, key=lambda pk: (loads[pk], pk))
+
+
+def auto_assign(prescription):
+    """Fill in lab_technician for a new prescription that needs lab work."""
+    if not get_setting('AUTO_ASSIGN'):
+        return
+    if prescription.lab_technician_id or not prescription.lab_tests_required:
+        return
+    if prescription.status != 'pending':
+        return
+    prescription.lab_technician_id = pick_technician()
+
+
+def claim(technician, count=1):
+    """
+    Assign up to `count` of the oldest claimable prescriptions to `technician`.
+
+    Candidate rows are locked with FOR UPDATE SKIP LOCKED, so concurrent
+    claims never wait on each other or hand out the same row twice. Each
+    claim is a lease; if the work isn't finished before it expires, the row
+    can be claimed again.
+    """
+    count = max(1, min(count, get_setting('MAX_CLAIM')))
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            Prescription.objects.claimable(now, technician)
+            .select_for_update(skip_locked=True)
+            .order_by(*priority_order())
+            .values_list('pk', 'lab_technician_id', 'lab_test_type')[:count]
+        )
+        ids = [pk for pk, _, _ in rows]
+        if ids:
+            Prescription.objects.filter(pk__in=ids).update(
+                lab_technician=technician,
+                lab_claimed_at=now,
+                lab_lease_expires_at=now + timedelta(seconds=get_setting('LEASE_SECONDS')),
+            )
+
+    # update() skips the save signals, so move the load here
+    for _, previous, test_type in rows:
+        adjust_load(previous, -test_cost(test_type))
+    adjust_load(technician.pk, sum(test_cost(test_type) for _, _, test_type in rows))
+    return Prescription.objects.filter(pk__in=ids).order_by(*priority_order())
+
+
+def stats():
+    """
+    Queue depth and wait-time percentiles for pending lab work.
+
+    Percentiles are read with one indexed OFFSET query each instead of
+    loading every row's timestamp.
+    """
+    now = timezone.now()
+    queue = Prescription.objects.lab_queue()
+    depth = queue.count()
+    unclaimed = Prescription.objects.unclaimed(now)
+    waiting = unclaimed.count()
+
+    ages = {}
+    if waiting:
+        # Newest first, so a higher offset means an older row
+        newest_first = unclaimed.order_by('-created_at').values_list('created_at', flat=True)
+        for percentile in PERCENTILES:
+            created_at = newest_first[round(percentile / 100 * (waiting - 1))]
+            ages[f'p{percentile}'] = (now - created_at).total_seconds()
+        ages['max'] = (now - unclaimed.order_by('created_at').values_list('created_at', flat=True)[0]).total_seconds()
+
+    return {
+        'depth': depth,
+        'waiting': waiting,
+        'claimed': depth - waiting,
+        'age_seconds': ages,
+        'lease_seconds': get_setting('LEASE_SECONDS'),
+    }
+
+
+def rebalance(batch_size=500):
+    """
+    Move unstarted lab work from overloaded technicians to idle ones.
+
+    Only rows nobody has actively claimed are moved: ones the scheduler
+    assigned (never claimed) and ones whose lease ran out. Loads are
+    recomputed with one grouped query and moves are planned in memory.
+    Each batch then locks the planned rows that are still unclaimed and
+    still with their planned source, skipping any a claim holds, and moves
+    them with one UPDATE per (receiving, giving) technician pair.
+    Returns the number of prescriptions moved.
+    """
+    loads = build_load_table()
+    if len(loads) < 2:
+        return 0
+
+    now = timezone.now()
+    movable = (
+        Prescription.objects.unclaimed(now)
+        .filter(lab_technician__in=list(loads))
+        .order_by(*priority_order())
+        .values_list('pk', 'lab_technician_id', 'lab_test_type')
+    )
+
+    # Least-loaded technician first
+    heap = [(load, pk) for pk, load in loads.items()]
+    heapq.heapify(heap)
+    moves = defaultdict(list)
+    planned = moved = 0
+    for pk, source, test_type in movable.iterator(chunk_size=batch_size):
+        cost = test_cost(test_type)
+        target_load, target = heap[0]
+        # Only move if it leaves the pair more even than before
+        if target == source or target_load + cost >= loads[source]:
+            continue
+        heapq.heapreplace(heap, (target_load + cost, target))
+        loads[target] = target_load + cost
+        loads[source] -= cost
+        # The source's heap entry is stale now; re-push it with its new load
+        heap = [(load, tech) for load, tech in heap if tech != source]
+        heap.append((loads[source], source))
+        heapq.heapify(heap)
+        moves[target, source].append(pk)
+        planned += 1
+        if planned % batch_size == 0:
+            moved += _apply_moves(moves)
+            moves = defaultdict(list)
+
+    return moved + _apply_moves(moves)
+
+
+def _apply_moves(moves):
+    """
+    Write planned moves ({(target, source): [pk, ...]}) for the rows that
+    still qualify, and move their cost in the load table. The load table
+    is adjusted rather than overwritten, so concurrent changes survive.
+    """
+    deltas = Counter()
+    moved = 0
+    with transaction.atomic():
+        now = timezone.now()
+        for (target, source), ids in moves.items():
+            rows = list(
+                Prescription.objects.unclaimed(now)
+                .filter(pk__in=ids, lab_technician_id=source)
+                .select_for_update(skip_locked=True)
+                .values_list('pk', 'lab_test_type')
+            )
+            if not rows:
+                continue
+            Prescription.objects.filter(pk__in=[pk for pk, _ in rows]).update(
+                lab_technician_id=target, lab_claimed_at=None, lab_lease_expires_at=None
+            )
+            cost = sum(test_cost(test_type) for _, test_type in rows)
+            deltas[source] -= cost
+            deltas[target] += cost
+            moved += len(rows)
+
+    for technician_id, delta in deltas.items():
+        adjust_load(technician_id, delta)
+    return moved
@@ -0,0 +1,45 @@
+import sys
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from appointment import exports
+
+
+class Command(BaseCommand):
+    help = 'Stream appointments, prescriptions or medical reports to CSV or JSONL, optionally gzipped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(exports.EXPORTS))
+        parser.add_argument('--format', choices=sorted(exports.FORMATS), default='csv')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--output', '-o', help="File to write; defaults to stdout")
+        parser.add_argument('--date-from', type=date.fromisoformat, help='YYYY-MM-DD, inclusive')
+        parser.add_argument('--date-to', type=date.fromisoformat, help='YYYY-MM-DD, inclusive')
+        parser.add_argument('--status')
+
+    def handle(self, *args, **options):
+        if options['status'] and not exports.EXPORTS[options['name']][3]:
+            raise CommandError(f"{options['name']} can't be filtered by status")
+
+        chunks = exports.stream(
+            options['name'], options['format'], compress=options['gzip'],
+            date_from=options['date_from'], date_to=options['date_to'], status=options['status'],
+        )
+        started = time.perf_counter()
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        written = 0
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
+
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Wrote {written} bytes to {options['output']} in {time.perf_counter() - started:.1f}s"
+            ))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from appointment import uploads
+
+
+class Command(BaseCommand):
+    help = 'Delete spooled chunks of report uploads that were never finalized'
+
+    def handle(self, *args, **options):
+        purged = uploads.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} abandoned uploads'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from appointment import lab_queue
+
+
+class Command(BaseCommand):
+    help = (
+        'Spread unstarted lab work evenly across active lab technicians. '
+        'Meant to run periodically (e.g. from cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Moves written per transaction')
+
+    def handle(self, *args, **options):
+        moved = lab_queue.rebalance(options['batch_size'])
+        loads = lab_queue.get_load_table()
+        for technician_id, load in sorted(loads.items()):
+            self.stdout.write(f'technician {technician_id}: load {load}')
+        self.stdout.write(self.style.SUCCESS(f'Moved {moved} prescriptions'))
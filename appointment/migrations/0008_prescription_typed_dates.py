@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-19 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Add typed date/time columns next to the old strings; 0009 fills them."""
+
+    dependencies = [
+        ('appointment', '0007_prescription_doctor_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prescription',
+            name='appointment_date_value',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='prescription',
+            name='appointment_time_value',
+            field=models.TimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,131 @@
+# Generated by Django 5.1.15 on 2026-10-19 14:10
+
+from datetime import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+CHUNK_SIZE = 2000
+# Unparseable values listed in the migrate output; all of them are kept in
+# appointment_unparsedprescriptiondate
+REPORT_LIMIT = 50
+
+# Copied from appointment.models so this migration doesn't change if they do
+DATE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%d/%m/%Y', '%d-%m-%Y', '%b %d, %Y', '%B %d, %Y')
+TIME_FORMATS = ('%H:%M:%S', '%H:%M:%S.%f', '%H:%M', '%I:%M %p', '%I:%M:%S %p')
+
+
+def parse(value, formats, convert):
+    value = (value or '').strip()
+    if not value:
+        return None
+    for fmt in formats:
+        try:
+            return convert(datetime.strptime(value, fmt))
+        except ValueError:
+            continue
+    raise ValueError(value)
+
+
+def backfill(apps, schema_editor):
+    """
+    Parse the string columns into the typed ones in primary key chunks.
+
+    Unparseable values fall back to the linked appointment when there is
+    one. The original strings are copied to UnparsedPrescriptionDate, since
+    0010 drops the columns, and reported in the migrate output so they can
+    be fixed by hand.
+    """
+    Prescription = apps.get_model('appointment', 'Prescription')
+    Appointment = apps.get_model('appointment', 'Appointment')
+    UnparsedPrescriptionDate = apps.get_model('appointment', 'UnparsedPrescriptionDate')
+    unparseable = []
+    last_pk = 0
+    while True:
+        chunk = list(
+            Prescription.objects.filter(pk__gt=last_pk).order_by('pk')
+            .only('pk', 'appointment_id', 'appointment_date', 'appointment_time')[:CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        last_pk = chunk[-1].pk
+        appointments = Appointment.objects.only('appointment_date', 'appointment_time').in_bulk(
+            {row.appointment_id for row in chunk if row.appointment_id}
+        )
+
+        for row in chunk:
+            appointment = appointments.get(row.appointment_id)
+            try:
+                row.appointment_date_value = parse(row.appointment_date, DATE_FORMATS, datetime.date)
+            except ValueError:
+                unparseable.append((row.pk, 'appointment_date', row.appointment_date))
+                row.appointment_date_value = appointment.appointment_date if appointment else None
+            try:
+                row.appointment_time_value = parse(row.appointment_time, TIME_FORMATS, datetime.time)
+            except ValueError:
+                unparseable.append((row.pk, 'appointment_time', row.appointment_time))
+                row.appointment_time_value = appointment.appointment_time if appointment else None
+
+        Prescription.objects.bulk_update(chunk, ['appointment_date_value', 'appointment_time_value'])
+
+    if unparseable:
+        UnparsedPrescriptionDate.objects.bulk_create([
+            UnparsedPrescriptionDate(prescription_id=pk, field=field, value=value)
+            for pk, field, value in unparseable
+        ], batch_size=CHUNK_SIZE)
+        print(
+            f'\n  {len(unparseable)} prescription date/time values could not be parsed; '
+            'the originals are kept in appointment_unparsedprescriptiondate'
+        )
+        for pk, field, value in unparseable[:REPORT_LIMIT]:
+            print(f'    prescription {pk} {field}={value!r}')
+        if len(unparseable) > REPORT_LIMIT:
+            print(f'    ... {len(unparseable) - REPORT_LIMIT} more')
+
+
+def restore(apps, schema_editor):
+    Prescription = apps.get_model('appointment', 'Prescription')
+    UnparsedPrescriptionDate = apps.get_model('appointment', 'UnparsedPrescriptionDate')
+    last_pk = 0
+    while True:
+        chunk = list(Prescription.objects.filter(pk__gt=last_pk).order_by('pk')[:CHUNK_SIZE])
+        if not chunk:
+            break
+        last_pk = chunk[-1].pk
+        originals = {
+            (pk, field): value for pk, field, value in UnparsedPrescriptionDate.objects.filter(
+                prescription__in=chunk
+            ).values_list('prescription_id', 'field', 'value')
+        }
+        for row in chunk:
+            row.appointment_date = originals.get((row.pk, 'appointment_date'), (
+                str(row.appointment_date_value) if row.appointment_date_value else None
+            ))
+            row.appointment_time = originals.get((row.pk, 'appointment_time'), (
+                str(row.appointment_time_value) if row.appointment_time_value else None
+            ))
+        Prescription.objects.bulk_update(chunk, ['appointment_date', 'appointment_time'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0008_prescription_typed_dates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnparsedPrescriptionDate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=20)),
+                ('value', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('prescription', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE, related_name='unparsed_dates',
+                    to='appointment.prescription',
+                )),
+            ],
+        ),
+        migrations.RunPython(backfill, restore),
+    ]
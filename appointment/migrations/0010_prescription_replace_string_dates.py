@@ -0,0 +1,41 @@
+# Generated by Django 5.1.15 on 2026-10-19 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0009_backfill_prescription_dates'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='prescription',
+            name='appointment_date',
+        ),
+        migrations.RemoveField(
+            model_name='prescription',
+            name='appointment_time',
+        ),
+        migrations.RenameField(
+            model_name='prescription',
+            old_name='appointment_date_value',
+            new_name='appointment_date',
+        ),
+        migrations.RenameField(
+            model_name='prescription',
+            old_name='appointment_time_value',
+            new_name='appointment_time',
+        ),
+        migrations.AlterField(
+            model_name='prescription',
+            name='appointment_date',
+            field=models.DateField(blank=True, db_index=True, help_text='Date of the appointment', null=True),
+        ),
+        migrations.AlterField(
+            model_name='prescription',
+            name='appointment_time',
+            field=models.TimeField(blank=True, help_text='Time of the appointment', null=True),
+        ),
+    ]
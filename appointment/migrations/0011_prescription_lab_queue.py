@@ -0,0 +1,29 @@
+# Generated by Django 5.1.15 on 2026-10-19 13:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0010_prescription_replace_string_dates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prescription',
+            name='lab_claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='prescription',
+            name='lab_lease_expires_at',
+            field=models.DateTimeField(blank=True, help_text='The claim lapses and the row returns to the lab queue after this time', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(condition=models.Q(('lab_tests_required', True), ('status', 'pending')), fields=['created_at'], name='pending_lab_queue_idx'),
+        ),
+    ]
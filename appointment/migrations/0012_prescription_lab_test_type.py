@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-19 13:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0011_prescription_lab_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prescription',
+            name='lab_test_type',
+            field=models.CharField(blank=True, choices=[('blood_test', 'Blood Test'), ('urine_test', 'Urine Test'), ('x_ray', 'X-Ray'), ('mri', 'MRI Scan'), ('ct_scan', 'CT Scan'), ('ultrasound', 'Ultrasound'), ('ecg', 'ECG'), ('other', 'Other')], help_text="Kind of lab work; weights the technician's load when assigning", max_length=20, null=True),
+        ),
+    ]
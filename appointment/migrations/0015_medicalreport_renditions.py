@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-19 14:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0014_storedblob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicalreport',
+            name='preview',
+            field=models.FileField(blank=True, editable=False, max_length=255, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='medicalreport',
+            name='rendition_source',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 of the file the renditions were made from', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='medicalreport',
+            name='thumbnail',
+            field=models.FileField(blank=True, editable=False, max_length=255, upload_to=''),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.15 on 2026-10-19 14:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0015_medicalreport_renditions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', '-created_at', '-id'], name='appt_patient_timeline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalreport',
+            index=models.Index(fields=['patient', '-created_at', '-id'], name='report_patient_timeline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['patient', '-created_at', '-id'], name='rx_patient_timeline_idx'),
+        ),
+    ]
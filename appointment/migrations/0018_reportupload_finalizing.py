@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-19 14:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0017_prescription_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reportupload',
+            name='status',
+            field=models.CharField(choices=[('uploading', 'Uploading'), ('finalizing', 'Finalizing'), ('complete', 'Complete'), ('failed', 'Failed')], default='uploading', max_length=20),
+        ),
+    ]
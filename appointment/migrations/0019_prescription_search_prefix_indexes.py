@@ -0,0 +1,32 @@
+from django.db import migrations
+
+COLUMNS = ('patient_name', 'doctor_name')
+
+
+def create_prefix_indexes(apps, schema_editor):
+    # For the admin's prefix search, UPPER(column) LIKE 'TERM%' on PostgreSQL
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS appointment_prescription_{column}_upper_idx '
+            f'ON appointment_prescription (UPPER({column}::text) text_pattern_ops)'
+        )
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS appointment_prescription_{column}_upper_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0018_reportupload_finalizing'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
@@ -1,9 +1,85 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import FileExtensionValidator
+from .storage import get_report_storage
 
 User = get_user_model()
 
+# Formats accepted for prescription dates/times besides ISO 8601. Older
+# clients sent free-text strings; these cover the ones seen in the data.
+PRESCRIPTION_DATE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%d/%m/%Y', '%d-%m-%Y', '%b %d, %Y', '%B %d, %Y')
+PRESCRIPTION_TIME_FORMATS = ('%H:%M:%S', '%H:%M:%S.%f', '%H:%M', '%I:%M %p', '%I:%M:%S %p')
+
+def is_admin_user(user):
+    return user.is_superuser or user.is_staff
+
+
+class AppointmentQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """Appointments the user may see, with the relations the API renders already joined."""
+        if user.user_type == 'doctor':
+            return self.filter(doctor=user).select_related('patient', 'doctor')
+        elif user.user_type == 'patient':
+            return self.filter(patient=user).select_related('doctor', 'patient')
+        elif is_admin_user(user):
+            return self.select_related('doctor', 'patient')
+        return self.none()
+
+
+class MedicalReportQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """Reports the user may see, with the relations the API renders already joined."""
+        if user.user_type == 'lab_technician':
+            return self.filter(lab_technician=user).select_related('patient', 'doctor', 'lab_technician')
+        elif user.user_type == 'doctor':
+            return self.filter(doctor=user).select_related('patient', 'lab_technician', 'doctor')
+        elif user.user_type == 'patient':
+            return self.filter(patient=user).select_related('doctor', 'lab_technician', 'patient')
+        elif is_admin_user(user):
+            return self.select_related('patient', 'doctor', 'lab_technician')
+        return self.none()
+
+
+class PrescriptionQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """
+        Prescriptions the user may see. The API renders related users as ids,
+        so nothing is joined.
+        """
+        if user.user_type == 'doctor':
+            return self.filter(doctor=user)
+        elif user.user_type == 'patient':
+            return self.filter(patient=user)
+        elif user.user_type == 'lab_technician':
+            # Lab technicians see all prescriptions
+            return self.all()
+        elif is_admin_user(user):
+            return self.all()
+        return self.none()
+
+    def lab_queue(self):
+        """Pending prescriptions waiting on lab work (served by pending_lab_queue_idx)."""
+        return self.filter(lab_tests_required=True, status='pending')
+
+    def unclaimed(self, now):
+        """Queue rows no technician is actively working on (never claimed, or lease ran out)."""
+        return self.lab_queue().filter(
+            models.Q(lab_claimed_at__isnull=True) | models.Q(lab_lease_expires_at__lt=now)
+        )
+
+    def claimable(self, now, technician=None):
+        """
+        Queue rows `technician` may claim: unassigned ones, ones whose lease
+        has run out, and ones the scheduler assigned to them.
+        """
+        available = models.Q(lab_technician__isnull=True) | models.Q(lab_lease_expires_at__lt=now)
+        if technician is not None:
+            available |= models.Q(lab_technician=technician, lab_claimed_at__isnull=True)
+        return self.lab_queue().filter(available)
+
+
 class Appointment(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
@@ -53,12 +129,47 @@ class Appointment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = AppointmentQuerySet.as_manager()
+
+    # What the analytics rollups count an appointment under
+    ROLLUP_FIELDS = ('doctor_id', 'status', 'appointment_date', 'appointment_time')
+    _loaded_rollup_state = None
+
     class Meta:
         ordering = ['-appointment_date', '-appointment_time']
+        indexes = [
+            # Patient timeline reads (appointment.timeline)
+            models.Index(fields=['patient', '-created_at', '-id'], name='appt_patient_timeline_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the analytics rollups counted this row under
+        instance._loaded_rollup_state = instance.rollup_state()
+        return instance
+
+    def rollup_state(self):
+        """ROLLUP_FIELDS as currently set"""
+        return tuple(self.__dict__.get(field) for field in self.ROLLUP_FIELDS)
 
     def __str__(self):
         return f"Appointment with Dr. {self.doctor.get_full_name()} on {self.appointment_date} at {self.appointment_time}"
 
+class StoredBlob(models.Model):
+    """
+    One physical file in content-addressed storage (appointment.storage),
+    shared by every row whose file has the same SHA-256.
+    """
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=255, unique=True, help_text="Name in the storage backend")
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
 class MedicalReport(models.Model):
     REPORT_TYPE_CHOICES = (
         ('blood_test', 'Blood Test'),
@@ -79,20 +190,84 @@ class MedicalReport(models.Model):
     report_type = models.CharField(max_length=20, choices=REPORT_TYPE_CHOICES)
     report_file = models.FileField(
         upload_to='reports/%Y/%m/%d/',
+        storage=get_report_storage,
         validators=[FileExtensionValidator(allowed_extensions=['pdf', 'jpg', 'jpeg', 'png'])]
     )
     description = models.TextField(help_text="Description of the report")
     notes = models.TextField(blank=True, help_text="Additional notes")
+
+    # Downscaled JPEGs of image reports, made in the background (appointment.renditions)
+    thumbnail = models.FileField(max_length=255, blank=True, editable=False)
+    preview = models.FileField(max_length=255, blank=True, editable=False)
+    rendition_source = models.CharField(
+        max_length=64, blank=True, editable=False,
+        help_text="SHA-256 of the file the renditions were made from"
+    )
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = MedicalReportQuerySet.as_manager()
+
+    ROLLUP_FIELDS = ('doctor_id', 'report_type', 'created_at')
+    _loaded_report_file = None
+    _loaded_rollup_state = None
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['patient', '-created_at', '-id'], name='report_patient_timeline_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored file so replacing it releases the old blob
+        instance._loaded_report_file = instance.__dict__.get('report_file')
+        instance._loaded_rollup_state = instance.rollup_state()
+        return instance
+
+    def rollup_state(self):
+        """ROLLUP_FIELDS as currently set"""
+        return tuple(self.__dict__.get(field) for field in self.ROLLUP_FIELDS)
 
     def __str__(self):
         return f"{self.get_report_type_display()} for {self.patient.get_full_name()} - {self.created_at.strftime('%Y-%m-%d')}"
 
+class ReportUpload(models.Model):
+    """
+    A medical report file being uploaded in chunks. Bytes are spooled to
+    disk (see appointment.uploads) and only become a MedicalReport when the
+    upload is finalized and its checksum matches.
+    """
+    STATUS_CHOICES = (
+        ('uploading', 'Uploading'),
+        ('finalizing', 'Finalizing'),
+        ('complete', 'Complete'),
+        ('failed', 'Failed'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='report_uploads')
+    report_type = models.CharField(max_length=20, choices=MedicalReport.REPORT_TYPE_CHOICES)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField(help_text="Total size in bytes, declared when the upload starts")
+    sha256 = models.CharField(max_length=64, help_text="Expected hex SHA-256 of the whole file")
+    received = models.BigIntegerField(default=0, help_text="Bytes received so far; the next chunk's offset")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    medical_report = models.OneToOneField(
+        MedicalReport, on_delete=models.SET_NULL, related_name='upload', null=True, blank=True
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size} bytes)"
+
 class Prescription(models.Model):
     """
     Prescription model to store doctor's prescriptions for patients.
@@ -145,18 +320,17 @@ class Prescription(models.Model):
         help_text="Doctor's specialty or profession"
     )
     
-    appointment_date = models.CharField(
-        max_length=20, 
+    appointment_date = models.DateField(
         blank=True, 
         null=True, 
-        help_text="Date of the appointment (YYYY-MM-DD)"
+        db_index=True,
+        help_text="Date of the appointment"
     )
     
-    appointment_time = models.CharField(
-        max_length=20, 
+    appointment_time = models.TimeField(
         blank=True, 
         null=True, 
-        help_text="Time of the appointment (HH:MM:SS)"
+        help_text="Time of the appointment"
     )
     
     symptoms = models.TextField(
@@ -185,6 +359,14 @@ class Prescription(models.Model):
         null=True, 
         help_text="Instructions for the lab technician"
     )
+
+    lab_test_type = models.CharField(
+        max_length=20, 
+        choices=MedicalReport.REPORT_TYPE_CHOICES, 
+        blank=True, 
+        null=True, 
+        help_text="Kind of lab work; weights the technician's load when assigning"
+    )
     
     lab_technician = models.ForeignKey(
         User, 
@@ -200,6 +382,14 @@ class Prescription(models.Model):
         null=True, 
         help_text="Results from lab tests"
     )
+
+    # Set when a lab technician claims the row from the lab queue
+    lab_claimed_at = models.DateTimeField(blank=True, null=True)
+    lab_lease_expires_at = models.DateTimeField(
+        blank=True, 
+        null=True, 
+        help_text="The claim lapses and the row returns to the lab queue after this time"
+    )
     
     # Status tracking
     status = models.CharField(
@@ -222,10 +412,45 @@ class Prescription(models.Model):
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = PrescriptionQuerySet.as_manager()
+
+    ROLLUP_FIELDS = ('doctor_id', 'status', 'created_at')
+    _loaded_lab_state = None
+    _loaded_rollup_state = None
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['patient', '-created_at', '-id'], name='rx_patient_timeline_idx'),
+            # The list view's date range within a doctor's or patient's prescriptions
+            models.Index(fields=['doctor', 'appointment_date'], name='rx_doctor_date_idx'),
+            models.Index(fields=['patient', 'appointment_date'], name='rx_patient_date_idx'),
+            # Only pending lab work is indexed, so the queue stays small however big the table gets
+            models.Index(
+                fields=['created_at'],
+                name='pending_lab_queue_idx',
+                condition=models.Q(lab_tests_required=True, status='pending'),
+            ),
+        ]
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored assignment so the lab load table can be adjusted on save
+        instance._loaded_lab_state = instance.lab_state()
+        instance._loaded_rollup_state = instance.rollup_state()
+        return instance
+
+    def lab_state(self):
+        """(lab_technician_id, lab_tests_required, status, lab_test_type) as currently set"""
+        fields = ('lab_technician_id', 'lab_tests_required', 'status', 'lab_test_type')
+        return tuple(self.__dict__.get(field) for field in fields)
+
+    def rollup_state(self):
+        """ROLLUP_FIELDS as currently set"""
+        return tuple(self.__dict__.get(field) for field in self.ROLLUP_FIELDS)
+
     def __str__(self):
         if self.patient_name and self.doctor_name:
             return f"Prescription for {self.patient_name} by {self.doctor_name}"
@@ -248,12 +473,27 @@ class Prescription(models.Model):
             self.doctor_profession = self.doctor.get_profession_display()
             
         if not self.appointment_date and self.appointment:
-            self.appointment_date = str(self.appointment.appointment_date)
+            self.appointment_date = self.appointment.appointment_date
             
         if not self.appointment_time and self.appointment:
-            self.appointment_time = str(self.appointment.appointment_time)
+            self.appointment_time = self.appointment.appointment_time
             
         if not self.symptoms and self.appointment:
             self.symptoms = self.appointment.symptoms
             
         super().save(*args, **kwargs)
+
+
+class UnparsedPrescriptionDate(models.Model):
+    """
+    A legacy appointment_date/appointment_time string migration 0009 couldn't
+    parse, kept after 0010 dropped the string columns so it can be fixed by
+    hand. The prescription got the appointment's value, or NULL, instead.
+    """
+    prescription = models.ForeignKey(Prescription, on_delete=models.CASCADE, related_name='unparsed_dates')
+    field = models.CharField(max_length=20)
+    value = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Prescription #{self.prescription_id} {self.field}={self.value!r}"
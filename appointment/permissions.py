@@ -0,0 +1,46 @@
+from rest_framework.permissions import BasePermission, SAFE_METHODS
+from .models import is_admin_user
+
+
+class HasRole(BasePermission):
+    """
+    Allows users whose user_type is in the view's `allowed_roles`, plus admins.
+    Views without `allowed_roles` accept every role.
+    """
+    message = "Invalid user type"
+
+    def has_permission(self, request, view):
+        allowed_roles = getattr(view, 'allowed_roles', None)
+        user = request.user
+        return allowed_roles is None or user.user_type in allowed_roles or is_admin_user(user)
+
+
+class CanModifyAppointment(BasePermission):
+    """
+    Object-level rules for appointments. They are checked against the
+    object get_object() already fetched, so no second query is needed.
+    Which fields a role may change is checked in the view's perform_update.
+    """
+
+    def has_object_permission(self, request, view, obj):
+        user = request.user
+        if request.method in SAFE_METHODS or is_admin_user(user):
+            return True
+        if request.method == 'DELETE':
+            self.message = "Only the patient who created the appointment can delete it"
+            return user.user_type == 'patient' and obj.patient_id == user.id
+        return user.user_type in ('doctor', 'patient')
+
+
+class CanModifyMedicalReport(BasePermission):
+    """Only the lab technician who created a report, or an admin, may change it."""
+
+    def has_object_permission(self, request, view, obj):
+        user = request.user
+        if request.method in SAFE_METHODS or is_admin_user(user):
+            return True
+        if request.method == 'DELETE':
+            self.message = "You don't have permission to delete this report"
+        else:
+            self.message = "You don't have permission to update this report"
+        return user.user_type == 'lab_technician' and obj.lab_technician_id == user.id
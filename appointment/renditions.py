@@ -0,0 +1,161 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .models import MedicalReport, StoredBlob
+from .storage import content_digest
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Background threads making renditions; 0 makes them inline (tests, scripts)
+    'WORKERS': 2,
+    # name: (max width, max height, JPEG quality)
+    'SIZES': {
+        'thumbnail': (256, 256, 75),
+        'preview': (1280, 1280, 85),
+    },
+}
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+RENDITION_NAME = 'renditions/{digest}/{kind}.jpg'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_setting(name):
+    return getattr(settings, 'REPORT_RENDITIONS', {}).get(name, DEFAULTS[name])
+
+
+def is_image(name):
+    return os.path.splitext(name or '')[1].lower() in IMAGE_EXTENSIONS
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=get_setting('WORKERS'), thread_name_prefix='renditions')
+        return _pool
+
+
+def schedule(report):
+    """Make renditions for a report's current file once the transaction commits."""
+    if not is_image(report.report_file.name):
+        return
+    pk, name = report.pk, report.report_file.name
+
+    def submit():
+        if get_setting('WORKERS'):
+            get_pool().submit(_run, pk, name)
+        else:
+            generate(pk, name)
+
+    transaction.on_commit(submit)
+
+
+def _run(pk, name):
+    close_old_connections()
+    try:
+        generate(pk, name)
+    except Exception:
+        logger.exception('Rendition failed for medical report %s', pk)
+    finally:
+        close_old_connections()
+
+
+def render(source, sizes):
+    """
+    Decode an image once and return {kind: JPEG bytes} for each
+    (width, height, quality) in `sizes`, largest first.
+    """
+    renditions = {}
+    with Image.open(source) as image:
+        # Lets the JPEG decoder skip detail no rendition will use
+        largest = max(sizes.values())
+        image.draft('RGB', largest[:2])
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        for kind, (width, height, quality) in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+            # Each size is scaled down from the previous, larger one
+            image.thumbnail((width, height), Image.LANCZOS)
+            output = BytesIO()
+            image.save(output, 'JPEG', quality=quality, optimize=True, progressive=True)
+            renditions[kind] = output.getvalue()
+    return renditions
+
+
+def digest_for(report):
+    blob = StoredBlob.objects.filter(name=report.report_file.name).values_list('sha256', flat=True).first()
+    if blob:
+        return blob
+    with report.report_file.open('rb') as source:
+        return content_digest(source)
+
+
+def generate(pk, name):
+    """
+    Make and store every rendition for report `pk`, unless the file changed
+    since it was scheduled. Renditions are keyed by content hash, so a file
+    that was rendered before (for any report) is reused without decoding it.
+    """
+    report = MedicalReport.objects.filter(pk=pk, report_file=name).first()
+    if report is None:
+        return
+    digest = digest_for(report)
+    if report.rendition_source == digest:
+        return
+
+    existing = (
+        MedicalReport.objects.filter(rendition_source=digest)
+        .exclude(thumbnail='').values('thumbnail', 'preview').first()
+    )
+    if existing:
+        names = existing
+    else:
+        with report.report_file.open('rb') as source:
+            renditions = render(source, get_setting('SIZES'))
+        names = {
+            kind: default_storage.save(RENDITION_NAME.format(digest=digest, kind=kind), ContentFile(data))
+            for kind, data in renditions.items()
+        }
+
+    # update() so this doesn't fire the save signals again; skip it if the file changed meanwhile
+    MedicalReport.objects.filter(pk=pk, report_file=name).update(
+        thumbnail=names.get('thumbnail', ''), preview=names.get('preview', ''), rendition_source=digest
+    )
+
+
+def discard(report):
+    """
+    Clear a report's renditions (e.g. its file was replaced) and delete the
+    files unless another report with the same content still uses them.
+    """
+    # Renditions are written with update(), so the row may be newer than the instance
+    current = MedicalReport.objects.filter(pk=report.pk).values('thumbnail', 'preview', 'rendition_source').first()
+    if current is None:
+        current = {
+            'thumbnail': report.thumbnail.name, 'preview': report.preview.name,
+            'rendition_source': report.rendition_source,
+        }
+    if not current['rendition_source']:
+        return
+    MedicalReport.objects.filter(pk=report.pk).update(thumbnail='', preview='', rendition_source='')
+    shared = (
+        MedicalReport.objects.filter(rendition_source=current['rendition_source'])
+        .exclude(pk=report.pk).exists()
+    )
+    if not shared:
+        for name in (current['thumbnail'], current['preview']):
+            if name:
+                transaction.on_commit(lambda name=name: default_storage.delete(name))
@@ -1,17 +1,29 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Appointment, MedicalReport, Prescription
+from django.core.files import File
+from django.urls import reverse
+from .models import (
+    Appointment, MedicalReport, Prescription, ReportUpload,
+    PRESCRIPTION_DATE_FORMATS, PRESCRIPTION_TIME_FORMATS
+)
 from django.utils import timezone
 from datetime import datetime, time
+from zencare.serializers import SparseFieldsetMixin
 
 User = get_user_model()
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class AppointmentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     doctor_name = serializers.SerializerMethodField()
     patient_name = serializers.SerializerMethodField()
     doctor_profession = serializers.SerializerMethodField()
     status_display = serializers.SerializerMethodField()
 
+    field_relations = {
+        'doctor_name': ('doctor',),
+        'doctor_profession': ('doctor',),
+        'patient_name': ('patient',),
+    }
+
     class Meta:
         model = Appointment
         fields = (
@@ -95,27 +107,40 @@ class AppointmentSerializer(serializers.ModelSerializer):
         
         return data
 
-class MedicalReportSerializer(serializers.ModelSerializer):
+class MedicalReportSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
     doctor_name = serializers.SerializerMethodField()
     patient_name = serializers.SerializerMethodField()
     lab_technician_name = serializers.SerializerMethodField()
     report_type_display = serializers.SerializerMethodField()
+
+    field_relations = {
+        'doctor_name': ('doctor',),
+        'patient_name': ('patient',),
+        'lab_technician_name': ('lab_technician',),
+    }
     
     class Meta:
         model = MedicalReport
         fields = (
             'id', 'appointment', 'patient', 'doctor', 'lab_technician',
             'doctor_name', 'patient_name', 'lab_technician_name',
-            'report_type', 'report_type_display', 'report_file',
-            'description', 'notes', 'created_at', 'updated_at'
+            'report_type', 'report_type_display', 'report_file', 'thumbnail', 'preview',
+            'download_url', 'description', 'notes', 'created_at', 'updated_at'
         )
         read_only_fields = ('created_at', 'updated_at', 'doctor_name', 
                            'patient_name', 'lab_technician_name', 
-                           'report_type_display')
+                           'report_type_display', 'thumbnail', 'preview')
         # ✅ Add this to fix the error
         extra_kwargs = {
             'lab_technician': {'required': False}
         }
+    def get_download_url(self, obj):
+        """Authenticated download with Range/ETag support"""
+        url = reverse('appointment:medical-report-download', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
     def get_doctor_name(self, obj):
         if obj.doctor:
             return f"Dr. {obj.doctor.get_full_name()}"
@@ -179,7 +204,76 @@ class MedicalReportSerializer(serializers.ModelSerializer):
         
         return super().create(validated_data)
 
-class PrescriptionSerializer(serializers.ModelSerializer):
+class ReportUploadSerializer(serializers.ModelSerializer):
+    """Declares a chunked report upload; `received` is the offset for the next chunk"""
+    class Meta:
+        model = ReportUpload
+        fields = (
+            'id', 'report_type', 'filename', 'size', 'sha256',
+            'received', 'status', 'medical_report', 'created_at'
+        )
+        read_only_fields = ('received', 'status', 'medical_report', 'created_at')
+
+    def validate_filename(self, value):
+        # Fail at the start instead of after the whole file was sent
+        validator = MedicalReport._meta.get_field('report_file').validators[0]
+        validator(File(None, name=value))
+        return value
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Size must be positive")
+        return value
+
+    def validate_sha256(self, value):
+        if len(value) != 64 or any(c not in '0123456789abcdefABCDEF' for c in value):
+            raise serializers.ValidationError("Must be a hex SHA-256 digest")
+        return value.lower()
+
+class ResolvedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field that takes the object from context['resolved'][Model]
+    when the view has already loaded it, instead of querying again.
+    """
+    def to_internal_value(self, data):
+        if not isinstance(data, bool):
+            try:
+                pk = int(data)
+            except (TypeError, ValueError):
+                pk = None
+            resolved = self.context.get('resolved', {}).get(self.get_queryset().model, {})
+            if pk in resolved:
+                return resolved[pk]
+        return super().to_internal_value(data)
+
+class BlankAsNullMixin:
+    """Older clients send "" for unknown dates; treat it like null."""
+    def validate_empty_values(self, data):
+        if data == '':
+            data = None
+        return super().validate_empty_values(data)
+
+class PrescriptionDateField(BlankAsNullMixin, serializers.DateField):
+    def __init__(self, **kwargs):
+        kwargs.setdefault('input_formats', ['iso-8601', *PRESCRIPTION_DATE_FORMATS])
+        super().__init__(**kwargs)
+
+class PrescriptionTimeField(BlankAsNullMixin, serializers.TimeField):
+    def __init__(self, **kwargs):
+        kwargs.setdefault('input_formats', ['iso-8601', *PRESCRIPTION_TIME_FORMATS])
+        super().__init__(**kwargs)
+
+# The lab queue claim columns are only written by lab_queue.claim()
+PRESCRIPTION_READ_ONLY_FIELDS = ('created_at', 'updated_at', 'lab_claimed_at', 'lab_lease_expires_at')
+
+
+class PrescriptionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    serializer_related_field = ResolvedPrimaryKeyRelatedField
+
+    # Rendered as "YYYY-MM-DD" / "HH:MM:SS" strings, same as the old text columns
+    appointment_date = PrescriptionDateField(required=False, allow_null=True)
+    appointment_time = PrescriptionTimeField(required=False, allow_null=True)
+
     # Legacy field support for backward compatibility
     diagnosis = serializers.CharField(source='symptoms', required=False, allow_null=True, allow_blank=True, write_only=True)
     medication = serializers.CharField(source='prescription_text', required=False, allow_null=True, allow_blank=True, write_only=True)
@@ -194,38 +288,41 @@ class PrescriptionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Prescription
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at')
+        read_only_fields = PRESCRIPTION_READ_ONLY_FIELDS
         extra_kwargs = {
             field.name: {'required': False, 'allow_null': True}
             for field in Prescription._meta.get_fields()
-            if field.name not in ('id', 'created_at', 'updated_at')
+            if field.name != 'id' and field.name not in PRESCRIPTION_READ_ONLY_FIELDS
         }
     
+    def resolve(self, model, pk):
+        """Use objects the view already resolved (context['resolved']) before querying."""
+        resolved = self.context.get('resolved', {}).get(model, {})
+        if pk in resolved:
+            return resolved[pk]
+        return model.objects.filter(pk=pk).first() if pk else None
+
     def validate(self, data):
         # Handle ID fields
         if 'doctor_id' in data and 'doctor' not in data:
-            try:
-                data['doctor'] = User.objects.get(id=data.pop('doctor_id'))
-            except Exception:
-                pass
+            doctor = self.resolve(User, data.pop('doctor_id'))
+            if doctor:
+                data['doctor'] = doctor
                 
         if 'patient_id' in data and 'patient' not in data:
-            try:
-                data['patient'] = User.objects.get(id=data.pop('patient_id'))
-            except Exception:
-                pass
+            patient = self.resolve(User, data.pop('patient_id'))
+            if patient:
+                data['patient'] = patient
                 
         if 'appointment_id' in data and 'appointment' not in data:
-            try:
-                data['appointment'] = Appointment.objects.get(id=data.pop('appointment_id'))
-            except Exception:
-                pass
+            appointment = self.resolve(Appointment, data.pop('appointment_id'))
+            if appointment:
+                data['appointment'] = appointment
                 
         if 'lab_technician_id' in data and 'lab_technician' not in data:
-            try:
-                data['lab_technician'] = User.objects.get(id=data.pop('lab_technician_id'))
-            except Exception:
-                pass
+            lab_technician = self.resolve(User, data.pop('lab_technician_id'))
+            if lab_technician:
+                data['lab_technician'] = lab_technician
         
         return data
 
@@ -233,16 +330,43 @@ class PrescriptionUpdateSerializer(serializers.ModelSerializer):
     """
     Serializer for updating prescriptions with lab results
     """
+    appointment_date = PrescriptionDateField(required=False, allow_null=True)
+    appointment_time = PrescriptionTimeField(required=False, allow_null=True)
+
     class Meta:
         model = Prescription
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at')
+        read_only_fields = PRESCRIPTION_READ_ONLY_FIELDS
         extra_kwargs = {
             field.name: {'required': False, 'allow_null': True}
             for field in Prescription._meta.get_fields()
-            if field.name not in ('id', 'created_at', 'updated_at')
+            if field.name != 'id' and field.name not in PRESCRIPTION_READ_ONLY_FIELDS
         }
     
     def validate(self, data):
         # All validations are now optional
-        return data
\ No newline at end of file
+        return data
+
+class BulkStatusSerializer(serializers.Serializer):
+    """
+    Input for bulk status changes: either `ids`, or a `doctor` and `date`
+    to act on that doctor's whole day.
+    """
+    status = serializers.CharField()
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=1000)
+    doctor = serializers.IntegerField(required=False)
+    date = serializers.DateField(required=False)
+
+    def validate_status(self, value):
+        allowed = self.context['transitions']
+        if value not in allowed:
+            raise serializers.ValidationError(f"Must be one of: {', '.join(allowed)}.")
+        return value
+
+    def validate(self, data):
+        if 'ids' in data:
+            if 'doctor' in data or 'date' in data:
+                raise serializers.ValidationError("Give either ids or doctor and date, not both.")
+        elif 'doctor' not in data or 'date' not in data:
+            raise serializers.ValidationError("Give ids, or both doctor and date.")
+        return data
@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from . import lab_queue, renditions
+from .models import MedicalReport, Prescription
+from .storage import report_storage
+from .transitions import statuses_changed
+
+User = get_user_model()
+
+@receiver(pre_save, sender=Prescription)
+def assign_lab_technician(sender, instance, **kwargs):
+    """Put new lab work on the least-loaded technician"""
+    if instance._state.adding:
+        lab_queue.auto_assign(instance)
+
+@receiver(post_save, sender=Prescription)
+def update_lab_load_on_save(sender, instance, **kwargs):
+    """Keep the lab load table in step with assignment and status changes"""
+    state = instance.lab_state()
+    lab_queue.record_change(instance._loaded_lab_state, state)
+    instance._loaded_lab_state = state
+
+@receiver(post_delete, sender=Prescription)
+def update_lab_load_on_delete(sender, instance, **kwargs):
+    lab_queue.record_change(instance._loaded_lab_state or instance.lab_state(), None)
+
+@receiver(statuses_changed, sender=Prescription)
+def update_lab_load_on_bulk_change(sender, instances, **kwargs):
+    lab_queue.record_changes((instance._loaded_lab_state, instance.lab_state()) for instance in instances)
+    for instance in instances:
+        instance._loaded_lab_state = instance.lab_state()
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def handle_lab_technician_change(sender, instance, **kwargs):
+    """Re-read the technician list when one joins, leaves or is deactivated"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not {'user_type', 'is_active'} & set(update_fields):
+        return
+    if instance.user_type == 'lab_technician' or instance._loaded_user_type == 'lab_technician':
+        lab_queue.invalidate_technicians()
+
+@receiver(post_save, sender=MedicalReport)
+def handle_report_file_change(sender, instance, created, **kwargs):
+    """Release the replaced blob and (re)build renditions when a report's file changes"""
+    old_name = instance._loaded_report_file
+    if not created and old_name == instance.report_file.name:
+        return
+    if old_name:
+        report_storage.release(old_name)
+        renditions.discard(instance)
+    instance._loaded_report_file = instance.report_file.name
+    renditions.schedule(instance)
+
+@receiver(post_delete, sender=MedicalReport)
+def release_report_file(sender, instance, **kwargs):
+    """Delete the stored file and renditions once no report references them"""
+    report_storage.release(instance.report_file.name)
+    renditions.discard(instance)
@@ -0,0 +1,132 @@
+import hashlib
+import os
+
+from django.core.files.storage import Storage, default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+
+def content_digest(content):
+    """SHA-256 of a File, reusing the one computed during upload when present."""
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+    sha = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        sha.update(chunk)
+    content.seek(0)
+    return sha.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(Storage):
+    """
+    Stores each distinct file once, under a name derived from its SHA-256.
+
+    Files are written through the project's default storage, so this works
+    the same on FileSystemStorage and Cloudinary. StoredBlob tracks how many
+    rows reference each file: saving takes a reference (and only uploads the
+    first copy), and release() drops one, deleting the file with the last.
+    """
+
+    def __init__(self, prefix='blobs'):
+        self.prefix = prefix
+
+    @property
+    def backend(self):
+        return default_storage
+
+    def blob_name(self, digest, name):
+        extension = os.path.splitext(name)[1].lower()
+        return f'{self.prefix}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is chosen in _save from the content
+        return name
+
+    def _save(self, name, content):
+        from .models import StoredBlob
+
+        digest = content_digest(content)
+        with transaction.atomic():
+            # Locking the row keeps release() from deleting the file under us
+            blob = StoredBlob.objects.select_for_update().filter(pk=digest).first()
+            if blob is None:
+                blob = self._create_blob(digest, name, content)
+            StoredBlob.objects.filter(pk=digest).update(ref_count=F('ref_count') + 1)
+        return blob.name
+
+    def _create_blob(self, digest, name, content):
+        from .models import StoredBlob
+
+        stored_name = self.backend.save(self.blob_name(digest, name), content)
+        try:
+            with transaction.atomic():
+                return StoredBlob.objects.create(
+                    sha256=digest, name=stored_name, size=content.size, ref_count=0
+                )
+        except IntegrityError:
+            # Someone stored the same content concurrently; keep theirs
+            blob = StoredBlob.objects.select_for_update().get(pk=digest)
+            if blob.name != stored_name:
+                self.backend.delete(stored_name)
+            return blob
+
+    def release(self, name):
+        """Drop one reference to a stored file; delete it when none are left."""
+        from .models import StoredBlob
+
+        if not name:
+            return
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                # Stored before deduplication; not reference counted
+                return
+            if blob.ref_count > 1:
+                StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+                return
+            blob.delete()
+            transaction.on_commit(lambda: self.backend.delete(name))
+
+    # Everything else is the backend's business
+
+    def _open(self, name, mode='rb'):
+        return self.backend.open(name, mode)
+
+    def delete(self, name):
+        self.release(name)
+
+    def exists(self, name):
+        return self.backend.exists(name)
+
+    def listdir(self, path):
+        return self.backend.listdir(path)
+
+    def size(self, name):
+        return self.backend.size(name)
+
+    def url(self, name):
+        return self.backend.url(name)
+
+    def path(self, name):
+        return self.backend.path(name)
+
+    def get_accessed_time(self, name):
+        return self.backend.get_accessed_time(name)
+
+    def get_created_time(self, name):
+        return self.backend.get_created_time(name)
+
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
+
+
+report_storage = ContentAddressedStorage()
+
+
+def get_report_storage():
+    return report_storage
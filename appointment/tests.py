@@ -1,3 +1,787 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, time, timedelta
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.core import mail
+from django.db import connection
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from analytics.models import DailyRollup
+from backapp.models import User
+from notifications.models import Notification
+from . import lab_queue, uploads
+from .models import Appointment, MedicalReport, Prescription, ReportUpload, StoredBlob
+
+
+class PrescriptionCreateQueryTests(TestCase):
+    url = '/api/v1/appointment/prescriptions/create/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = User.objects.create_user(
+            email='doctor@example.com', password='x', user_type='doctor',
+            first_name='Ada', last_name='Lane', profession='dentist'
+        )
+        cls.patient = User.objects.create_user(
+            email='patient@example.com', password='x', user_type='patient',
+            first_name='Ben', last_name='Moss'
+        )
+        cls.appointment = Appointment.objects.create(
+            patient=cls.patient, doctor=cls.doctor, symptoms='Chest pain',
+            appointment_date=date(2024, 5, 1), appointment_time=time(10, 30)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+
+    def post(self, data):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, data, format='json', HTTP_HOST='localhost')
+        return response, [query['sql'] for query in ctx.captured_queries]
+
+    @staticmethod
+    def count(queries, verb, table):
+        # Match the statement's own table, not tables pulled in by joins
+        targets = {'SELECT': f'FROM "{table}"', 'INSERT': f'INTO "{table}"', 'UPDATE': f'UPDATE "{table}"'}
+        return sum(1 for sql in queries if sql.startswith(verb) and targets[verb] in sql)
+
+    def test_create_from_appointment_is_single_insert(self):
+        response, queries = self.post({
+            'appointmentId': self.appointment.id,
+            'prescription_text': 'Aspirin 75mg',
+        })
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.count(queries, 'INSERT', 'appointment_prescription'), 1)
+        self.assertEqual(self.count(queries, 'UPDATE', 'appointment_prescription'), 0)
+        self.assertEqual(self.count(queries, 'SELECT', 'appointment_appointment'), 1)
+        self.assertEqual(self.count(queries, 'SELECT', 'backapp_user'), 0)
+
+        prescription = Prescription.objects.get()
+        self.assertEqual(prescription.patient, self.patient)
+        self.assertEqual(prescription.doctor, self.doctor)
+        self.assertEqual(prescription.patient_name, 'Ben Moss')
+        self.assertEqual(prescription.doctor_name, 'Dr. Ada Lane')
+        self.assertEqual(prescription.symptoms, 'Chest pain')
+
+    def test_user_ids_resolved_in_one_query(self):
+        response, queries = self.post({
+            'doctorId': self.doctor.id,
+            'patientId': self.patient.id,
+            'prescription_text': 'Rest',
+        })
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.count(queries, 'SELECT', 'backapp_user'), 1)
+        self.assertEqual(self.count(queries, 'INSERT', 'appointment_prescription'), 1)
+        self.assertEqual(Prescription.objects.get().patient_name, 'Ben Moss')
+
+
+class PrescriptionDateFilterTests(TestCase):
+    url = '/api/v1/appointment/prescriptions/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = User.objects.create_user(
+            email='doctor@example.com', password='x', user_type='doctor', profession='dentist'
+        )
+        for day in (1, 10, 20):
+            Prescription.objects.create(doctor=cls.doctor, appointment_date=date(2024, 5, day), appointment_time=time(9, 0))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+
+    def get(self, **params):
+        return self.client.get(self.url, params, HTTP_HOST='localhost')
+
+    def test_range_is_inclusive_and_rendered_as_strings(self):
+        response = self.get(date_from='2024-05-10', date_to='2024-05-20', ordering='appointment_date')
+
+        self.assertEqual(response.status_code, 200)
+        rows = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([row['appointment_date'] for row in rows], ['2024-05-10', '2024-05-20'])
+        self.assertEqual(rows[0]['appointment_time'], '09:00:00')
+
+    def test_invalid_date_is_rejected(self):
+        response = self.get(date_from='10/05/2024')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date_from', response.data)
+
+
+@override_settings(LAB_QUEUE={'AUTO_ASSIGN': False})
+class LabQueueTests(TestCase):
+    claim_url = '/api/v1/appointment/lab-queue/claim/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tech_a = User.objects.create_user(email='a@example.com', password='x', user_type='lab_technician')
+        cls.tech_b = User.objects.create_user(email='b@example.com', password='x', user_type='lab_technician')
+        cls.pending = [Prescription.objects.create(lab_tests_required=True) for _ in range(3)]
+        Prescription.objects.create(lab_tests_required=True, status='completed')
+        Prescription.objects.create(lab_tests_required=False)
+
+    def claim(self, technician, count):
+        client = APIClient()
+        client.force_authenticate(technician)
+        return client.post(self.claim_url, {'count': count}, format='json', HTTP_HOST='localhost')
+
+    def test_claims_are_disjoint_and_oldest_first(self):
+        first = self.claim(self.tech_a, 2)
+        second = self.claim(self.tech_b, 5)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual([row['id'] for row in first.data], [p.id for p in self.pending[:2]])
+        self.assertEqual([row['id'] for row in second.data], [self.pending[2].id])
+        self.assertEqual(self.claim(self.tech_b, 1).data, [])
+
+    def test_expired_lease_returns_to_queue(self):
+        self.claim(self.tech_a, 3)
+        Prescription.objects.filter(pk=self.pending[1].pk).update(
+            lab_lease_expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        response = self.claim(self.tech_b, 3)
+
+        self.assertEqual([row['id'] for row in response.data], [self.pending[1].id])
+        self.assertEqual(Prescription.objects.get(pk=self.pending[1].pk).lab_technician, self.tech_b)
+
+    def test_stats(self):
+        self.claim(self.tech_a, 1)
+        client = APIClient()
+        client.force_authenticate(self.tech_a)
+
+        response = client.get('/api/v1/appointment/lab-queue/stats/', HTTP_HOST='localhost')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['depth'], response.data['waiting'], response.data['claimed']), (3, 2, 1))
+        self.assertEqual(set(response.data['age_seconds']), {'p50', 'p90', 'p99', 'max'})
+
+
+    def test_lease_not_writable_through_api(self):
+        self.claim(self.tech_a, 1)
+        claimed = Prescription.objects.get(pk=self.pending[0].pk)
+        client = APIClient()
+        client.force_authenticate(self.tech_b)
+
+        response = client.patch(f'/api/v1/appointment/prescriptions/{claimed.pk}/', {
+            'lab_lease_expires_at': '2099-01-01T00:00:00Z', 'lab_claimed_at': None, 'lab_results': 'done',
+        }, format='json', HTTP_HOST='localhost')
+
+        self.assertEqual(response.status_code, 200)
+        updated = Prescription.objects.get(pk=claimed.pk)
+        self.assertEqual(updated.lab_results, 'done')
+        self.assertEqual(updated.lab_lease_expires_at, claimed.lab_lease_expires_at)
+        self.assertEqual(updated.lab_claimed_at, claimed.lab_claimed_at)
+
+class LabAssignmentTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.techs = [
+            User.objects.create_user(email=f'tech{i}@example.com', password='x', user_type='lab_technician')
+            for i in range(3)
+        ]
+
+    def loads(self):
+        table = lab_queue.get_load_table()
+        return [table[tech.pk] for tech in self.techs]
+
+    def test_new_lab_work_goes_to_least_loaded_technician(self):
+        mri = Prescription.objects.create(lab_tests_required=True, lab_test_type='mri')
+        blood = [Prescription.objects.create(lab_tests_required=True, lab_test_type='blood_test') for _ in range(4)]
+
+        self.assertEqual(mri.lab_technician, self.techs[0])
+        self.assertEqual({p.lab_technician_id for p in blood}, {self.techs[1].pk, self.techs[2].pk})
+        self.assertEqual(self.loads(), [5, 2, 2])
+
+        blood[0].status = 'completed'
+        blood[0].save()
+        self.assertEqual(sorted(self.loads()), [1, 2, 5])
+        # The incrementally kept table matches a rebuild from the database
+        self.assertEqual(sorted(lab_queue.build_load_table().values()), [1, 2, 5])
+
+    def test_rebalance_moves_unclaimed_work(self):
+        with override_settings(LAB_QUEUE={'AUTO_ASSIGN': False}):
+            for _ in range(6):
+                Prescription.objects.create(lab_tests_required=True, lab_technician=self.techs[0])
+        self.assertEqual(self.loads(), [6, 0, 0])
+
+        moved = lab_queue.rebalance(batch_size=2)
+
+        self.assertEqual(moved, 4)
+        self.assertEqual(self.loads(), [2, 2, 2])
+        self.assertEqual(sorted(lab_queue.build_load_table().values()), [2, 2, 2])
+
+    def test_rebalance_skips_rows_claimed_meanwhile(self):
+        with override_settings(LAB_QUEUE={'AUTO_ASSIGN': False}):
+            for _ in range(6):
+                Prescription.objects.create(lab_tests_required=True, lab_technician=self.techs[0])
+        apply_moves = lab_queue._apply_moves
+
+        def claim_then_apply(moves):
+            # The owner starts on their oldest row after the moves were planned
+            with override_settings(LAB_QUEUE={'MAX_CLAIM': 6}):
+                lab_queue.claim(self.techs[0], 6)
+            return apply_moves(moves)
+
+        with mock.patch.object(lab_queue, '_apply_moves', claim_then_apply):
+            moved = lab_queue.rebalance()
+
+        self.assertEqual(moved, 0)
+        self.assertEqual(
+            Prescription.objects.filter(lab_technician=self.techs[0], lab_claimed_at__isnull=False).count(), 6
+        )
+        self.assertEqual(self.loads(), [6, 0, 0])
+        self.assertEqual(self.loads(), [lab_queue.build_load_table()[tech.pk] for tech in self.techs])
+
+
+class ReportUploadTests(TestCase):
+    base_url = '/api/v1/appointment/reports/uploads/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tech = User.objects.create_user(email='tech@example.com', password='x', user_type='lab_technician')
+        cls.doctor = User.objects.create_user(email='doc@example.com', password='x', user_type='doctor', profession='dentist')
+        cls.patient = User.objects.create_user(email='pat@example.com', password='x', user_type='patient')
+        cls.appointment = Appointment.objects.create(
+            patient=cls.patient, doctor=cls.doctor,
+            appointment_date=date(2024, 5, 1), appointment_time=time(10, 30)
+        )
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        settings_override = override_settings(
+            MEDIA_ROOT=os.path.join(self.tmp, 'media'),
+            REPORT_UPLOADS={'SPOOL_DIR': os.path.join(self.tmp, 'spool'), 'MAX_CHUNK_SIZE': 1000,
+                            'MAX_SIZES': {'ecg': 2000}},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.tech)
+        self.content = b'%PDF-1.4 ' + os.urandom(2500)
+
+    def start(self, **overrides):
+        data = {
+            'filename': 'scan.pdf', 'size': len(self.content), 'report_type': 'mri',
+            'sha256': hashlib.sha256(self.content).hexdigest(),
+        }
+        data.update(overrides)
+        return self.client.post(self.base_url, data, format='json', HTTP_HOST='localhost')
+
+    def put_chunk(self, upload_id, offset, chunk):
+        return self.client.put(
+            f'{self.base_url}{upload_id}/', chunk, content_type='application/octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset), HTTP_HOST='localhost'
+        )
+
+    def finalize(self, upload_id):
+        return self.client.post(f'{self.base_url}{upload_id}/finalize/', {
+            'appointment': self.appointment.id, 'patient': self.patient.id, 'doctor': self.doctor.id,
+            'description': 'Scan',
+        }, format='json', HTTP_HOST='localhost')
+
+    def test_chunked_upload_with_resume(self):
+        upload_id = self.start().data['id']
+
+        self.assertEqual(self.put_chunk(upload_id, 0, self.content[:1000])['Upload-Offset'], '1000')
+        # A resent or out-of-order chunk is refused with the offset to resume from
+        conflict = self.put_chunk(upload_id, 2000, self.content[2000:])
+        self.assertEqual((conflict.status_code, conflict['Upload-Offset']), (409, '1000'))
+        self.assertEqual(self.client.get(f'{self.base_url}{upload_id}/', HTTP_HOST='localhost').data['received'], 1000)
+        self.put_chunk(upload_id, 1000, self.content[1000:2000])
+        self.put_chunk(upload_id, 2000, self.content[2000:])
+
+        response = self.finalize(upload_id)
+
+        self.assertEqual(response.status_code, 201, response.data)
+        report = MedicalReport.objects.get()
+        self.assertEqual((report.report_type, report.lab_technician), ('mri', self.tech))
+        with report.report_file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.content)
+        upload = ReportUpload.objects.get()
+        self.assertEqual((upload.status, upload.medical_report), ('complete', report))
+        self.assertFalse(os.listdir(os.path.join(self.tmp, 'spool')))
+
+    def test_checksum_mismatch_is_rejected(self):
+        upload_id = self.start(sha256='0' * 64).data['id']
+        for offset in range(0, len(self.content), 1000):
+            self.put_chunk(upload_id, offset, self.content[offset:offset + 1000])
+
+        response = self.finalize(upload_id)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(MedicalReport.objects.exists())
+        self.assertEqual(ReportUpload.objects.get().status, 'failed')
+
+    def test_finalize_runs_once(self):
+        upload_id = self.start().data['id']
+        self.put_chunk(upload_id, 0, self.content[:1000])
+        # Incomplete: refused, and the upload stays open for the rest
+        self.assertEqual(self.finalize(upload_id).status_code, 409)
+        self.assertEqual(ReportUpload.objects.get().status, 'uploading')
+        for offset in range(1000, len(self.content), 1000):
+            self.put_chunk(upload_id, offset, self.content[offset:offset + 1000])
+
+        # Another request holding the claim turns this one away
+        upload = ReportUpload.objects.get()
+        uploads.claim_for_finalize(upload)
+        self.assertEqual(self.finalize(upload_id).status_code, 409)
+        uploads.release_finalize(upload)
+
+        self.assertEqual(self.finalize(upload_id).status_code, 201)
+        self.assertEqual(self.finalize(upload_id).status_code, 409)
+        self.assertEqual(MedicalReport.objects.count(), 1)
+
+    def test_finalize_only_accepts_post(self):
+        upload_id = self.start().data['id']
+        url = f'{self.base_url}{upload_id}/finalize/'
+
+        self.assertEqual(self.client.get(url, HTTP_HOST='localhost').status_code, 405)
+        self.assertEqual(self.client.delete(url, HTTP_HOST='localhost').status_code, 405)
+        self.assertEqual(ReportUpload.objects.get().status, 'uploading')
+
+    def test_size_limits(self):
+        self.assertEqual(self.start(report_type='ecg').status_code, 413)
+        upload_id = self.start().data['id']
+        self.assertEqual(self.put_chunk(upload_id, 0, self.content[:1001]).status_code, 413)
+
+
+class VisibilityTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = User.objects.create_user(email='doc@example.com', password='x', user_type='doctor', profession='dentist')
+        cls.other_doctor = User.objects.create_user(email='doc2@example.com', password='x', user_type='doctor', profession='general')
+        cls.patient = User.objects.create_user(email='pat@example.com', password='x', user_type='patient')
+        cls.other_patient = User.objects.create_user(email='pat2@example.com', password='x', user_type='patient')
+        cls.tech = User.objects.create_user(email='tech@example.com', password='x', user_type='lab_technician')
+        cls.other_tech = User.objects.create_user(email='tech2@example.com', password='x', user_type='lab_technician')
+        cls.admin = User.objects.create_user(email='admin@example.com', password='x', user_type='admin', is_staff=True)
+
+        cls.appointment = Appointment.objects.create(
+            patient=cls.patient, doctor=cls.doctor, appointment_date=date(2030, 5, 6), appointment_time=time(9)
+        )
+        cls.other_appointment = Appointment.objects.create(
+            patient=cls.other_patient, doctor=cls.other_doctor, appointment_date=date(2030, 5, 6), appointment_time=time(10)
+        )
+        cls.report = MedicalReport.objects.create(
+            appointment=cls.appointment, patient=cls.patient, doctor=cls.doctor, lab_technician=cls.tech,
+            report_type='blood_test', description='CBC', report_file='reports/cbc.pdf',
+        )
+        cls.other_report = MedicalReport.objects.create(
+            appointment=cls.other_appointment, patient=cls.other_patient, doctor=cls.other_doctor,
+            lab_technician=cls.other_tech, report_type='blood_test', description='CBC', report_file='reports/cbc2.pdf',
+        )
+        cls.prescription = Prescription.objects.create(doctor=cls.doctor, patient=cls.patient)
+        cls.other_prescription = Prescription.objects.create(doctor=cls.other_doctor, patient=cls.other_patient)
+
+    def setUp(self):
+        cache.clear()
+
+    def visible(self, model, user):
+        return set(model.objects.visible_to(user).values_list('pk', flat=True))
+
+    def test_appointments(self):
+        both = {self.appointment.pk, self.other_appointment.pk}
+        self.assertEqual(self.visible(Appointment, self.doctor), {self.appointment.pk})
+        self.assertEqual(self.visible(Appointment, self.patient), {self.appointment.pk})
+        self.assertEqual(self.visible(Appointment, self.admin), both)
+        self.assertEqual(self.visible(Appointment, self.tech), set())
+
+    def test_reports(self):
+        both = {self.report.pk, self.other_report.pk}
+        self.assertEqual(self.visible(MedicalReport, self.tech), {self.report.pk})
+        self.assertEqual(self.visible(MedicalReport, self.doctor), {self.report.pk})
+        self.assertEqual(self.visible(MedicalReport, self.patient), {self.report.pk})
+        self.assertEqual(self.visible(MedicalReport, self.admin), both)
+
+    def test_prescriptions(self):
+        both = {self.prescription.pk, self.other_prescription.pk}
+        self.assertEqual(self.visible(Prescription, self.doctor), {self.prescription.pk})
+        self.assertEqual(self.visible(Prescription, self.patient), {self.prescription.pk})
+        self.assertEqual(self.visible(Prescription, self.tech), both)
+        self.assertEqual(self.visible(Prescription, self.admin), both)
+
+    def patch(self, user, url, data, **kwargs):
+        client = APIClient()
+        client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.patch(url, data, HTTP_HOST='localhost', **kwargs)
+        return response, queries
+
+    def own_queries(self, queries, table):
+        """
+        Statements on the detail view's table, plus any user lookups. The
+        throttle's cache queries and the save signals' rollup and
+        notification writes come on top and are covered by their own tests.
+        """
+        return [
+            q['sql'].split()[0] for q in queries.captured_queries
+            if f'"{table}"' in q['sql'] or '"backapp_user"' in q['sql']
+        ]
+
+    def test_appointment_update_is_one_fetch_and_one_write(self):
+        url = f'/api/v1/appointment/{self.appointment.pk}/'
+        for user, status in ((self.doctor, 'confirmed'), (self.patient, 'cancelled'), (self.admin, 'completed')):
+            with self.subTest(user=user.user_type):
+                response, queries = self.patch(user, url, {'status': status}, format='json')
+                self.assertEqual(response.status_code, 200, response.data)
+                self.assertEqual(self.own_queries(queries, 'appointment_appointment'), ['SELECT', 'UPDATE'])
+
+        # Not visible to the other doctor: one fetch, no write
+        response, queries = self.patch(self.other_doctor, url, {'status': 'confirmed'}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.own_queries(queries, 'appointment_appointment'), ['SELECT'])
+
+    def test_report_update_is_one_fetch_and_one_write(self):
+        url = f'/api/v1/appointment/reports/{self.report.pk}/'
+        response, queries = self.patch(self.tech, url, {'notes': 'Reviewed'}, format='multipart')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.own_queries(queries, 'appointment_medicalreport'), ['SELECT', 'UPDATE'])
+
+        # Visible but read-only for the doctor and the patient
+        for user in (self.doctor, self.patient):
+            with self.subTest(user=user.user_type):
+                response, queries = self.patch(user, url, {'notes': 'Edited'}, format='multipart')
+                self.assertEqual(response.status_code, 403)
+                self.assertEqual(self.own_queries(queries, 'appointment_medicalreport'), ['SELECT'])
+
+        response, queries = self.patch(self.other_tech, url, {'notes': 'Edited'}, format='multipart')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.own_queries(queries, 'appointment_medicalreport'), ['SELECT'])
+
+
+class ReportFileTestCase(TestCase):
+    """Lab technician, appointments and a temporary MEDIA_ROOT for report file tests"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tech = User.objects.create_user(email='tech@example.com', password='x', user_type='lab_technician')
+        cls.doctor = User.objects.create_user(email='doc@example.com', password='x', user_type='doctor', profession='dentist')
+        cls.patient = User.objects.create_user(email='pat@example.com', password='x', user_type='patient')
+        cls.appointments = [
+            Appointment.objects.create(
+                patient=cls.patient, doctor=cls.doctor,
+                appointment_date=date(2024, 5, day), appointment_time=time(10, 30)
+            )
+            for day in (1, 2)
+        ]
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        settings_override = override_settings(MEDIA_ROOT=self.tmp)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.tech)
+
+    def upload(self, appointment, content, filename='result.pdf'):
+        response = self.client.post('/api/v1/appointment/reports/create/', {
+            'appointment': appointment.id, 'patient': self.patient.id, 'doctor': self.doctor.id,
+            'report_type': 'blood_test', 'description': 'CBC',
+            'report_file': SimpleUploadedFile(filename, content, content_type='application/pdf'),
+        }, format='multipart', HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 201, response.data)
+        return MedicalReport.objects.get(pk=response.data['id'])
+
+
+class ReportStorageDedupTests(ReportFileTestCase):
+
+    def test_identical_files_are_stored_once(self):
+        content = b'%PDF-1.4 same result'
+        first = self.upload(self.appointments[0], content)
+        second = self.upload(self.appointments[1], content, filename='copy.pdf')
+
+        self.assertEqual(first.report_file.name, second.report_file.name)
+        self.assertIn(hashlib.sha256(content).hexdigest(), first.report_file.name)
+        blob = StoredBlob.objects.get()
+        self.assertEqual((blob.ref_count, blob.size), (2, len(content)))
+        path = first.report_file.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+        self.assertTrue(os.path.exists(path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_replacing_a_file_releases_the_old_blob(self):
+        report = self.upload(self.appointments[0], b'%PDF-1.4 draft')
+        report = MedicalReport.objects.get(pk=report.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            report.report_file = SimpleUploadedFile('final.pdf', b'%PDF-1.4 final')
+            report.save()
+
+        self.assertEqual(list(StoredBlob.objects.values_list('size', 'ref_count')), [(len(b'%PDF-1.4 final'), 1)])
+
+    @override_settings(REPORT_RENDITIONS={'WORKERS': 0})
+    def test_image_reports_get_renditions_shared_by_content(self):
+        buffer = BytesIO()
+        Image.new('RGB', (3000, 2000), 'white').save(buffer, 'PNG')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.upload(self.appointments[0], buffer.getvalue(), filename='scan.png')
+        with self.captureOnCommitCallbacks(execute=True):
+            second = self.upload(self.appointments[1], buffer.getvalue(), filename='scan.png')
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.thumbnail.name, first.preview.name), (second.thumbnail.name, second.preview.name))
+        with Image.open(first.thumbnail.path) as thumbnail:
+            self.assertEqual(thumbnail.size, (256, 171))
+        with Image.open(first.preview.path) as preview:
+            self.assertEqual((preview.format, preview.size), ('JPEG', (1280, 853)))
+        response = self.client.get(f'/api/v1/appointment/reports/{first.pk}/', HTTP_HOST='localhost')
+        self.assertTrue(response.data['thumbnail'].endswith(first.thumbnail.name))
+
+
+class ReportDownloadTests(ReportFileTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.content = bytes(range(256)) * 40
+        self.report = self.upload(self.appointments[0], self.content)
+        self.url = f'/api/v1/appointment/reports/{self.report.pk}/download/'
+
+    def get(self, user, **headers):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(self.url, HTTP_HOST='localhost', **headers)
+
+    def test_full_download_and_conditional_request(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.get(self.patient)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(sum('appointment_medicalreport' in q['sql'] for q in ctx.captured_queries), 1)
+
+        cached = self.get(self.patient, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_range_requests(self):
+        partial = self.get(self.doctor, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(partial.streaming_content), self.content[100:200])
+
+        tail = self.get(self.doctor, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(tail.streaming_content), self.content[-10:])
+
+        self.assertEqual(self.get(self.doctor, HTTP_RANGE=f'bytes={len(self.content)}-').status_code, 416)
+
+    def test_other_users_cannot_download(self):
+        stranger = User.objects.create_user(email='other@example.com', password='x', user_type='patient')
+        self.assertEqual(self.get(stranger).status_code, 404)
+
+    @override_settings(REPORT_DOWNLOADS={'OFFLOAD': 'nginx'})
+    def test_nginx_offload(self):
+        response = self.get(self.patient)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.report.report_file.name)
+        self.assertEqual(response.content, b'')
+
+
+class PatientTimelineTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = User.objects.create_user(email='doc@example.com', password='x', user_type='doctor', profession='dentist')
+        cls.patient = User.objects.create_user(email='pat@example.com', password='x', user_type='patient')
+        other = User.objects.create_user(email='other@example.com', password='x', user_type='patient')
+        start = timezone.now() - timedelta(days=30)
+        cls.expected = []
+        for i in range(7):
+            appointment = Appointment.objects.create(
+                patient=cls.patient, doctor=cls.doctor,
+                appointment_date=date(2024, 5, i + 1), appointment_time=time(10, 30)
+            )
+            prescription = Prescription.objects.create(patient=cls.patient, doctor=cls.doctor, appointment=appointment)
+            # Prescription i shares its timestamp with appointment i to exercise the tie-break
+            Appointment.objects.filter(pk=appointment.pk).update(created_at=start + timedelta(days=i))
+            Prescription.objects.filter(pk=prescription.pk).update(created_at=start + timedelta(days=i))
+            cls.expected += [('prescription', prescription.pk), ('appointment', appointment.pk)]
+        Appointment.objects.create(
+            patient=other, doctor=cls.doctor, appointment_date=date(2024, 5, 1), appointment_time=time(9, 0)
+        )
+        cls.expected.reverse()
+
+    def test_pages_walk_the_merged_history_in_order(self):
+        client = APIClient()
+        client.force_authenticate(self.doctor)
+        url = f'/api/v1/appointment/timeline/{self.patient.pk}/?page_size=4'
+        seen = []
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = client.get(url, HTTP_HOST='localhost')
+            self.assertEqual(response.status_code, 200)
+            sources = [q['sql'] for q in ctx.captured_queries if 'ORDER BY' in q['sql'] and '"created_at" DESC' in q['sql']]
+            self.assertEqual(len(sources), 3)
+            seen += [(entry['type'], entry['id']) for entry in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(seen, self.expected)
+
+    def test_patients_only_see_their_own_timeline(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.get(email='other@example.com'))
+
+        response = client.get(f'/api/v1/appointment/timeline/{self.patient.pk}/', HTTP_HOST='localhost')
+
+        self.assertEqual(response.data['results'], [])
+
+
+class ExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(email='admin@example.com', password='x', user_type='admin', is_staff=True)
+        cls.doctor = User.objects.create_user(email='doc@example.com', password='x', user_type='doctor', profession='dentist')
+        cls.patient = User.objects.create_user(email='pat@example.com', password='x', user_type='patient')
+        for day, status in ((1, 'pending'), (2, 'completed'), (3, 'completed')):
+            Appointment.objects.create(
+                patient=cls.patient, doctor=cls.doctor, status=status,
+                appointment_date=date(2024, 5, day), appointment_time=time(10, 30)
+            )
+
+    def get(self, user, path):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(f'/api/v1/appointment/exports/{path}', HTTP_HOST='localhost')
+
+    def test_csv_with_filters(self):
+        response = self.get(self.admin, 'appointments.csv?status=completed&date_to=2024-05-02')
+
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:4], ['id', 'patient_id', 'doctor_id', 'appointment_date'])
+        self.assertEqual(len(lines), 2)
+        self.assertIn('2024-05-02', lines[1])
+
+    def test_gzipped_jsonl(self):
+        response = self.get(self.admin, 'appointments.jsonl.gz')
+
+        rows = [json.loads(line) for line in gzip.decompress(b''.join(response.streaming_content)).splitlines()]
+        self.assertEqual([row['appointment_date'] for row in rows], ['2024-05-01', '2024-05-02', '2024-05-03'])
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+
+    def test_admin_only(self):
+        self.assertEqual(self.get(self.doctor, 'appointments.csv').status_code, 403)
+
+    def test_status_filter_on_unfilterable_export(self):
+        response = self.get(self.admin, 'reports.csv?status=completed')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('status', response.data)
+
+
+@override_settings(NOTIFICATIONS={'EMAIL_WORKERS': 0}, LAB_QUEUE={'AUTO_ASSIGN': False})
+class BulkStatusTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email='admin@example.com', password='x', user_type='admin', is_staff=True, is_superuser=True
+        )
+        cls.doctor = User.objects.create_user(email='doc@example.com', password='x', user_type='doctor', profession='dentist')
+        cls.patient = User.objects.create_user(email='pat@example.com', password='x', user_type='patient')
+
+    def book_day(self, count, day=date(2030, 5, 6)):
+        with self.captureOnCommitCallbacks(execute=True):
+            appointments = [
+                Appointment.objects.create(
+                    patient=self.patient, doctor=self.doctor, appointment_date=day,
+                    appointment_time=time(9 + i * 8 // count, (i * 480 // count) % 60),
+                )
+                for i in range(count)
+            ]
+        mail.outbox.clear()
+        return appointments
+
+    def cancel_day(self, day=date(2030, 5, 6)):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            return client.post('/api/v1/appointment/bulk-status/', {
+                'status': 'cancelled', 'doctor': self.doctor.pk, 'date': day.isoformat(),
+            }, format='json', HTTP_HOST='localhost')
+
+    def test_cancel_doctor_day(self):
+        appointments = self.book_day(40)
+        Appointment.objects.filter(pk=appointments[0].pk).update(status='completed')
+        notifications = Notification.objects.count()
+
+        response = self.cancel_day()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], [a.pk for a in appointments[1:]])
+        self.assertEqual(Appointment.objects.filter(status='cancelled').count(), 39)
+        self.assertEqual(Notification.objects.count() - notifications, 78)
+        self.assertEqual(len(mail.outbox), 78)
+        self.assertEqual(
+            DailyRollup.objects.get(metric='appointments', bucket=date(2030, 5, 6), category='cancelled').count, 39
+        )
+
+    def test_queries_do_not_grow_with_rows(self):
+        def queries_for(count, day):
+            self.book_day(count, day)
+            with CaptureQueriesContext(connection) as queries:
+                self.cancel_day(day)
+            # Ignore the throttle's cache reads and writes
+            return len([q for q in queries if 'zencare_cache' not in q['sql'] and 'SAVEPOINT' not in q['sql']])
+
+        self.assertEqual(queries_for(5, date(2030, 5, 6)), queries_for(50, date(2030, 5, 7)))
+
+    def test_validation(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.post('/api/v1/appointment/prescriptions/bulk-status/', {'status': 'confirmed', 'ids': [1]},
+                               format='json', HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('status', response.data)
+
+        client.force_authenticate(self.doctor)
+        response = client.post('/api/v1/appointment/bulk-status/', {'status': 'cancelled', 'ids': [1]},
+                               format='json', HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 403)
+
+    def test_admin_action(self):
+        prescriptions = [Prescription.objects.create(doctor=self.doctor, patient=self.patient) for _ in range(3)]
+        self.client.force_login(self.admin)
+
+        response = self.client.post('/admin/appointment/prescription/', {
+            'action': 'mark_completed', '_selected_action': [p.pk for p in prescriptions[:2]],
+        }, HTTP_HOST='localhost')
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            list(Prescription.objects.order_by('pk').values_list('status', flat=True)),
+            ['completed', 'completed', 'pending'],
+        )
+        self.assertEqual(LogEntry.objects.filter(action_flag=CHANGE).count(), 2)
@@ -0,0 +1,97 @@
+import base64
+import heapq
+import json
+from itertools import islice
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Appointment, MedicalReport, Prescription
+from .serializers import AppointmentSerializer, MedicalReportSerializer, PrescriptionSerializer
+
+# Entries sort newest first by (created_at, rank, id); rank breaks ties
+# between sources that share a timestamp.
+SOURCES = (
+    # kind, rank, model, serializer
+    ('appointment', 2, Appointment, AppointmentSerializer),
+    ('medical_report', 1, MedicalReport, MedicalReportSerializer),
+    ('prescription', 0, Prescription, PrescriptionSerializer),
+)
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(key):
+    created_at, rank, pk = key
+    raw = json.dumps([created_at.isoformat(), rank, pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, rank, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created_at = parse_datetime(created_at)
+    except (ValueError, TypeError):
+        raise InvalidCursor()
+    if created_at is None or not isinstance(rank, int) or not isinstance(pk, int):
+        raise InvalidCursor()
+    return created_at, rank, pk
+
+
+def after(rank, cursor):
+    """Rows of the source with `rank` that sort after the cursor, newest first."""
+    created_at, cursor_rank, pk = cursor
+    older = Q(created_at__lt=created_at)
+    if rank < cursor_rank:
+        return older | Q(created_at=created_at)
+    if rank == cursor_rank:
+        return older | Q(created_at=created_at, id__lt=pk)
+    return older
+
+
+def source_rows(queryset, kind, rank, cursor, limit):
+    """One bounded read off the (patient, -created_at, -id) index."""
+    if cursor:
+        queryset = queryset.filter(after(rank, cursor))
+    for obj in queryset.order_by('-created_at', '-id')[:limit]:
+        yield (obj.created_at, rank, obj.pk), kind, obj
+
+
+def page(user, patient_id, request, cursor=None, size=20):
+    """
+    One page of a patient's appointments, reports and prescriptions, newest
+    first. Each source is read in index order with at most size + 1 rows
+    and the three streams are merged with a heap, so the cost of a page
+    doesn't depend on how far back it is.
+
+    Returns (entries, next_cursor).
+    """
+    streams = []
+    for kind, rank, model, serializer_class in SOURCES:
+        queryset = model.objects.visible_to(user).filter(patient_id=patient_id)
+        if hasattr(serializer_class, 'optimize_queryset'):
+            queryset = serializer_class.optimize_queryset(queryset, request)
+        streams.append(source_rows(queryset, kind, rank, cursor, size + 1))
+
+    merged = list(islice(heapq.merge(*streams, key=lambda entry: entry[0], reverse=True), size + 1))
+    has_more = len(merged) > size
+    merged = merged[:size]
+
+    # Serialize each kind in one batch so list-level optimizations still apply
+    serializers = {kind: serializer_class for kind, _, _, serializer_class in SOURCES}
+    by_kind = {}
+    for _, kind, obj in merged:
+        by_kind.setdefault(kind, []).append(obj)
+    data = {
+        kind: iter(serializers[kind](objs, many=True, context={'request': request}).data)
+        for kind, objs in by_kind.items()
+    }
+
+    entries = [
+        {'type': kind, 'id': obj.pk, 'timestamp': key[0], 'data': next(data[kind])}
+        for key, kind, obj in merged
+    ]
+    next_cursor = encode_cursor(merged[-1][0]) if has_more else None
+    return entries, next_cursor
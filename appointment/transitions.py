@@ -0,0 +1,78 @@
+"""
+Bulk status changes for appointments and prescriptions.
+
+transition() changes every eligible row with one UPDATE. UPDATE skips
+post_save, so it sends `statuses_changed` once for the whole batch instead;
+its receivers (lab load, analytics rollups, notifications) do their work
+in bulk too.
+"""
+from django.contrib import admin
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Appointment, Prescription
+
+# sender: the model; instances: the changed rows, with the new status set
+# (their _loaded_* attributes still describe the old row); status: the new status
+statuses_changed = Signal()
+
+# model -> {new status: statuses it can be reached from}
+TRANSITIONS = {
+    Appointment: {
+        'confirmed': ('pending',),
+        'completed': ('pending', 'confirmed'),
+        'cancelled': ('pending', 'confirmed'),
+    },
+    Prescription: {
+        'completed': ('pending',),
+        'cancelled': ('pending',),
+    },
+}
+
+
+def transition(queryset, status):
+    """
+    Move the rows of `queryset` that may go to `status` there. Returns the
+    changed instances; rows in any other state are left alone.
+    """
+    model = queryset.model
+    allowed = TRANSITIONS[model][status]
+    with transaction.atomic():
+        rows = list(
+            queryset.filter(status__in=allowed)
+            .select_related('patient', 'doctor')
+            .select_for_update(of=('self',))
+            .order_by('pk')
+        )
+        if not rows:
+            return []
+        now = timezone.now()
+        model.objects.filter(pk__in=[row.pk for row in rows]).update(status=status, updated_at=now)
+        for row in rows:
+            row.status = status
+            row.updated_at = now
+        statuses_changed.send(sender=model, instances=rows, status=status)
+    return rows
+
+
+def transition_action(status, description):
+    """An admin action that moves the selected rows to `status` with transition()."""
+
+    @admin.action(description=description, permissions=['change'])
+    def action(modeladmin, request, queryset):
+        from admin_customization import dashboard
+
+        changed = transition(queryset, status)
+        if changed:
+            LogEntry.objects.log_actions(
+                user_id=request.user.pk, queryset=changed, action_flag=CHANGE,
+                change_message=[{'changed': {'fields': ['Status']}}],
+            )
+            # log_actions() bulk inserts without signals
+            transaction.on_commit(dashboard.invalidate_recent_actions)
+        modeladmin.message_user(request, f'{len(changed)} {modeladmin.opts.verbose_name_plural} marked {status}.')
+
+    action.__name__ = f'mark_{status}'
+    return action
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ReportUpload
+
+MB = 1024 * 1024
+
+DEFAULTS = {
+    # Where partial uploads are kept until they are finalized
+    'SPOOL_DIR': os.path.join(tempfile.gettempdir(), 'zencare-report-uploads'),
+    # Largest accepted file per report type (bytes)
+    'MAX_SIZES': {
+        'mri': 500 * MB,
+        'ct_scan': 500 * MB,
+        'x_ray': 100 * MB,
+        'ultrasound': 100 * MB,
+    },
+    'DEFAULT_MAX_SIZE': 25 * MB,
+    'MAX_CHUNK_SIZE': 8 * MB,
+    # Unfinished uploads older than this are deleted by purge_report_uploads (seconds)
+    'EXPIRE_AFTER': 24 * 60 * 60,
+}
+
+# Bytes read or hashed at a time, so memory use doesn't grow with the file
+BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def get_setting(name):
+    return getattr(settings, 'REPORT_UPLOADS', {}).get(name, DEFAULTS[name])
+
+
+def max_size(report_type):
+    return get_setting('MAX_SIZES').get(report_type, get_setting('DEFAULT_MAX_SIZE'))
+
+
+def spool_path(upload):
+    return os.path.join(get_setting('SPOOL_DIR'), f'{upload.pk}.part')
+
+
+def start(user, report_type, filename, size, sha256):
+    if size > max_size(report_type):
+        raise UploadError(f'{report_type} files may be at most {max_size(report_type)} bytes', 413)
+    upload = ReportUpload.objects.create(
+        uploaded_by=user, report_type=report_type, filename=filename, size=size, sha256=sha256.lower()
+    )
+    os.makedirs(get_setting('SPOOL_DIR'), exist_ok=True)
+    open(spool_path(upload), 'wb').close()
+    return upload
+
+
+def write_chunk(upload, offset, stream, length):
+    """
+    Append `length` bytes read from `stream` at `offset`.
+
+    The offset must match what was already received, so a client that lost
+    a response can ask for the current offset and resend from there. The
+    chunk is copied in small blocks straight to the spool file.
+    """
+    if upload.status != 'uploading':
+        raise UploadError('Upload is already finalized', 409)
+    if offset != upload.received:
+        raise UploadError(f'Expected offset {upload.received}', 409)
+    if length > get_setting('MAX_CHUNK_SIZE'):
+        raise UploadError(f'Chunks may be at most {get_setting("MAX_CHUNK_SIZE")} bytes', 413)
+    if offset + length > upload.size:
+        raise UploadError('Chunk goes past the declared file size', 413)
+
+    written = 0
+    with open(spool_path(upload), 'r+b') as spool:
+        spool.seek(offset)
+        while written < length:
+            block = stream.read(min(BLOCK_SIZE, length - written))
+            if not block:
+                break
+            spool.write(block)
+            written += len(block)
+        # Drop anything a failed earlier attempt left past this point
+        spool.truncate()
+
+    # Only advance if nobody else wrote this offset in the meantime
+    updated = ReportUpload.objects.filter(pk=upload.pk, received=offset, status='uploading').update(
+        received=offset + written, updated_at=timezone.now()
+    )
+    if not updated:
+        raise UploadError('Another request wrote to this upload', 409)
+    upload.received = offset + written
+    return written
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as spool:
+        for block in iter(lambda: spool.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def verify(upload):
+    """Check the spooled file is complete and matches the declared checksum."""
+    if upload.received != upload.size:
+        raise UploadError(f'Only {upload.received} of {upload.size} bytes received', 409)
+    if file_digest(spool_path(upload)) != upload.sha256:
+        discard(upload)
+        raise UploadError('Checksum mismatch; start the upload again', 422)
+
+
+def claim_for_finalize(upload):
+    """
+    Move the upload from uploading to finalizing with one conditional
+    UPDATE, so only one of several concurrent or retried finalize calls
+    goes ahead.
+    """
+    claimed = ReportUpload.objects.filter(pk=upload.pk, status='uploading').update(
+        status='finalizing', updated_at=timezone.now()
+    )
+    if not claimed:
+        raise UploadError('Upload is already finalized', 409)
+    upload.status = 'finalizing'
+
+
+def release_finalize(upload):
+    """Let the client retry after a finalize that didn't complete or discard the upload."""
+    ReportUpload.objects.filter(pk=upload.pk, status='finalizing').update(
+        status='uploading', updated_at=timezone.now()
+    )
+
+
+def discard(upload, status='failed'):
+    try:
+        os.remove(spool_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.status = status
+    upload.save(update_fields=['status', 'updated_at'])
+
+
+def purge_expired():
+    """Delete unfinished uploads older than EXPIRE_AFTER; returns how many."""
+    cutoff = timezone.now() - timedelta(seconds=get_setting('EXPIRE_AFTER'))
+    purged = 0
+    # A finalize that died midway leaves 'finalizing' behind
+    stale = ReportUpload.objects.filter(status__in=('uploading', 'finalizing'), updated_at__lt=cutoff)
+    for upload in stale.iterator():
+        discard(upload)
+        purged += 1
+    return purged
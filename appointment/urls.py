@@ -1,4 +1,5 @@
-from django.urls import path
+from django.urls import path, re_path
+from .models import Prescription
 from .views import (
     AppointmentCreateView,
     AppointmentListView,
@@ -6,11 +7,20 @@ from .views import (
     MedicalReportCreateView,
     MedicalReportListView,
     MedicalReportDetailView,
+    MedicalReportDownloadView,
+    ReportUploadStartView,
+    ReportUploadView,
+    ReportUploadFinalizeView,
     PrescriptionCreateView,
     PrescriptionListView,
     PrescriptionDetailView,
     PendingAppointmentsView,
     LabTestsRequiredView,
+    LabQueueClaimView,
+    LabQueueStatsView,
+    PatientTimelineView,
+    ExportView,
+    BulkStatusView,
     prescription_test_form
 )
 
@@ -20,13 +30,26 @@ urlpatterns = [
     path('', AppointmentListView.as_view(), name='appointment-list'),
     path('create/', AppointmentCreateView.as_view(), name='appointment-create'),
     path('<int:pk>/', AppointmentDetailView.as_view(), name='appointment-detail'),
+    path('bulk-status/', BulkStatusView.as_view(), name='appointment-bulk-status'),
     path('reports/', MedicalReportListView.as_view(), name='medical-report-list'),
     path('reports/create/', MedicalReportCreateView.as_view(), name='medical-report-create'),
     path('reports/<int:pk>/', MedicalReportDetailView.as_view(), name='medical-report-detail'),
+    path('reports/<int:pk>/download/', MedicalReportDownloadView.as_view(), name='medical-report-download'),
+    path('reports/uploads/', ReportUploadStartView.as_view(), name='report-upload-start'),
+    path('reports/uploads/<uuid:pk>/', ReportUploadView.as_view(), name='report-upload'),
+    path('reports/uploads/<uuid:pk>/finalize/', ReportUploadFinalizeView.as_view(), name='report-upload-finalize'),
     path('prescriptions/', PrescriptionListView.as_view(), name='prescription-list'),
     path('prescriptions/create/', PrescriptionCreateView.as_view(), name='prescription-create'),
     path('prescriptions/test/', prescription_test_form, name='prescription-test-form'),
     path('prescriptions/<int:pk>/', PrescriptionDetailView.as_view(), name='prescription-detail'),
+    path('prescriptions/bulk-status/', BulkStatusView.as_view(model=Prescription), name='prescription-bulk-status'),
     path('pending/', PendingAppointmentsView.as_view(), name='pending-appointments'),
     path('lab-tests-required/', LabTestsRequiredView.as_view(), name='lab-tests-required'),
+    path('lab-queue/claim/', LabQueueClaimView.as_view(), name='lab-queue-claim'),
+    path('lab-queue/stats/', LabQueueStatsView.as_view(), name='lab-queue-stats'),
+    path('timeline/<int:patient_id>/', PatientTimelineView.as_view(), name='patient-timeline'),
+    re_path(
+        r'^exports/(?P<name>appointments|prescriptions|reports)\.(?P<fmt>csv|jsonl)(?P<gz>\.gz)?$',
+        ExportView.as_view(), name='export'
+    ),
 ]
\ No newline at end of file
@@ -1,18 +1,29 @@
+import logging
+import os
+
 from django.shortcuts import render
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import Appointment, MedicalReport, Prescription
+from .models import Appointment, MedicalReport, Prescription, ReportUpload
 from .serializers import (
     AppointmentSerializer, MedicalReportSerializer, 
-    PrescriptionSerializer, PrescriptionUpdateSerializer
+    PrescriptionSerializer, PrescriptionUpdateSerializer, ReportUploadSerializer, BulkStatusSerializer
 )
 from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.http import StreamingHttpResponse
+from django.db import transaction
 from django.utils import timezone
-from rest_framework.exceptions import PermissionDenied
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.filters import SearchFilter, OrderingFilter
 from notifications.services import NotificationService  
+from .permissions import HasRole, CanModifyAppointment, CanModifyMedicalReport
+from . import downloads, exports, lab_queue, timeline, transitions, uploads
+
+logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
@@ -23,8 +34,8 @@ class AppointmentCreateView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated]
 
     def create(self, request, *args, **kwargs):
-        # Debug log to see what data is coming in
-        print(f"Received data: {request.data}")
+        # Field names only; the values are patient data
+        logger.debug('Appointment create with fields %s', sorted(request.data))
         
         # Map frontend field names to backend field names
         mapped_data = {}
@@ -65,8 +76,6 @@ class AppointmentCreateView(generics.CreateAPIView):
             # Use request data as is
             mapped_data = request.data
             
-        print(f"Mapped data: {mapped_data}")
-        
         # Use the mapped data
         serializer = self.get_serializer(data=mapped_data)
         
@@ -77,7 +86,7 @@ class AppointmentCreateView(generics.CreateAPIView):
             headers = self.get_success_headers(serializer.data)
             return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
         except Exception as e:
-            print(f"Validation error: {serializer.errors if hasattr(serializer, 'errors') else str(e)}")
+            logger.info('Appointment create rejected: %s', e)
             return Response(
                 {"error": serializer.errors if hasattr(serializer, 'errors') else str(e)},
                 status=status.HTTP_400_BAD_REQUEST
@@ -94,40 +103,28 @@ class AppointmentCreateView(generics.CreateAPIView):
 
 class AppointmentListView(generics.ListAPIView):
     serializer_class = AppointmentSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, HasRole]
+    allowed_roles = ('doctor', 'patient')
     filter_backends = [SearchFilter, OrderingFilter]
     search_fields = ['doctor__first_name', 'doctor__last_name', 'symptoms', 'status']
     ordering_fields = ['appointment_date', 'appointment_time', 'status', 'created_at']
 
     def get_queryset(self):
-        user = self.request.user
-        if user.user_type == 'doctor':
-            return Appointment.objects.filter(doctor=user)
-        elif user.user_type == 'patient':
-            return Appointment.objects.filter(patient=user)
-        elif user.is_superuser or user.is_staff:
-            # Admin can see all appointments
-            return Appointment.objects.all()
-        raise PermissionDenied("Invalid user type")
+        queryset = Appointment.objects.visible_to(self.request.user)
+        return AppointmentSerializer.optimize_queryset(queryset, self.request)
 
 class AppointmentDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = AppointmentSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, HasRole, CanModifyAppointment]
+    allowed_roles = ('doctor', 'patient')
 
     def get_queryset(self):
-        user = self.request.user
-        if user.user_type == 'doctor':
-            return Appointment.objects.filter(doctor=user)
-        elif user.user_type == 'patient':
-            return Appointment.objects.filter(patient=user)
-        elif user.is_superuser or user.is_staff:
-            # Admin can see all appointments
-            return Appointment.objects.all()
-        raise PermissionDenied("Invalid user type")
+        queryset = Appointment.objects.visible_to(self.request.user)
+        return AppointmentSerializer.optimize_queryset(queryset, self.request)
 
     def perform_update(self, serializer):
+        # Object-level access was already checked by CanModifyAppointment
         user = self.request.user
-        appointment = self.get_object()
         
         # Admins can update any field
         if user.is_superuser or user.is_staff:
@@ -147,15 +144,6 @@ class AppointmentDetailView(generics.RetrieveUpdateDestroyAPIView):
             else:
                 raise PermissionDenied("Patients can only cancel appointments")
 
-    def perform_destroy(self, instance):
-        user = self.request.user
-        if user.is_superuser or user.is_staff:
-            instance.delete()
-            return
-            
-        if user.user_type != 'patient' or instance.patient != user:
-            raise PermissionDenied("Only the patient who created the appointment can delete it")
-        instance.delete()
 
 class MedicalReportCreateView(generics.CreateAPIView):
     serializer_class = MedicalReportSerializer
@@ -169,67 +157,159 @@ class MedicalReportCreateView(generics.CreateAPIView):
         
         serializer.save(lab_technician=self.request.user)
 
+class ReportUploadStartView(generics.CreateAPIView):
+    """
+    Start a chunked, resumable report upload.
+
+    1. POST reports/uploads/ {filename, size, sha256, report_type}
+    2. PUT reports/uploads/<id>/ with the raw bytes and an Upload-Offset header,
+       as many times as needed. GET the same URL to learn the offset to resume from.
+    3. POST reports/uploads/<id>/finalize/ with the usual report fields
+       (appointment, patient, doctor, description, notes).
+    """
+    serializer_class = ReportUploadSerializer
+    permission_classes = [IsAuthenticated, HasRole]
+    allowed_roles = ('lab_technician',)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            upload = uploads.start(request.user, **serializer.validated_data)
+        except uploads.UploadError as e:
+            return Response({"error": e.message}, status=e.status_code)
+        data = self.get_serializer(upload).data
+        data['max_chunk_size'] = uploads.get_setting('MAX_CHUNK_SIZE')
+        return Response(data, status=status.HTTP_201_CREATED)
+
+class OwnReportUploadView(generics.GenericAPIView):
+    """Base for views on one of the lab technician's own uploads"""
+    serializer_class = ReportUploadSerializer
+    permission_classes = [IsAuthenticated, HasRole]
+    allowed_roles = ('lab_technician',)
+
+    def get_queryset(self):
+        return ReportUpload.objects.filter(uploaded_by=self.request.user)
+
+
+class ReportUploadView(OwnReportUploadView):
+    """Upload status (GET), next chunk (PUT) or abort (DELETE)"""
+
+    def offset_response(self, upload, status_code=status.HTTP_200_OK):
+        response = Response(self.get_serializer(upload).data, status=status_code)
+        response['Upload-Offset'] = upload.received
+        return response
+
+    def get(self, request, *args, **kwargs):
+        return self.offset_response(self.get_object())
+
+    def put(self, request, *args, **kwargs):
+        upload = self.get_object()
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return Response(
+                {"error": "Upload-Offset and Content-Length headers are required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            # Read the raw body as a stream; request.data would buffer it
+            uploads.write_chunk(upload, offset, request.stream, length)
+        except uploads.UploadError as e:
+            response = Response({"error": e.message, "offset": upload.received}, status=e.status_code)
+            response['Upload-Offset'] = upload.received
+            return response
+        return self.offset_response(upload)
+
+    def delete(self, request, *args, **kwargs):
+        upload = self.get_object()
+        if upload.status == 'uploading':
+            uploads.discard(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class ReportUploadFinalizeView(OwnReportUploadView):
+    """Verify a fully uploaded file and create the MedicalReport from it"""
+
+    def post(self, request, *args, **kwargs):
+        upload = self.get_object()
+        try:
+            uploads.claim_for_finalize(upload)
+        except uploads.UploadError as e:
+            return Response({"error": e.message}, status=e.status_code)
+        try:
+            return self.finalize(request, upload)
+        except uploads.UploadError as e:
+            return Response({"error": e.message}, status=e.status_code)
+        finally:
+            # Back to uploading unless it completed or was discarded
+            uploads.release_finalize(upload)
+
+    def finalize(self, request, upload):
+        uploads.verify(upload)
+
+        data = {key: value for key, value in request.data.items() if key != 'report_file'}
+        data['report_type'] = upload.report_type
+        with open(uploads.spool_path(upload), 'rb') as spool:
+            # The storage backend reads the spool file in chunks
+            data['report_file'] = File(spool, name=upload.filename)
+            # Already verified, so storage can skip hashing it again
+            data['report_file'].sha256 = upload.sha256
+            serializer = MedicalReportSerializer(data=data, context=self.get_serializer_context())
+            serializer.is_valid(raise_exception=True)
+            with transaction.atomic():
+                report = serializer.save(lab_technician=request.user)
+                upload.medical_report = report
+                upload.save(update_fields=['medical_report', 'updated_at'])
+        uploads.discard(upload, status='complete')
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
 class MedicalReportListView(generics.ListAPIView):
     serializer_class = MedicalReportSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, HasRole]
+    allowed_roles = ('lab_technician', 'doctor', 'patient')
     filter_backends = [SearchFilter, OrderingFilter]
     search_fields = ['report_type', 'description', 'patient__first_name', 'patient__last_name']
     ordering_fields = ['created_at', 'report_type']
     
     def get_queryset(self):
-        user = self.request.user
-        
-        if user.user_type == 'lab_technician':
-            return MedicalReport.objects.filter(lab_technician=user)
-        elif user.user_type == 'doctor':
-            return MedicalReport.objects.filter(doctor=user)
-        elif user.user_type == 'patient':
-            return MedicalReport.objects.filter(patient=user)
-        elif user.is_superuser or user.is_staff:
-            return MedicalReport.objects.all()
-            
-        raise PermissionDenied("Invalid user type")
+        queryset = MedicalReport.objects.visible_to(self.request.user)
+        return MedicalReportSerializer.optimize_queryset(queryset, self.request)
+
+class MedicalReportDownloadView(generics.GenericAPIView):
+    """
+    Download a report's file, or ?rendition=thumbnail|preview, if the caller
+    may see the report. Supports Range, ETag and If-None-Match.
+    """
+    permission_classes = [IsAuthenticated, HasRole]
+    allowed_roles = ('lab_technician', 'doctor', 'patient')
+    renditions = ('thumbnail', 'preview')
+
+    def get(self, request, pk, *args, **kwargs):
+        field = request.query_params.get('rendition') or 'report_file'
+        if field != 'report_file' and field not in self.renditions:
+            raise ValidationError({'rendition': f"Choose one of: {', '.join(self.renditions)}"})
+
+        # One query on the primary key plus the role's foreign key; nothing joined
+        report = MedicalReport.objects.visible_to(request.user).filter(pk=pk).values(field, 'updated_at').first()
+        if report is None or not report[field]:
+            raise NotFound()
+
+        storage = MedicalReport._meta.get_field(field).storage
+        name = report[field]
+        # Stored names are content hashes; give the client something readable
+        filename = f"report-{pk}{'-' + field if field != 'report_file' else ''}{os.path.splitext(name)[1]}"
+        return downloads.serve_file(request, storage, name, modified=report['updated_at'], filename=filename)
 
 class MedicalReportDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = MedicalReportSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, HasRole, CanModifyMedicalReport]
+    allowed_roles = ('lab_technician', 'doctor', 'patient')
     parser_classes = [MultiPartParser, FormParser]
     
     def get_queryset(self):
-        user = self.request.user
-        
-        if user.user_type == 'lab_technician':
-            return MedicalReport.objects.filter(lab_technician=user)
-        elif user.user_type == 'doctor':
-            return MedicalReport.objects.filter(doctor=user)
-        elif user.user_type == 'patient':
-            return MedicalReport.objects.filter(patient=user)
-        elif user.is_superuser or user.is_staff:
-            return MedicalReport.objects.all()
-            
-        raise PermissionDenied("Invalid user type")
-    
-    def perform_update(self, serializer):
-        user = self.request.user
-        
-        # Only lab technicians who created the report or admins can update them
-        if user.user_type == 'lab_technician' and self.get_object().lab_technician == user:
-            serializer.save()
-        elif user.is_superuser or user.is_staff:
-            serializer.save()
-        else:
-            raise PermissionDenied("You don't have permission to update this report")
-    
-    def perform_destroy(self, instance):
-        user = self.request.user
-        
-        # Only lab technicians who created the report or admins can delete them
-        if user.user_type == 'lab_technician' and instance.lab_technician == user:
-            instance.delete()
-        elif user.is_superuser or user.is_staff:
-            instance.delete()
-        else:
-            raise PermissionDenied("You don't have permission to delete this report")
+        queryset = MedicalReport.objects.visible_to(self.request.user)
+        return MedicalReportSerializer.optimize_queryset(queryset, self.request)
 
 class PrescriptionCreateView(generics.CreateAPIView):
     """
@@ -237,16 +317,32 @@ class PrescriptionCreateView(generics.CreateAPIView):
     """
     serializer_class = PrescriptionSerializer
     permission_classes = [IsAuthenticated]
+    resolved_objects = None
+
+    @staticmethod
+    def extract_id(data, field_names, direct_field):
+        """
+        Return the first numeric ID found under any of field_names. Alias
+        fields are removed from data; the direct model field is left in place.
+        """
+        for field_name in field_names:
+            if field_name in data:
+                value = data.get(field_name)
+                if value and (isinstance(value, int) or (isinstance(value, str) and value.isdigit())):
+                    if field_name != direct_field:  # Don't pop if it's the direct field
+                        data.pop(field_name)
+                    return int(value)
+        return None
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.resolved_objects:
+            context['resolved'] = self.resolved_objects
+        return context
     
     def create(self, request, *args, **kwargs):
-        # Debug log to see what data is coming in
-        print("+++++++++++++++++++++++++++++++++++++++++++++++++++++++++")
-        print("PRESCRIPTION CREATE VIEW")
-        print("Request data:", request.data)
-        print("Request content type:", request.content_type)
-        print("Request method:", request.method)
-        print("Request headers:", {k: v for k, v in request.headers.items() if k.lower() != 'authorization'})
-        print("+++++++++++++++++++++++++++++++++++++++++++++++++++++++++")
+        # Field names only; the values are patient data
+        logger.debug('Prescription create (%s) with fields %s', request.content_type, sorted(request.data))
         
         try:
             # Create a copy of the data we can modify
@@ -282,101 +378,84 @@ class PrescriptionCreateView(generics.CreateAPIView):
                 if frontend_field in data and not model_field in data:
                     data[model_field] = data.pop(frontend_field)
             
-            # Handle ID fields with multiple formats
-            try:
-                # Doctor ID handling
-                doctor_id = None
-                for field_name in ['doctorId', 'doctor_id', 'doctor']:
-                    if field_name in data and not doctor_id:
-                        value = data.get(field_name)
-                        if value and (isinstance(value, int) or (isinstance(value, str) and value.isdigit())):
-                            doctor_id = int(value)
-                            if field_name != 'doctor':  # Don't pop if it's the direct field
-                                data.pop(field_name)
-                
-                if doctor_id:
-                    try:
-                        doctor = User.objects.get(id=doctor_id)
-                        data['doctor'] = doctor.id
-                        # Auto-populate related fields
-                        if not data.get('doctor_name'):
-                            data['doctor_name'] = f"Dr. {doctor.get_full_name()}"
-                        if not data.get('doctor_profession') and hasattr(doctor, 'get_profession_display'):
-                            data['doctor_profession'] = doctor.get_profession_display()
-                    except Exception as e:
-                        print(f"Error getting doctor details: {e}")
-                
-                # Patient ID handling
-                patient_id = None
-                for field_name in ['patientId', 'patient_id', 'patient']:
-                    if field_name in data and not patient_id:
-                        value = data.get(field_name)
-                        if value and (isinstance(value, int) or (isinstance(value, str) and value.isdigit())):
-                            patient_id = int(value)
-                            if field_name != 'patient':  # Don't pop if it's the direct field
-                                data.pop(field_name)
-                
-                if patient_id:
-                    try:
-                        patient = User.objects.get(id=patient_id)
-                        data['patient'] = patient.id
-                        # Auto-populate patient name
-                        if not data.get('patient_name'):
-                            data['patient_name'] = patient.get_full_name()
-                    except Exception as e:
-                        print(f"Error getting patient details: {e}")
-                            
-                # Handle appointment data
-                appointment_id = None
-                for field_name in ['appointmentId', 'appointment_id', 'appointment']:
-                    if field_name in data and not appointment_id:
-                        value = data.get(field_name)
-                        if value and (isinstance(value, int) or (isinstance(value, str) and value.isdigit())):
-                            appointment_id = int(value)
-                            if field_name != 'appointment':  # Don't pop if it's the direct field
-                                data.pop(field_name)
-                
-                if appointment_id:
-                    try:
-                        appointment = Appointment.objects.get(id=appointment_id)
-                        data['appointment'] = appointment.id
-                        
-                        # Set appointment date/time if not provided
-                        if not data.get('appointment_date'):
-                            data['appointment_date'] = str(appointment.appointment_date)
-                        if not data.get('appointment_time'):
-                            data['appointment_time'] = str(appointment.appointment_time)
-                        if not data.get('symptoms') and appointment.symptoms:
-                            data['symptoms'] = appointment.symptoms
-                            
-                        # Also populate patient and doctor if not already set
-                        if not data.get('patient') and appointment.patient:
-                            data['patient'] = appointment.patient.id
-                            if not data.get('patient_name'):
-                                data['patient_name'] = appointment.patient.get_full_name()
-                                
-                        if not data.get('doctor') and appointment.doctor:
-                            data['doctor'] = appointment.doctor.id
-                            if not data.get('doctor_name'):
-                                data['doctor_name'] = f"Dr. {appointment.doctor.get_full_name()}"
-                    except Exception as e:
-                        print(f"Error getting appointment details: {e}")
-            except Exception as e:
-                print(f"Error processing IDs: {e}")
-                
+            # Resolve every referenced ID up front with one in_bulk per model.
+            # The serializer and Prescription.save reuse these objects, so
+            # creating the prescription costs a single INSERT.
+            doctor_id = self.extract_id(data, ['doctorId', 'doctor_id', 'doctor'], 'doctor')
+            patient_id = self.extract_id(data, ['patientId', 'patient_id', 'patient'], 'patient')
+            appointment_id = self.extract_id(data, ['appointmentId', 'appointment_id', 'appointment'], 'appointment')
+            lab_technician_id = self.extract_id(data, ['lab_technician_id', 'lab_technician'], 'lab_technician')
+
+            appointments = {}
+            if appointment_id:
+                appointments = Appointment.objects.select_related('patient', 'doctor').in_bulk([appointment_id])
+            appointment = appointments.get(appointment_id)
+
+            users = {request.user.id: request.user}
+            if appointment:
+                users[appointment.patient_id] = appointment.patient
+                users[appointment.doctor_id] = appointment.doctor
+            missing = {pk for pk in (doctor_id, patient_id, lab_technician_id) if pk and pk not in users}
+            if missing:
+                users.update(User.objects.in_bulk(missing))
+            self.resolved_objects = {User: users, Appointment: appointments}
+
+            doctor = users.get(doctor_id)
+            if doctor:
+                data['doctor'] = doctor.id
+                # Auto-populate related fields
+                if not data.get('doctor_name'):
+                    data['doctor_name'] = f"Dr. {doctor.get_full_name()}"
+                if not data.get('doctor_profession'):
+                    data['doctor_profession'] = doctor.get_profession_display()
+
+            patient = users.get(patient_id)
+            if patient:
+                data['patient'] = patient.id
+                # Auto-populate patient name
+                if not data.get('patient_name'):
+                    data['patient_name'] = patient.get_full_name()
+
+            if appointment:
+                data['appointment'] = appointment.id
+
+                # Set appointment date/time if not provided
+                if not data.get('appointment_date'):
+                    data['appointment_date'] = appointment.appointment_date
+                if not data.get('appointment_time'):
+                    data['appointment_time'] = appointment.appointment_time
+                if not data.get('symptoms') and appointment.symptoms:
+                    data['symptoms'] = appointment.symptoms
+
+                # Also populate patient and doctor if not already set
+                if not data.get('patient'):
+                    data['patient'] = appointment.patient_id
+                    if not data.get('patient_name'):
+                        data['patient_name'] = appointment.patient.get_full_name()
+
+                if not data.get('doctor'):
+                    data['doctor'] = appointment.doctor_id
+                    if not data.get('doctor_name'):
+                        data['doctor_name'] = f"Dr. {appointment.doctor.get_full_name()}"
+                    if not data.get('doctor_profession'):
+                        data['doctor_profession'] = appointment.doctor.get_profession_display()
+
+            if users.get(lab_technician_id):
+                data['lab_technician'] = lab_technician_id
+
             # Current user auto-assignment (if fields not specified)
             if 'doctor' not in data and request.user.user_type == 'doctor':
                 data['doctor'] = request.user.id
                 if not data.get('doctor_name'):
                     data['doctor_name'] = f"Dr. {request.user.get_full_name()}"
+                if not data.get('doctor_profession'):
+                    data['doctor_profession'] = request.user.get_profession_display()
                     
             if 'patient' not in data and request.user.user_type == 'patient':
                 data['patient'] = request.user.id
                 if not data.get('patient_name'):
                     data['patient_name'] = request.user.get_full_name()
             
-            print("Processed data:", data)
-            
             # Use special case for empty requests or requests with minimal data
             if not data:
                 # Create an empty prescription if needed
@@ -397,7 +476,7 @@ class PrescriptionCreateView(generics.CreateAPIView):
             # Process the request using the serializer
             serializer = self.get_serializer(data=data)
             if not serializer.is_valid():
-                print("Validation errors:", serializer.errors)
+                logger.info('Prescription create failed validation on %s', sorted(serializer.errors))
                 
                 # Try direct creation as fallback
                 try:
@@ -422,7 +501,7 @@ class PrescriptionCreateView(generics.CreateAPIView):
                     response["Access-Control-Allow-Headers"] = "Origin, Content-Type, Accept, Authorization, X-Request-With"
                     return response
                 except Exception as e:
-                    print(f"Error creating prescription directly: {str(e)}")
+                    logger.warning('Fallback prescription create failed: %s', e)
                     # Return the normal error response if direct creation fails
                     response = Response(
                         {
@@ -438,13 +517,8 @@ class PrescriptionCreateView(generics.CreateAPIView):
                     response["Access-Control-Allow-Headers"] = "Origin, Content-Type, Accept, Authorization, X-Request-With"
                     return response
             
-            # If valid, save the data
+            # If valid, save the data; denormalized fields are already filled
             prescription = serializer.save()
-            
-            # Auto-populate additional fields if not provided
-            # This will trigger the model's save method
-            if not prescription.patient_name and prescription.patient:
-                prescription.save()
                 
             headers = self.get_success_headers(serializer.data)
             response = Response(
@@ -462,9 +536,7 @@ class PrescriptionCreateView(generics.CreateAPIView):
             return response
         except Exception as e:
             # Handle any unexpected exceptions
-            print(f"Unexpected error in prescription create: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception('Unexpected error in prescription create')
             response = Response(
                 {
                     "detail": "An unexpected error occurred",
@@ -487,26 +559,28 @@ class PrescriptionListView(generics.ListAPIView):
     - Admins see all prescriptions
     """
     serializer_class = PrescriptionSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, HasRole]
+    allowed_roles = ('doctor', 'patient', 'lab_technician')
     filter_backends = [SearchFilter, OrderingFilter]
-    search_fields = ['patient__first_name', 'patient__last_name', 'symptoms', 'appointment_time', 'appointment_date']
-    ordering_fields = ['created_at', 'updated_at', 'status']
+    search_fields = ['patient__first_name', 'patient__last_name', 'symptoms']
+    ordering_fields = ['created_at', 'updated_at', 'status', 'appointment_date']
     
     def get_queryset(self):
-        user = self.request.user
-        
-        if user.user_type == 'doctor':
-            return Prescription.objects.filter(doctor=user)
-        elif user.user_type == 'patient':
-            return Prescription.objects.filter(patient=user)
-        elif user.user_type == 'lab_technician':
-            return Prescription.objects.all()
-            # Lab technicians see all prescriptions that require lab tests
-            # return Prescription.objects.filter(lab_tests_required=True)
-        elif user.is_superuser or user.is_staff:
-            return Prescription.objects.all()
-            
-        raise PermissionDenied("Invalid user type")
+        queryset = Prescription.objects.visible_to(self.request.user)
+
+        # ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD (inclusive) on the indexed appointment_date
+        for param, lookup in (('date_from', 'appointment_date__gte'), ('date_to', 'appointment_date__lte')):
+            value = self.request.query_params.get(param)
+            if not value:
+                continue
+            try:
+                parsed = parse_date(value)
+            except ValueError:
+                parsed = None
+            if parsed is None:
+                raise ValidationError({param: 'Use the YYYY-MM-DD format.'})
+            queryset = queryset.filter(**{lookup: parsed})
+        return queryset
 
 class PrescriptionDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
@@ -543,10 +617,11 @@ class PendingAppointmentsView(generics.ListAPIView):
             raise PermissionDenied("Only doctors can access pending appointments")
             
         # Return pending and confirmed appointments for this doctor
-        return Appointment.objects.filter(
+        queryset = Appointment.objects.filter(
             doctor=user, 
             status__in=['pending', 'confirmed']
         ).order_by('appointment_date', 'appointment_time')
+        return AppointmentSerializer.optimize_queryset(queryset, self.request)
 
 class LabTestsRequiredView(generics.ListAPIView):
     """
@@ -559,6 +634,121 @@ class LabTestsRequiredView(generics.ListAPIView):
         # Return all prescriptions that require lab tests
         return Prescription.objects.filter(lab_tests_required=True)
 
+class LabQueueClaimView(generics.GenericAPIView):
+    """
+    Claim the next prescriptions from the lab queue.
+    POST {"count": N} assigns up to N of the oldest unclaimed rows to the caller.
+    """
+    serializer_class = PrescriptionSerializer
+    permission_classes = [IsAuthenticated, HasRole]
+    allowed_roles = ('lab_technician',)
+
+    def post(self, request, *args, **kwargs):
+        try:
+            count = int(request.data.get('count', 1))
+        except (TypeError, ValueError):
+            raise ValidationError({'count': 'Must be an integer.'})
+        if count < 1:
+            raise ValidationError({'count': 'Must be at least 1.'})
+
+        claimed = lab_queue.claim(request.user, count)
+        serializer = self.get_serializer(claimed, many=True)
+        return Response(serializer.data)
+
+class LabQueueStatsView(generics.GenericAPIView):
+    """Lab queue depth and how long pending work has been waiting"""
+    permission_classes = [IsAuthenticated, HasRole]
+    allowed_roles = ('lab_technician',)
+
+    def get(self, request, *args, **kwargs):
+        return Response(lab_queue.stats())
+
+class PatientTimelineView(generics.GenericAPIView):
+    """
+    A patient's appointments, medical reports and prescriptions as one list,
+    newest first. Page through it with the `next` cursor; ?page_size= up to 100.
+    Each entry has type, id, timestamp and the usual serialized data.
+    """
+    permission_classes = [IsAuthenticated, HasRole]
+    allowed_roles = ('doctor', 'patient', 'lab_technician')
+    max_page_size = 100
+
+    def get(self, request, patient_id, *args, **kwargs):
+        try:
+            size = min(max(int(request.query_params.get('page_size', 20)), 1), self.max_page_size)
+        except ValueError:
+            raise ValidationError({'page_size': 'Must be an integer.'})
+        cursor = request.query_params.get('cursor')
+        try:
+            cursor = timeline.decode_cursor(cursor) if cursor else None
+        except timeline.InvalidCursor:
+            raise ValidationError({'cursor': 'Invalid cursor.'})
+
+        entries, next_cursor = timeline.page(request.user, patient_id, request, cursor, size)
+        next_url = None
+        if next_cursor:
+            params = request.query_params.copy()
+            params['cursor'] = next_cursor
+            next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+        return Response({'next': next_url, 'results': entries})
+
+class ExportView(generics.GenericAPIView):
+    """
+    Admin-only bulk export, streamed: exports/<appointments|prescriptions|reports>.<csv|jsonl>[.gz]
+    Filters: ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD&status=...
+    """
+    permission_classes = [IsAuthenticated, HasRole]
+    allowed_roles = ()  # admins only
+
+    def get(self, request, name, fmt, gz=None, *args, **kwargs):
+        filters = {'status': request.query_params.get('status') or None}
+        if filters['status'] and not exports.EXPORTS[name][3]:
+            raise ValidationError({'status': f"{name} can't be filtered by status"})
+        for param in ('date_from', 'date_to'):
+            value = request.query_params.get(param)
+            try:
+                filters[param] = parse_date(value) if value else None
+            except ValueError:
+                filters[param] = None
+            if value and filters[param] is None:
+                raise ValidationError({param: 'Use the YYYY-MM-DD format.'})
+
+        filename = f'{name}.{fmt}{gz or ""}'
+        response = StreamingHttpResponse(
+            exports.stream(name, fmt, compress=bool(gz), **filters),
+            content_type='application/gzip' if gz else exports.FORMATS[fmt],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+class BulkStatusView(generics.GenericAPIView):
+    """
+    Admin-only bulk status change, applied with one UPDATE:
+    POST {"status": "cancelled", "ids": [...]} or {"status": ..., "doctor": id, "date": "YYYY-MM-DD"}.
+    Rows that can't move to that status are skipped.
+    """
+    serializer_class = BulkStatusSerializer
+    permission_classes = [IsAuthenticated, HasRole]
+    allowed_roles = ()  # admins only
+    model = Appointment
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['transitions'] = transitions.TRANSITIONS[self.model]
+        return context
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        if 'ids' in data:
+            queryset = self.model.objects.filter(pk__in=data['ids'])
+        else:
+            queryset = self.model.objects.filter(doctor_id=data['doctor'], appointment_date=data['date'])
+
+        changed = transitions.transition(queryset, data['status'])
+        return Response({'status': data['status'], 'updated': [row.pk for row in changed]})
+
 def prescription_test_form(request):
     """Simple view to render the prescription test form"""
     return render(request, 'appointment/prescription_test.html')
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+VERSION_KEY = 'doctor_directory:version'
+SNAPSHOT_KEY = 'doctor_directory:{version}:{profession}'
+
+# Fields that never show up in the directory; saving only these doesn't bump the version
+IGNORED_UPDATE_FIELDS = {'password', 'last_login', 'updated_at'}
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from a clock value so a lost key never reuses an old version number
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+
+
+def build_snapshot(profession=None):
+    from .serializers import DoctorListSerializer
+
+    User = get_user_model()
+    queryset = User.objects.filter(user_type='doctor', is_active=True)
+    if profession:
+        queryset = queryset.filter(profession=profession)
+
+    # Round-trip through JSON so the cached value is plain data
+    results = json.loads(json.dumps(DoctorListSerializer(queryset, many=True).data, cls=DjangoJSONEncoder))
+    etag = hashlib.sha256(json.dumps(results, sort_keys=True).encode()).hexdigest()[:32]
+    return {'etag': etag, 'results': results}
+
+
+def get_snapshot(profession=None):
+    """
+    Return the serialized doctor directory for a profession filter.
+
+    Snapshots are keyed by the directory version, so bumping the version on
+    any doctor save makes every old snapshot unreachable. On a miss only one
+    caller rebuilds (cache.add acts as the lock); the others wait briefly for
+    its result instead of all hitting the database at once.
+    """
+    key = SNAPSHOT_KEY.format(version=get_version(), profession=profession or 'all')
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        return snapshot
+
+    timeout = getattr(settings, 'DOCTOR_DIRECTORY_SNAPSHOT_TIMEOUT', 24 * 60 * 60)
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, True, 30):
+        try:
+            snapshot = build_snapshot(profession)
+            cache.set(key, snapshot, timeout)
+        finally:
+            cache.delete(lock_key)
+        return snapshot
+
+    deadline = time.monotonic() + 2
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        snapshot = cache.get(key)
+        if snapshot is not None:
+            return snapshot
+
+    # The builder is taking too long; serve a fresh build without caching it
+    return build_snapshot(profession)
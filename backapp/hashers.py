@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 hasher whose work factor comes from settings.PASSWORD_HASH_ITERATIONS.
+
+    It keeps the stock 'pbkdf2_sha256' algorithm name, so existing hashes keep
+    verifying. When the configured iteration count changes, Django's
+    check_password sees must_update() and rehashes on the next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', PBKDF2PasswordHasher.iterations)
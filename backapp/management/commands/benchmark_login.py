@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils.crypto import get_random_string
+from rest_framework.exceptions import Throttled
+from backapp.login_protection import LoginGuard, get_setting
+from backapp.serializers import UserLoginSerializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Measure login throughput for valid, invalid, unknown and locked-out attempts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attempts', type=int, default=20, help='Attempts per scenario')
+
+    def handle(self, *args, **options):
+        attempts = options['attempts']
+        suffix = get_random_string(8).lower()
+        email = f'bench-{suffix}@zencare.test'
+        password = get_random_string(16)
+        factory = RequestFactory()
+
+        def attempt(login_email, login_password, ip):
+            request = factory.post('/api/v1/auth/login/', REMOTE_ADDR=ip)
+            serializer = UserLoginSerializer(
+                data={'email': login_email, 'password': login_password},
+                context={'request': request}
+            )
+            try:
+                serializer.is_valid()
+            except Throttled:
+                pass
+
+        def wrong_password(i):
+            # Clear the account counter so every attempt pays for a full hash
+            LoginGuard(email).succeeded()
+            attempt(email, f'wrong-{i}', f'10.0.1.{i % 250}')
+
+        def lock_account():
+            for _ in range(get_setting('ACCOUNT_FAILURE_LIMIT')):
+                attempt(email, 'wrong', '10.0.3.1')
+
+        scenarios = [
+            # Each scenario uses its own IPs so per-IP counters don't bleed over
+            ('valid password', None, lambda i: attempt(email, password, '10.0.0.1')),
+            ('wrong password', None, wrong_password),
+            ('unknown email', None, lambda i: attempt(f'nobody-{suffix}-{i}@zencare.test', 'x', f'10.0.2.{i % 250}')),
+            ('locked out', lock_account, lambda i: attempt(email, 'wrong', '10.0.3.1')),
+        ]
+
+        with transaction.atomic():
+            User.objects.create_user(email=email, password=password, first_name='Bench', last_name='User')
+            for name, setup, run in scenarios:
+                if setup:
+                    setup()
+                started = time.perf_counter()
+                for i in range(attempts):
+                    run(i)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{name:<16} {attempts / elapsed:10.1f} attempts/s  '
+                    f'({elapsed / attempts * 1000:.2f} ms each)'
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,275 @@
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+import django
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.contrib.auth.models import Group
+from django.db import DatabaseError, transaction
+from backapp import doctor_directory
+from admin_customization import dashboard
+
+User = get_user_model()
+
+# Plain text columns copied onto the user as-is
+TEXT_FIELDS = (
+    'first_name', 'last_name', 'phone_number', 'phone_number_2', 'address',
+    'city', 'state', 'country', 'work_experience', 'education', 'training',
+)
+
+
+def _init_worker():
+    django.setup()
+
+
+def _hash_password(args):
+    password, iterations = args
+    if not password:
+        return make_password(None)
+    hasher = get_hasher('default')
+    if iterations:
+        # A lower work factor is upgraded by check_password on first login
+        return hasher.encode(password, hasher.salt(), iterations)
+    return hasher.encode(password, hasher.salt())
+
+
+class RowError(Exception):
+    pass
+
+
+def text(value):
+    """A cell as stripped text; JSONL values may be numbers or null."""
+    return '' if value is None else str(value).strip()
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk import users of any role from a CSV or JSONL file. '
+        'Rows are validated and inserted in chunks; bad rows are reported without stopping the run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file ('-' reads JSONL from stdin)")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Password hashing processes')
+        parser.add_argument(
+            '--hash-iterations', type=int,
+            help='PBKDF2 iterations for imported passwords; upgraded to the configured value on first login'
+        )
+        parser.add_argument('--errors', help='Write rejected rows to this CSV file')
+        parser.add_argument('--default-user-type', default='patient',
+                            choices=[choice for choice, _ in User.USER_TYPE_CHOICES])
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('csv' if options['path'].endswith('.csv') else 'jsonl')
+        self.default_user_type = options['default_user_type']
+        self.hash_iterations = options['hash_iterations']
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        if options['path'] != '-' and not os.path.isfile(options['path']):
+            raise CommandError(f"No such file: {options['path']}")
+
+        self.groups = {
+            user_type: Group.objects.get_or_create(name=name)[0]
+            for user_type, name in User.USER_TYPE_GROUPS.items()
+        }
+        self.seen_emails = set()
+        self.created = 0
+        self.errors = []
+        self.imported_doctors = False
+
+        error_file = open(options['errors'], 'w', newline='') if options['errors'] else None
+        self.error_writer = csv.writer(error_file) if error_file else None
+        if self.error_writer:
+            self.error_writer.writerow(['line', 'email', 'error'])
+
+        started = time.perf_counter()
+        stream = sys.stdin if options['path'] == '-' else open(options['path'], newline='')
+        try:
+            rows = self.read_rows(stream, fmt)
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+                self.pool = pool
+                while True:
+                    chunk = list(islice(rows, chunk_size))
+                    if not chunk:
+                        break
+                    self.import_chunk(chunk)
+                    self.stdout.write(f'{self.created} users imported, {len(self.errors)} rows rejected')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if error_file:
+                error_file.close()
+
+        if self.imported_doctors:
+            # bulk_create skips post_save, so invalidate the directory once here
+            doctor_directory.bump_version()
+
+        elapsed = time.perf_counter() - started
+        rate = self.created / elapsed * 60 if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.created} users in {elapsed:.1f}s ({rate:.0f}/min); {len(self.errors)} rows rejected'
+        ))
+        if self.errors and not self.error_writer:
+            for line, email, message in self.errors[:50]:
+                self.stderr.write(f'line {line} ({email}): {message}')
+            if len(self.errors) > 50:
+                self.stderr.write(f'... {len(self.errors) - 50} more; use --errors to get the full list')
+
+    def read_rows(self, stream, fmt):
+        if fmt == 'csv':
+            # Header is line 1
+            for line, row in enumerate(csv.DictReader(stream), start=2):
+                yield line, row
+            return
+        for line, raw in enumerate(stream, start=1):
+            if not raw.strip():
+                continue
+            try:
+                row = json.loads(raw)
+            except ValueError as e:
+                yield line, RowError(f'Invalid JSON: {e}')
+                continue
+            yield line, row if isinstance(row, dict) else RowError('Expected a JSON object')
+
+    def reject(self, line, email, message):
+        self.errors.append((line, email, message))
+        if self.error_writer:
+            self.error_writer.writerow([line, email, message])
+
+    def clean_row(self, row):
+        email = User.objects.normalize_email(text(row.get('email')))
+        try:
+            validate_email(email)
+        except ValidationError:
+            raise RowError('Invalid email')
+        if email.lower() in self.seen_emails:
+            raise RowError('Duplicate email in file')
+
+        user_type = text(row.get('user_type')) or self.default_user_type
+        if user_type not in User.USER_TYPE_GROUPS:
+            raise RowError(f'Unknown user_type {user_type!r}')
+
+        fields = {field: text(row.get(field)) for field in TEXT_FIELDS}
+        fields.update(email=email, user_type=user_type)
+
+        profession = text(row.get('profession')) or None
+        if profession and profession not in dict(User.PROFESSION_CHOICES):
+            raise RowError(f'Unknown profession {profession!r}')
+        if user_type == 'doctor' and not profession:
+            raise RowError('Profession is required for doctors')
+        fields['profession'] = profession
+
+        gender = text(row.get('gender')) or None
+        if gender and gender not in dict(User.GENDER_CHOICES):
+            raise RowError(f'Unknown gender {gender!r}')
+        fields['gender'] = gender
+
+        try:
+            if text(row.get('date_of_birth')):
+                fields['date_of_birth'] = date.fromisoformat(text(row['date_of_birth']))
+            if text(row.get('experience_years')):
+                fields['experience_years'] = int(text(row['experience_years']))
+            if text(row.get('consultation_fee')):
+                fields['consultation_fee'] = Decimal(text(row['consultation_fee']))
+        except (ValueError, InvalidOperation) as e:
+            raise RowError(f'Invalid value: {e}')
+
+        # Staff accounts are created ready to use, like create_users does
+        if user_type in ('doctor', 'lab_technician', 'admin'):
+            fields['is_profile_completed'] = True
+            fields['is_verified'] = True
+        if user_type == 'admin':
+            fields['is_staff'] = True
+
+        # Lengths, ranges and decimal places, so the batch insert doesn't fail on them
+        try:
+            User(**fields).clean_fields(exclude=['password'])
+        except ValidationError as e:
+            raise RowError('; '.join(f'{field}: {" ".join(messages)}' for field, messages in e.message_dict.items()))
+
+        return fields, text(row.get('password')) or None, text(row.get('password_hash')) or None
+
+    def import_chunk(self, chunk):
+        cleaned = []
+        for line, row in chunk:
+            email = row.get('email') if isinstance(row, dict) else None
+            if isinstance(row, RowError):
+                self.reject(line, email, str(row))
+                continue
+            try:
+                fields, password, password_hash = self.clean_row(row)
+            except RowError as e:
+                self.reject(line, email, str(e))
+                continue
+            self.seen_emails.add(fields['email'].lower())
+            cleaned.append((line, fields, password, password_hash))
+
+        # One query per chunk for emails that already exist
+        existing = {
+            email.lower() for email in User.objects.filter(
+                email__in=[fields['email'] for _, fields, _, _ in cleaned]
+            ).values_list('email', flat=True)
+        }
+        pending = []
+        for item in cleaned:
+            if item[1]['email'].lower() in existing:
+                self.reject(item[0], item[1]['email'], 'User already exists')
+            else:
+                pending.append(item)
+        if not pending:
+            return
+
+        # Hash only rows without a pre-encoded password, in parallel
+        to_hash = [(password, self.hash_iterations) for _, _, password, password_hash in pending if not password_hash]
+        hashed = iter(self.pool.map(_hash_password, to_hash, chunksize=max(len(to_hash) // 32, 1)))
+
+        users = []
+        for line, fields, password, password_hash in pending:
+            user = User(password=password_hash or next(hashed), **fields)
+            user.update_profile_completion()
+            users.append((line, user))
+
+        self.insert_users(users)
+
+    def insert_users(self, users):
+        Membership = User.groups.through
+        try:
+            with transaction.atomic():
+                created = User.objects.bulk_create([user for _, user in users])
+                Membership.objects.bulk_create([
+                    Membership(user_id=user.pk, group_id=self.groups[user.user_type].pk)
+                    for user in created
+                ])
+                # Same for the admin dashboard counters
+                dashboard.bump('users', len(created))
+                dashboard.bump('doctors', sum(user.user_type == 'doctor' for user in created))
+        except DatabaseError:
+            # Someone created one of these emails meanwhile, or a value the
+            # checks above missed; insert one by one to isolate the bad rows.
+            # save() adds the group and the signals count the new users.
+            created = []
+            for line, user in users:
+                user.pk = None
+                try:
+                    with transaction.atomic():
+                        user.save()
+                    created.append(user)
+                except DatabaseError as e:
+                    self.reject(line, user.email, f'Database error: {e}')
+
+        self.created += len(created)
+        if any(user.user_type == 'doctor' for user in created):
+            self.imported_doctors = True
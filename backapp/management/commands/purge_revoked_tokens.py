@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from backapp.models import RevokedToken
+from backapp.token_revocation import revocation_store
+
+
+class Command(BaseCommand):
+    help = 'Delete revoked refresh tokens that have expired and rebuild the revocation filter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows deleted per query')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        now = timezone.now()
+        total = 0
+
+        # Delete in batches so a large backlog doesn't hold one long lock
+        while True:
+            ids = list(
+                RevokedToken.objects.filter(expires_at__lte=now)
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            deleted, _ = RevokedToken.objects.filter(id__in=ids).delete()
+            total += deleted
+
+        revocation_store.refresh()
+        self.stdout.write(self.style.SUCCESS(f'Purged {total} expired revoked tokens'))
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.15 on 2026-10-19 13:45
+
+from django.db import migrations, models
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Trigram indexes are PostgreSQL-only; other backends fall back to prefix search
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in ('first_name', 'last_name'):
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS backapp_user_{column}_trgm_idx '
+            f'ON backapp_user USING gin ({column} gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in ('first_name', 'last_name'):
+        schema_editor.execute(f'DROP INDEX IF EXISTS backapp_user_{column}_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('backapp', '0007_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['user_type', 'profession'], name='user_type_profession_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['user_type', 'city'], name='user_type_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['user_type', 'state'], name='user_type_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['user_type', 'country'], name='user_type_country_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['user_type', 'consultation_fee'], name='user_type_fee_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
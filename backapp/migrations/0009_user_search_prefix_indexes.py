@@ -0,0 +1,33 @@
+from django.db import migrations
+
+COLUMNS = ('email', 'first_name', 'last_name')
+
+
+def create_prefix_indexes(apps, schema_editor):
+    # The admin's prefix search runs UPPER(column) LIKE 'TERM%' on PostgreSQL;
+    # the unique index on email can't serve it
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS backapp_user_{column}_upper_idx '
+            f'ON backapp_user (UPPER({column}::text) text_pattern_ops)'
+        )
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS backapp_user_{column}_upper_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backapp', '0008_doctor_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
@@ -52,6 +52,14 @@ class User(AbstractUser):
         ('O', 'Other'),
     )
 
+    # Auth group every user of a given type belongs to
+    USER_TYPE_GROUPS = {
+        'doctor': 'Doctors',
+        'patient': 'Patients',
+        'lab_technician': 'Lab Technicians',
+        'admin': 'Admins',
+    }
+
     username = None  # Remove username field
     email = models.EmailField(_('email address'), unique=True)
     user_type = models.CharField(max_length=20, choices=USER_TYPE_CHOICES, default='patient')
@@ -85,22 +93,34 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name']
 
+    _loaded_user_type = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored role so signal handlers can see role changes
+        instance._loaded_user_type = instance.__dict__.get('user_type')
+        return instance
+
     def __str__(self):
         return self.email
 
     def get_full_name(self):
         return f"{self.first_name} {self.last_name}".strip()
 
-    def save(self, *args, **kwargs):
-        if self.user_type == 'doctor' and not self.profession and not kwargs.get('skip_validation', False):
-            raise ValueError("Profession is required for doctors")
-            
+    def update_profile_completion(self):
         # Check if profile is completed for patients
         if self.user_type == 'patient':
             if (self.first_name and self.last_name and self.phone_number and 
                 self.date_of_birth and self.address and self.city and 
                 self.state and self.country and self.gender):
                 self.is_profile_completed = True
+
+    def save(self, *args, **kwargs):
+        if self.user_type == 'doctor' and not self.profession and not kwargs.get('skip_validation', False):
+            raise ValueError("Profession is required for doctors")
+            
+        self.update_profile_completion()
                 
         # Remove skip_validation if it exists
         if 'skip_validation' in kwargs:
@@ -109,20 +129,37 @@ class User(AbstractUser):
         super().save(*args, **kwargs)
         
         # Assign appropriate group based on user type
-        if self.user_type == 'doctor':
-            doctor_group, _ = Group.objects.get_or_create(name='Doctors')
-            self.groups.add(doctor_group)
-        elif self.user_type == 'patient':
-            patient_group, _ = Group.objects.get_or_create(name='Patients')
-            self.groups.add(patient_group)
-        elif self.user_type == 'lab_technician':
-            lab_tech_group, _ = Group.objects.get_or_create(name='Lab Technicians')
-            self.groups.add(lab_tech_group)
-        elif self.user_type == 'admin':
-            admin_group, _ = Group.objects.get_or_create(name='Admins')
-            self.groups.add(admin_group)
+        group_name = self.USER_TYPE_GROUPS.get(self.user_type)
+        if group_name:
+            group, _ = Group.objects.get_or_create(name=group_name)
+            self.groups.add(group)
 
     class Meta:
         verbose_name = _('user')
         verbose_name_plural = _('users')
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        # Exact-match filters used by the doctor search (see DoctorSearchView).
+        # Trigram indexes on the names are created in migration 0008 on PostgreSQL.
+        # UPPER(...) prefix indexes for the admin search are created in migration 0009.
+        indexes = [
+            models.Index(fields=['user_type', 'profession'], name='user_type_profession_idx'),
+            models.Index(fields=['user_type', 'city'], name='user_type_city_idx'),
+            models.Index(fields=['user_type', 'state'], name='user_type_state_idx'),
+            models.Index(fields=['user_type', 'country'], name='user_type_country_idx'),
+            models.Index(fields=['user_type', 'consultation_fee'], name='user_type_fee_idx'),
+        ]
+
+
+class RevokedToken(models.Model):
+    """
+    Refresh token ids (jti) that must no longer be accepted.
+
+    Rows are only needed until the token would have expired anyway; the
+    purge_revoked_tokens command removes them after that.
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.jti
@@ -2,8 +2,13 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
+from rest_framework.exceptions import Throttled
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from appointment.models import Appointment
 from appointment.serializers import AppointmentSerializer
+from .login_protection import LoginGuard, LoginLocked, run_dummy_hash
+from .token_revocation import RevocableRefreshToken
+from zencare.serializers import SparseFieldsetMixin
 
 User = get_user_model()
 
@@ -91,15 +96,24 @@ class UserLoginSerializer(serializers.Serializer):
     def validate(self, attrs):
         email = attrs.get('email')
         password = attrs.get('password')
-        
-        # Special case for admin login with hardcoded credentials
-        if email == 'zencare@admin.com' and password == 'admin@123':
-            try:
-                # Try to get existing admin user
-                user = User.objects.filter(email=email).first()
-                
-                if not user:
-                    # Create admin user if it doesn't exist
+
+        if not (email and password):
+            raise serializers.ValidationError("Must include 'email' and 'password'.")
+
+        # Reject locked-out accounts/IPs before spending any time hashing
+        guard = LoginGuard(email, self.context.get('request'))
+        try:
+            guard.check()
+        except LoginLocked as e:
+            raise Throttled(wait=e.wait, detail=str(e))
+
+        is_admin_login = email == 'zencare@admin.com' and password == 'admin@123'
+        user = User.objects.filter(email=email).first()
+
+        if user is None:
+            if is_admin_login:
+                # Special case for admin login with hardcoded credentials
+                try:
                     user = User.objects.create_user(
                         email=email,
                         password=password,
@@ -111,28 +125,37 @@ class UserLoginSerializer(serializers.Serializer):
                         is_active=True,
                         is_profile_completed=True
                     )
-                elif not user.check_password(password):
-                    # Update password if it's changed
-                    user.set_password(password)
-                    user.save()
-                
-                attrs['user'] = user
-                return attrs
-            except Exception as e:
-                raise serializers.ValidationError(f"Admin login setup error: {str(e)}")
-                
-        if email and password:
-            user = User.objects.filter(email=email).first()
-            if user and user.check_password(password):
-                if not user.is_active:
-                    raise serializers.ValidationError("User account is disabled.")
+                except Exception as e:
+                    raise serializers.ValidationError(f"Admin login setup error: {str(e)}")
                 attrs['user'] = user
                 return attrs
+            run_dummy_hash(password)
+            guard.failed()
             raise serializers.ValidationError("Unable to log in with provided credentials.")
-        raise serializers.ValidationError("Must include 'email' and 'password'.")
+
+        # The only hash on this path; check_password also rehashes with the
+        # configured hasher on success. The hard-coded admin credentials only
+        # create the account; once it exists its stored password applies.
+        if not user.check_password(password):
+            guard.failed()
+            raise serializers.ValidationError("Unable to log in with provided credentials.")
+        if not user.is_active and not is_admin_login:
+            raise serializers.ValidationError("User account is disabled.")
+
+        guard.succeeded()
+        attrs['user'] = user
+        return attrs
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Token refresh that rejects revoked refresh tokens and revokes the old
+    token after rotation (see backapp.token_revocation).
+    """
+    token_class = RevocableRefreshToken
 
 
-class DoctorListSerializer(serializers.ModelSerializer):
+class DoctorListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField()
     profession_display = serializers.SerializerMethodField()
     
@@ -184,7 +207,7 @@ class CreateStaffUserSerializer(serializers.ModelSerializer):
         return user
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField()
     user_type_display = serializers.SerializerMethodField()
     profession_display = serializers.SerializerMethodField()
@@ -220,11 +243,12 @@ class UserProfileSerializer(serializers.ModelSerializer):
             appointments = Appointment.objects.filter(doctor=obj)
         else:
             return []
+        appointments = appointments.select_related('doctor', 'patient')
         
         return AppointmentSerializer(appointments, many=True).data
 
 
-class ProfileDetailsSerializer(serializers.ModelSerializer):
+class ProfileDetailsSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for viewing just the profile details that users enter during first login
     """
@@ -0,0 +1,17 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .doctor_directory import IGNORED_UPDATE_FIELDS, bump_version
+
+User = get_user_model()
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def handle_doctor_directory_change(sender, instance, **kwargs):
+    """Invalidate cached doctor directory snapshots when a doctor changes"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= IGNORED_UPDATE_FIELDS:
+        return
+    # Also bump when a user stops being a doctor
+    if instance.user_type == 'doctor' or instance._loaded_user_type == 'doctor':
+        bump_version()
@@ -1,3 +1,373 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import CommandError
+from django.db import DataError, IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import TokenError
+
+from . import doctor_directory
+from .models import RevokedToken, User
+from .token_revocation import BloomFilter, RevocableRefreshToken, RevocationStore, get_setting, revocation_store
+
+LOGIN_URL = '/api/v1/auth/login/'
+
+
+@override_settings(
+    PASSWORD_HASH_ITERATIONS=1000,
+    LOGIN_PROTECTION={'ACCOUNT_FAILURE_LIMIT': 3, 'IP_FAILURE_LIMIT': 5, 'LOCKOUT_BASE': 30},
+)
+class LoginProtectionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='pat@example.com', password='right-password', user_type='patient')
+        self.client = APIClient()
+
+    def login(self, email='pat@example.com', password='right-password', ip='10.0.0.1'):
+        return self.client.post(LOGIN_URL, {'email': email, 'password': password}, format='json',
+                                HTTP_HOST='localhost', REMOTE_ADDR=ip)
+
+    def test_account_lockout(self):
+        for _ in range(3):
+            self.assertEqual(self.login(password='wrong').status_code, 400)
+
+        # Locked even with the right password, and from another address
+        response = self.login(ip='10.0.0.2')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    def test_success_resets_account_failures(self):
+        for _ in range(2):
+            self.login(password='wrong')
+        self.assertEqual(self.login().status_code, 200)
+        for _ in range(2):
+            self.login(password='wrong')
+        self.assertEqual(self.login().status_code, 200)
+
+    def test_ip_lockout(self):
+        for i in range(5):
+            self.login(email=f'nobody{i}@example.com', password='wrong')
+
+        self.assertEqual(self.login().status_code, 429)
+        self.assertEqual(self.login(ip='10.0.0.2').status_code, 200)
+
+    def test_locked_login_skips_hashing(self):
+        for _ in range(3):
+            self.login(password='wrong')
+
+        with mock.patch.object(User, 'check_password') as check_password:
+            self.assertEqual(self.login().status_code, 429)
+        check_password.assert_not_called()
+
+    def test_unknown_email_runs_dummy_hash(self):
+        with mock.patch('backapp.serializers.run_dummy_hash') as run_dummy_hash:
+            response = self.login(email='nobody@example.com')
+
+        self.assertEqual(response.status_code, 400)
+        run_dummy_hash.assert_called_once_with('right-password')
+
+    def test_rehash_to_configured_iterations(self):
+        self.assertIn('$1000$', self.user.password)
+
+        with self.settings(PASSWORD_HASH_ITERATIONS=1200):
+            self.assertEqual(self.login().status_code, 200)
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1200$'))
+        self.assertTrue(self.user.check_password('right-password'))
+
+    def test_admin_credentials_dont_reset_password(self):
+        admin = User.objects.create_user(email='zencare@admin.com', password='changed', user_type='admin')
+
+        self.assertEqual(self.login(email='zencare@admin.com', password='admin@123').status_code, 400)
+        admin.refresh_from_db()
+        self.assertTrue(admin.check_password('changed'))
+
+
+class TokenRevocationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        revocation_store._filter = None
+        self.user = User.objects.create_user(email='pat@example.com', password='x', user_type='patient')
+
+    def revoked_token_queries(self, store, jti):
+        with CaptureQueriesContext(connection) as queries:
+            revoked = store.is_revoked(jti)
+        return revoked, [q for q in queries.captured_queries if RevokedToken._meta.db_table in q['sql']]
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter.for_capacity(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f'jti-{i}')
+
+        self.assertTrue(all(f'jti-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_unrevoked_token_skips_database(self):
+        store = RevocationStore()
+        store.get_filter()
+
+        with CaptureQueriesContext(connection) as queries:
+            revoked = store.is_revoked('never-revoked')
+
+        self.assertFalse(revoked)
+        # Not the revocation table, nor the database cache
+        self.assertEqual(queries.captured_queries, [])
+
+    def test_false_positive_is_confirmed(self):
+        store = RevocationStore()
+        # A filter with every bit set matches every jti
+        store._filter = BloomFilter(64, 3, b'\xff' * 8)
+        store._loaded_at = float('inf')
+
+        revoked, queries = self.revoked_token_queries(store, 'never-revoked')
+
+        self.assertFalse(revoked)
+        self.assertEqual(len(queries), 1)
+
+    def test_recent_revocation_seen_by_other_workers(self):
+        worker, other = RevocationStore(), RevocationStore()
+        other.get_filter()
+
+        worker.revoke('jti-1', timezone.now() + timedelta(days=1))
+
+        # other's filter predates the revocation; it reads the log on its next sync
+        self.assertNotIn('jti-1', other._filter)
+        other._synced_at -= get_setting('RECENT_SYNC_INTERVAL')
+        self.assertTrue(other.is_revoked('jti-1'))
+        self.assertFalse(other.is_revoked('jti-2'))
+
+        # A worker that loads the shared filter later gets it from the log too
+        late = RevocationStore()
+        self.assertTrue(late.is_revoked('jti-1'))
+
+    def test_refresh_rotation_revokes_old_token(self):
+        refresh = str(RevocableRefreshToken.for_user(self.user))
+        client = APIClient()
+
+        response = client.post('/api/v1/auth/token/refresh/', {'refresh': refresh}, format='json', HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['refresh'], refresh)
+        self.assertEqual(RevokedToken.objects.count(), 1)
+
+        response = client.post('/api/v1/auth/token/refresh/', {'refresh': refresh}, format='json', HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 401)
+
+    def test_blacklist(self):
+        token = RevocableRefreshToken.for_user(self.user)
+        token.blacklist()
+
+        with self.assertRaises(TokenError):
+            RevocableRefreshToken(str(token))
+
+    def test_purge(self):
+        now = timezone.now()
+        RevokedToken.objects.create(jti='expired', expires_at=now - timedelta(minutes=1))
+        RevokedToken.objects.create(jti='live', expires_at=now + timedelta(days=1))
+
+        call_command('purge_revoked_tokens', batch_size=1, stdout=StringIO())
+
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['live'])
+        self.assertIn('live', revocation_store._filter)
+        self.assertNotIn('expired', revocation_store._filter)
+
+
+class DoctorDirectoryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.doctor = User.objects.create_user(
+            email='doc@example.com', password='x', user_type='doctor', profession='dentist', first_name='Ada'
+        )
+        self.patient = User.objects.create_user(email='pat@example.com', password='x', user_type='patient')
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+
+    def get(self, **headers):
+        return self.client.get('/api/v1/doctors/', HTTP_HOST='localhost', **headers)
+
+    def user_queries(self, function):
+        with CaptureQueriesContext(connection) as queries:
+            result = function()
+        return result, [q for q in queries.captured_queries if 'FROM "backapp_user"' in q['sql']]
+
+    def test_snapshot_is_reused(self):
+        _, queries = self.user_queries(doctor_directory.get_snapshot)
+        self.assertEqual(len(queries), 1)
+        snapshot, queries = self.user_queries(doctor_directory.get_snapshot)
+
+        self.assertEqual(queries, [])
+        self.assertEqual([row['id'] for row in snapshot['results']], [self.doctor.pk])
+
+    def test_doctor_save_bumps_version(self):
+        version = doctor_directory.get_version()
+        doctor_directory.get_snapshot()
+
+        self.doctor.first_name = 'Grace'
+        self.doctor.save()
+
+        self.assertNotEqual(doctor_directory.get_version(), version)
+        self.assertEqual(doctor_directory.get_snapshot()['results'][0]['full_name'], self.doctor.get_full_name())
+
+    def test_ignored_fields_keep_version(self):
+        version = doctor_directory.get_version()
+
+        self.doctor.save(update_fields=['last_login'])
+        self.patient.first_name = 'Pat'
+        self.patient.save()
+
+        self.assertEqual(doctor_directory.get_version(), version)
+
+    def test_etag(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        self.doctor.first_name = 'Grace'
+        self.doctor.save()
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class DoctorSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        doctors = (
+            ('Ada', 'dentist', 'Lagos', '50.00'),
+            ('Adam', 'dentist', 'Abuja', '80.00'),
+            ('Grace', 'dermatologist', 'Lagos', '120.00'),
+        )
+        for i, (name, profession, city, fee) in enumerate(doctors):
+            User.objects.create_user(
+                email=f'doc{i}@example.com', password='x', user_type='doctor', first_name=name,
+                profession=profession, city=city, consultation_fee=fee,
+            )
+        cls.patient = User.objects.create_user(email='pat@example.com', password='x', user_type='patient')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+
+    def search(self, **params):
+        return self.client.get('/api/v1/doctors/search/', params, HTTP_HOST='localhost')
+
+    def test_facets(self):
+        response = self.search(city='Lagos')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['facets']['profession'], [
+            {'value': 'dentist', 'label': 'Dentist', 'count': 1},
+            {'value': 'dermatologist', 'label': 'Dermatologist', 'count': 1},
+        ])
+        self.assertEqual(response.data['facets']['city'], [{'value': 'Lagos', 'label': 'Lagos', 'count': 2}])
+
+    def test_name_and_fee_filters(self):
+        response = self.search(q='ada', fee_min='60', fee_max='100.5')
+
+        self.assertEqual([row['full_name'].split()[0] for row in response.data['results']], ['Adam'])
+
+    def test_invalid_fee(self):
+        for value in ('abc', 'NaN', 'Infinity', '-inf'):
+            response = self.search(fee_min=value)
+            self.assertEqual(response.status_code, 400, value)
+            self.assertIn('fee_min', response.data)
+
+
+class ImportUsersTests(TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+        self.password_hash = make_password('x')
+
+    def run_import(self, rows):
+        with open(self.path, 'w') as output:
+            for row in rows:
+                output.write((row if isinstance(row, str) else json.dumps(row)) + '\n')
+        stderr = StringIO()
+        call_command('import_users', self.path, workers=1, stdout=StringIO(), stderr=stderr)
+        return stderr.getvalue()
+
+    def row(self, email, **fields):
+        return {'email': email, 'password_hash': self.password_hash, **fields}
+
+    def test_bad_rows_are_reported(self):
+        errors = self.run_import([
+            self.row('ok@example.com', phone_number=5551234, first_name='Ok'),
+            self.row('long@example.com', first_name='x' * 200),
+            self.row('fee@example.com', consultation_fee='1.234'),
+            self.row('not-an-email'),
+            self.row('role@example.com', user_type='pilot'),
+            self.row('doc@example.com', user_type='doctor'),
+            '{not json',
+            '[1, 2]',
+            self.row('last@example.com'),
+        ])
+
+        self.assertEqual(sorted(User.objects.values_list('email', flat=True)), ['last@example.com', 'ok@example.com'])
+        self.assertEqual(User.objects.get(email='ok@example.com').phone_number, '5551234')
+        for line, message in (
+            (2, 'first_name'), (3, 'consultation_fee'), (4, 'Invalid email'), (5, 'Unknown user_type'),
+            (6, 'Profession is required'), (7, 'Invalid JSON'), (8, 'Expected a JSON object'),
+        ):
+            self.assertRegex(errors, f'line {line} .*{message}')
+
+    def test_duplicates(self):
+        User.objects.create_user(email='taken@example.com', password='x')
+
+        errors = self.run_import([
+            self.row('new@example.com'), self.row('NEW@example.com'), self.row('taken@example.com'),
+        ])
+
+        self.assertEqual(User.objects.count(), 2)
+        self.assertIn('line 2 (NEW@example.com): Duplicate email in file', errors)
+        self.assertIn('line 3 (taken@example.com): User already exists', errors)
+
+    def test_batch_failure_falls_back_to_single_inserts(self):
+        original_save = User.save
+
+        def save(user, *args, **kwargs):
+            if user.email == 'bad@example.com':
+                raise DataError('value too long')
+            return original_save(user, *args, **kwargs)
+
+        with mock.patch.object(User.objects, 'bulk_create', side_effect=IntegrityError('duplicate key')), \
+                mock.patch.object(User, 'save', save):
+            errors = self.run_import([
+                self.row('a@example.com'),
+                self.row('bad@example.com'),
+                self.row('doc@example.com', user_type='doctor', profession='dentist'),
+            ])
+
+        self.assertEqual(sorted(User.objects.values_list('email', flat=True)), ['a@example.com', 'doc@example.com'])
+        self.assertIn('line 2 (bad@example.com): Database error: value too long', errors)
+        doctor = User.objects.get(email='doc@example.com')
+        self.assertEqual(list(doctor.groups.values_list('name', flat=True)), ['Doctors'])
+
+    def test_argument_errors(self):
+        with self.assertRaises(CommandError):
+            call_command('import_users', self.path + '.missing', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('import_users', self.path, chunk_size=0, stdout=StringIO())
@@ -0,0 +1,189 @@
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .models import RevokedToken
+
+DEFAULTS = {
+    # How often a worker refreshes its copy of the filter (seconds)
+    'FILTER_REBUILD_INTERVAL': 300,
+    'FILTER_FALSE_POSITIVE_RATE': 0.01,
+    # How often a worker picks up other workers' revocations (seconds); the
+    # longest a revoked token can still be refreshed elsewhere
+    'RECENT_SYNC_INTERVAL': 5,
+}
+
+FILTER_CACHE_KEY = 'token_revocation:filter'
+FILTER_LOCK_KEY = 'token_revocation:filter:lock'
+# Revocations are numbered; RECENT_KEY n holds the n-th revoked jti
+RECENT_COUNT_KEY = 'token_revocation:recent:count'
+RECENT_KEY = 'token_revocation:recent:{n}'
+
+
+def get_setting(name):
+    return getattr(settings, 'TOKEN_REVOCATION', {}).get(name, DEFAULTS[name])
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+
+    "Not in the filter" is definite; "in the filter" may be a false positive
+    at roughly the configured rate and has to be confirmed against the store.
+    """
+
+    def __init__(self, size, hashes, bits=None):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bytearray(bits) if bits is not None else bytearray((size + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate):
+        capacity = max(capacity, 1)
+        size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        hashes = max(int(round(size / capacity * math.log(2))), 1)
+        return cls(size, hashes)
+
+    def _positions(self, value):
+        digest = hashlib.sha256(value.encode()).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:16], 'big') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class RevocationStore:
+    """
+    Revoked refresh tokens keyed by jti.
+
+    Lookups are answered from a per-process Bloom filter, so a token that
+    was never revoked costs no query or cache read. The filter is built
+    from RevokedToken and reloaded from the shared cache every
+    FILTER_REBUILD_INTERVAL seconds. Revocations made since are appended to
+    a numbered log in the cache, which each worker reads into its filter at
+    most every RECENT_SYNC_INTERVAL seconds. Only filter hits are confirmed
+    against the database.
+    """
+
+    def __init__(self):
+        self._filter = None
+        self._loaded_at = 0
+        self._synced_at = 0
+        # Number of the last logged revocation in self._filter
+        self._recent_seen = 0
+
+    def build_filter(self):
+        # Read first: revocations logged after this may be missing from the rows below
+        recent_count = cache.get(RECENT_COUNT_KEY, 0)
+        jtis = list(
+            RevokedToken.objects.filter(expires_at__gt=timezone.now()).values_list('jti', flat=True)
+        )
+        # Leave headroom for revocations added before the next rebuild
+        bloom = BloomFilter.for_capacity(max(len(jtis) * 2, 1024), get_setting('FILTER_FALSE_POSITIVE_RATE'))
+        for jti in jtis:
+            bloom.add(jti)
+        # The shared copy expires so some worker rebuilds it every interval
+        cache.set(
+            FILTER_CACHE_KEY,
+            (bloom.size, bloom.hashes, bytes(bloom.bits), recent_count),
+            get_setting('FILTER_REBUILD_INTERVAL')
+        )
+        return bloom, recent_count
+
+    def get_filter(self):
+        now = time.monotonic()
+        if self._filter is not None and now - self._loaded_at < get_setting('FILTER_REBUILD_INTERVAL'):
+            if now - self._synced_at >= get_setting('RECENT_SYNC_INTERVAL'):
+                self.sync_recent()
+            return self._filter
+
+        cached = cache.get(FILTER_CACHE_KEY)
+        if cached is None and cache.add(FILTER_LOCK_KEY, True, 60):
+            # Only one worker rebuilds; it also refreshes the shared copy
+            try:
+                bloom, recent_count = self.build_filter()
+            finally:
+                cache.delete(FILTER_LOCK_KEY)
+        elif cached is None:
+            # Someone else is rebuilding; confirm every lookup until it lands
+            return None
+        else:
+            size, hashes, bits, recent_count = cached
+            bloom = BloomFilter(size, hashes, bits)
+
+        self.use_filter(bloom, recent_count)
+        return bloom
+
+    def use_filter(self, bloom, recent_count):
+        self._filter = bloom
+        self._loaded_at = time.monotonic()
+        self._recent_seen = recent_count
+        self.sync_recent()
+
+    def sync_recent(self):
+        """Add revocations logged since the filter was built or last synced."""
+        count = cache.get(RECENT_COUNT_KEY, 0)
+        if count > self._recent_seen:
+            keys = [RECENT_KEY.format(n=n) for n in range(self._recent_seen + 1, count + 1)]
+            for jti in cache.get_many(keys).values():
+                self._filter.add(jti)
+        # A lower count means the cache was cleared; the next rebuild covers it
+        self._recent_seen = count
+        self._synced_at = time.monotonic()
+
+    def revoke(self, jti, expires_at):
+        RevokedToken.objects.get_or_create(jti=jti, defaults={'expires_at': expires_at})
+        # Logged until every worker's filter has been rebuilt from the database
+        timeout = get_setting('FILTER_REBUILD_INTERVAL') * 2 + 60
+        cache.add(RECENT_COUNT_KEY, 0, None)
+        cache.set(RECENT_KEY.format(n=cache.incr(RECENT_COUNT_KEY)), jti, timeout)
+        if self._filter is not None:
+            self._filter.add(jti)
+
+    def is_revoked(self, jti):
+        bloom = self.get_filter()
+        if bloom is not None and jti not in bloom:
+            return False
+        return RevokedToken.objects.filter(jti=jti, expires_at__gt=timezone.now()).exists()
+
+    def refresh(self):
+        """Rebuild the shared filter now (after a purge, for example)."""
+        self.use_filter(*self.build_filter())
+
+
+revocation_store = RevocationStore()
+
+
+class RevocableRefreshToken(RefreshToken):
+    """
+    Refresh token checked against the revocation store.
+
+    TokenRefreshSerializer calls blacklist() on the old token when
+    BLACKLIST_AFTER_ROTATION is set, which now records it as revoked.
+    """
+
+    def verify(self, *args, **kwargs):
+        super().verify(*args, **kwargs)
+        if revocation_store.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        revocation_store.revoke(
+            self.payload[api_settings.JTI_CLAIM],
+            datetime_from_epoch(self.payload['exp']),
+        )
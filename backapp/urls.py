@@ -5,6 +5,7 @@ from .views import (
     UserRegistrationView,
     UserLoginView,
     DoctorListView,
+    DoctorSearchView,
     CustomTokenRefreshView,
     UserProfileView,
     ProfileCompletionView,
@@ -32,6 +33,7 @@ urlpatterns = [
     path('auth/token/refresh/', CustomTokenRefreshView.as_view(), name='token_refresh'),
     path('auth/password-reset/', PasswordResetAPIView.as_view(), name='password-reset-api'),
     path('doctors/', DoctorListView.as_view(), name='doctor-list'),
+    path('doctors/search/', DoctorSearchView.as_view(), name='doctor-search'),
     path('profile/', UserProfileView.as_view(), name='user-profile'),
     path('profile-details/', ProfileDetailsView.as_view(), name='profile-details'),
     path('complete-profile/', ProfileCompletionView.as_view(), name='complete-profile'),
@@ -7,14 +7,25 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer, DoctorListSerializer, 
     UserProfileSerializer, CompleteProfileSerializer, CreateStaffUserSerializer,
-    ProfileDetailsSerializer
+    ProfileDetailsSerializer, RevocableTokenRefreshSerializer
 )
+import hashlib
 import logging
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from . import doctor_directory
+from zencare.serializers import trim_representation
 from rest_framework_simplejwt.views import TokenRefreshView
 from django.core.exceptions import ValidationError
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Count, Q
+from django.db.models.functions import Greatest
+from rest_framework.exceptions import ValidationError as DRFValidationError
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.decorators import action
+from rest_framework.exceptions import Throttled
 from django.contrib.auth.forms import PasswordResetForm
 from django.contrib.auth.tokens import default_token_generator
 from django.views.decorators.csrf import csrf_exempt
@@ -52,6 +63,7 @@ class HomeView(APIView):
                 },
                 'doctors': {
                     'list': '/api/v1/doctors/',
+                    'search': '/api/v1/doctors/search/',
                 },
                 'appointments': {
                     'list': '/api/v1/appointment/',
@@ -74,6 +86,7 @@ class HomeView(APIView):
 class UserRegistrationView(generics.CreateAPIView):
     serializer_class = UserRegistrationSerializer
     permission_classes = [AllowAny]
+    throttle_scope = 'register'
 
     def post(self, request):
         try:
@@ -106,10 +119,11 @@ class UserRegistrationView(generics.CreateAPIView):
 class UserLoginView(APIView):
     serializer_class = UserLoginSerializer
     permission_classes = [AllowAny]
+    throttle_scope = 'login'
 
     def post(self, request):
         try:
-            serializer = self.serializer_class(data=request.data)
+            serializer = self.serializer_class(data=request.data, context={'request': request})
             if serializer.is_valid():
                 user = serializer.validated_data['user']
                 refresh = RefreshToken.for_user(user)
@@ -124,6 +138,13 @@ class UserLoginView(APIView):
                 })
             logger.error(f"Login validation failed: {serializer.errors}")
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        except Throttled as e:
+            logger.warning(f"Login locked out: {e.detail}")
+            return Response(
+                {'detail': e.detail},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={'Retry-After': str(e.wait)}
+            )
         except Exception as e:
             logger.error(f"Login error: {str(e)}")
             return Response({
@@ -174,6 +195,115 @@ class DoctorListView(generics.ListAPIView):
             
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        # Searches and custom orderings go to the database; the plain listing
+        # is served from the cached directory snapshot
+        if request.query_params.get('search') or request.query_params.get('ordering'):
+            return super().list(request, *args, **kwargs)
+
+        snapshot = doctor_directory.get_snapshot(request.query_params.get('profession'))
+        etag = '"%s-%s"' % (
+            snapshot['etag'],
+            hashlib.sha256(request.build_absolute_uri().encode()).hexdigest()[:16]
+        )
+        cache_control = 'private, max-age=%d' % getattr(settings, 'DOCTOR_DIRECTORY_MAX_AGE', 60)
+
+        if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag, 'Cache-Control': cache_control})
+
+        page = self.paginate_queryset(trim_representation(snapshot['results'], request))
+        if page is not None:
+            response = self.get_paginated_response(page)
+        else:
+            response = Response(trim_representation(snapshot['results'], request))
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
+
+class DoctorSearchView(generics.ListAPIView):
+    """
+    Doctor search with exact-match filters and facet counts.
+
+    Query params: q (name), profession, city, state, country, fee_min, fee_max.
+    Names are matched through trigram indexes on PostgreSQL and by prefix
+    elsewhere. Facet counts for the filtered set come from one grouped query.
+    """
+    serializer_class = DoctorListSerializer
+    permission_classes = [IsAuthenticated]
+    exact_filters = ('profession', 'city', 'state', 'country')
+    facet_fields = ('profession', 'city', 'state', 'country')
+
+    def get_filtered_queryset(self):
+        params = self.request.query_params
+        queryset = User.objects.filter(user_type='doctor', is_active=True)
+
+        for field in self.exact_filters:
+            value = params.get(field)
+            if value:
+                queryset = queryset.filter(**{field: value})
+
+        for param, lookup in (('fee_min', 'consultation_fee__gte'), ('fee_max', 'consultation_fee__lte')):
+            value = params.get(param)
+            if value:
+                try:
+                    amount = Decimal(value)
+                except InvalidOperation:
+                    amount = None
+                if amount is None or not amount.is_finite():
+                    raise DRFValidationError({param: "Must be a number"})
+                queryset = queryset.filter(**{lookup: amount})
+
+        query = params.get('q', '').strip()
+        if query:
+            if connection.vendor == 'postgresql':
+                queryset = queryset.filter(
+                    Q(first_name__trigram_word_similar=query) | Q(last_name__trigram_word_similar=query)
+                )
+            else:
+                queryset = queryset.filter(Q(first_name__istartswith=query) | Q(last_name__istartswith=query))
+        return queryset
+
+    def get_queryset(self):
+        queryset = self.get_filtered_queryset()
+        query = self.request.query_params.get('q', '').strip()
+        if query and connection.vendor == 'postgresql':
+            queryset = queryset.annotate(
+                similarity=Greatest(
+                    TrigramWordSimilarity(query, 'first_name'),
+                    TrigramWordSimilarity(query, 'last_name')
+                )
+            ).order_by('-similarity', 'id')
+        return queryset
+
+    def get_facets(self, queryset):
+        rows = queryset.order_by().values(*self.facet_fields).annotate(count=Count('id'))
+        counts = {field: {} for field in self.facet_fields}
+        for row in rows:
+            for field in self.facet_fields:
+                value = row[field]
+                if value:
+                    counts[field][value] = counts[field].get(value, 0) + row['count']
+
+        professions = dict(User.PROFESSION_CHOICES)
+        facets = {}
+        for field, values in counts.items():
+            facets[field] = [
+                {'value': value, 'label': professions.get(value, value) if field == 'profession' else value, 'count': count}
+                for value, count in sorted(values.items(), key=lambda item: (-item[1], item[0]))
+            ]
+        return facets
+
+    def list(self, request, *args, **kwargs):
+        facets = self.get_facets(self.get_filtered_queryset())
+        queryset = self.get_queryset()
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+            response.data['facets'] = facets
+            return response
+        return Response({'results': self.get_serializer(queryset, many=True).data, 'facets': facets})
+
 class AdminUserViewSet(viewsets.ModelViewSet):
     filter_backends = [SearchFilter, OrderingFilter]
     search_fields = ['email', 'first_name', 'last_name']
@@ -222,6 +352,7 @@ class UserProfileView(generics.RetrieveAPIView):
 
 class CustomTokenRefreshView(TokenRefreshView):
     permission_classes = [AllowAny]
+    serializer_class = RevocableTokenRefreshSerializer
 
 class ProfileDetailsView(generics.RetrieveAPIView):
     """
@@ -254,6 +385,7 @@ class PasswordResetAPIView(APIView):
     This view doesn't require CSRF token.
     """
     permission_classes = [AllowAny]
+    throttle_scope = 'password_reset'
 
     def post(self, request):
         """
@@ -1,8 +1,16 @@
-from django.core.mail import send_mail
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.core.mail import EmailMessage, get_connection, send_mail
 from django.conf import settings
+from django.db import transaction
 from django.template.loader import render_to_string
 from .models import Notification
 
+logger = logging.getLogger(__name__)
+
+# Background thread for batched emails; NOTIFICATIONS['EMAIL_WORKERS'] = 0 sends them inline
+_email_pool = None
+
 class NotificationService:
     @staticmethod
     def send_email_notification(recipient_email, subject, message, html_message=None):
@@ -17,10 +25,42 @@ class NotificationService:
                 fail_silently=False,
             )
             return True
-        except Exception as e:
-            print(f"Error sending email: {str(e)}")
+        except Exception:
+            logger.exception('Error sending email')
+            return False
+
+    @staticmethod
+    def send_email_batch(emails):
+        """Send (recipient_email, subject, message) tuples over one connection"""
+        try:
+            connection = get_connection(fail_silently=False)
+            connection.send_messages([
+                EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL, [recipient_email], connection=connection)
+                for recipient_email, subject, message in emails
+            ])
+            return True
+        except Exception:
+            logger.exception('Error sending email batch of %d', len(emails))
             return False
 
+    @staticmethod
+    def queue_email_batch(emails):
+        """Send a batch of emails once the transaction commits, off the request thread"""
+        if not emails:
+            return
+        workers = getattr(settings, 'NOTIFICATIONS', {}).get('EMAIL_WORKERS', 1)
+
+        def submit():
+            global _email_pool
+            if not workers:
+                NotificationService.send_email_batch(emails)
+                return
+            if _email_pool is None:
+                _email_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='notification-email')
+            _email_pool.submit(NotificationService.send_email_batch, emails)
+
+        transaction.on_commit(submit)
+
     @staticmethod
     def create_notification(recipient, notification_type, title, message, related_object=None):
         """Create a notification record"""
@@ -34,8 +74,8 @@ class NotificationService:
                 related_object_type=related_object.__class__.__name__ if related_object else None
             )
             return notification
-        except Exception as e:
-            print(f"Error creating notification: {str(e)}")
+        except Exception:
+            logger.exception('Error creating %s notification', notification_type)
             return None
 
     @staticmethod
@@ -71,38 +111,60 @@ class NotificationService:
             message=doctor_message
         )
 
+    @staticmethod
+    def cancellation_messages(appointment):
+        """(recipient, title, message) for everyone told about a cancelled appointment"""
+        return [
+            (
+                appointment.patient,
+                'Appointment Cancelled',
+                f"Your appointment with Dr. {appointment.doctor.get_full_name()} scheduled for {appointment.appointment_date} at {appointment.appointment_time} has been cancelled.",
+            ),
+            (
+                appointment.doctor,
+                'Appointment Cancelled',
+                f"Appointment with {appointment.patient.get_full_name()} scheduled for {appointment.appointment_date} at {appointment.appointment_time} has been cancelled.",
+            ),
+        ]
+
     @staticmethod
     def notify_appointment_cancelled(appointment):
         """Handle appointment cancellation notification"""
-        # Notify patient
-        patient_message = f"Your appointment with Dr. {appointment.doctor.get_full_name()} scheduled for {appointment.appointment_date} at {appointment.appointment_time} has been cancelled."
-        NotificationService.create_notification(
-            recipient=appointment.patient,
-            notification_type='appointment_cancelled',
-            title='Appointment Cancelled',
-            message=patient_message,
-            related_object=appointment
-        )
-        NotificationService.send_email_notification(
-            recipient_email=appointment.patient.email,
-            subject='Appointment Cancelled',
-            message=patient_message
-        )
+        for recipient, title, message in NotificationService.cancellation_messages(appointment):
+            NotificationService.create_notification(
+                recipient=recipient,
+                notification_type='appointment_cancelled',
+                title=title,
+                message=message,
+                related_object=appointment
+            )
+            NotificationService.send_email_notification(
+                recipient_email=recipient.email,
+                subject=title,
+                message=message
+            )
 
-        # Notify doctor
-        doctor_message = f"Appointment with {appointment.patient.get_full_name()} scheduled for {appointment.appointment_date} at {appointment.appointment_time} has been cancelled."
-        NotificationService.create_notification(
-            recipient=appointment.doctor,
-            notification_type='appointment_cancelled',
-            title='Appointment Cancelled',
-            message=doctor_message,
-            related_object=appointment
-        )
-        NotificationService.send_email_notification(
-            recipient_email=appointment.doctor.email,
-            subject='Appointment Cancelled',
-            message=doctor_message
-        )
+    @staticmethod
+    def notify_appointments_cancelled(appointments):
+        """
+        Cancellation notices for many appointments: one bulk insert, and the
+        emails go out as a single batch after commit
+        """
+        notifications = []
+        emails = []
+        for appointment in appointments:
+            for recipient, title, message in NotificationService.cancellation_messages(appointment):
+                notifications.append(Notification(
+                    recipient=recipient,
+                    notification_type='appointment_cancelled',
+                    title=title,
+                    message=message,
+                    related_object_id=appointment.id,
+                    related_object_type=appointment.__class__.__name__,
+                ))
+                emails.append((recipient.email, title, message))
+        Notification.objects.bulk_create(notifications, batch_size=500)
+        NotificationService.queue_email_batch(emails)
 
     @staticmethod
     def notify_prescription_uploaded(prescription):
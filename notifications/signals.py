@@ -1,6 +1,7 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from appointment.models import Appointment, Prescription
+from appointment.transitions import statuses_changed
 from .services import NotificationService
 
 @receiver(post_save, sender=Appointment)
@@ -16,9 +17,16 @@ def handle_appointment_notification(sender, instance, created, **kwargs):
 @receiver(post_save, sender=Prescription)
 def handle_prescription_notification(sender, instance, created, **kwargs):
     """Handle prescription upload notification"""
-    if created:
+    # The notification needs the appointment's patient and the doctor's name
+    if created and instance.appointment_id and instance.doctor_id:
         NotificationService.notify_prescription_uploaded(instance)
 
+@receiver(statuses_changed, sender=Appointment)
+def handle_bulk_appointment_notification(sender, instances, status, **kwargs):
+    """Notify everyone about appointments cancelled in bulk, in one batch"""
+    if status == 'cancelled':
+        NotificationService.notify_appointments_cancelled(instances)
+
 # Add this when you create the Report model
 # @receiver(post_save, sender=Report)
 # def handle_report_notification(sender, instance, created, **kwargs):
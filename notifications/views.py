@@ -17,10 +17,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
     pagination_class = NotificationPagination
 
     def get_queryset(self):
-        print(f"User attempting to access notifications: {self.request.user}")
-        queryset = Notification.objects.filter(recipient=self.request.user)
-        print(f"Found {queryset.count()} notifications")
-        return queryset
+        return Notification.objects.filter(recipient=self.request.user)
     
     
     @action(detail=True, methods=['post'])
@@ -0,0 +1,179 @@
+"""
+Logging plumbing used by settings.LOGGING.
+
+Records are handed to a queue in the request thread and written by a
+QueueListener thread, so file I/O never blocks a request. RequestIDFilter
+stamps each record with the current request's id (set by
+RequestIDMiddleware), SamplingFilter keeps a fraction of chatty loggers'
+low-level records, and JSONFormatter writes one JSON object per line.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import random
+import re
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Client-supplied ids are only trusted when they look like ids
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# LogRecord attributes that aren't `extra=` fields
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id'}
+
+
+def get_request_id():
+    return request_id_var.get()
+
+
+class RequestIDMiddleware:
+    """
+    Give every request an id: the caller's X-Request-ID when it's sane,
+    otherwise a new one. It's echoed in the response and on every log
+    record written while the request is handled.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        if not REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+        token = request_id_var.set(request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id_var.reset(token)
+        response[REQUEST_ID_HEADER] = request_id
+        return response
+
+
+class RequestIDFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of records below `level` from the given loggers
+    (and their children), e.g. {'django.db.backends': 0.01}.
+    """
+    def __init__(self, rates=None, level='WARNING'):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self.level = logging.getLevelName(level) if isinstance(level, str) else level
+
+    def rate_for(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= self.level:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1 or random.random() < rate
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, with `extra=` fields included."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'module': record.module,
+            'line': record.lineno,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+def _get_handler(name):
+    if hasattr(logging, 'getHandlerByName'):
+        return logging.getHandlerByName(name)
+    return logging._handlers.get(name)
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    Puts records on a queue and writes them to `handlers` (names of other
+    handlers in LOGGING) from a background thread, started with the first
+    record. dictConfig builds handlers in name order, so the targets' names
+    must sort before this one's.
+    """
+    def __init__(self, handlers, maxsize=10_000, respect_handler_level=True):
+        super().__init__(queue.Queue(maxsize))
+        targets = [_get_handler(name) for name in handlers]
+        missing = [name for name, handler in zip(handlers, targets) if handler is None]
+        if missing:
+            raise ValueError(f'Unknown log handlers: {", ".join(missing)}')
+        self.targets = targets
+        self.respect_handler_level = respect_handler_level
+        self.listener = None
+
+    def start(self):
+        self.listener = QueueListener(self.queue, *self.targets, respect_handler_level=self.respect_handler_level)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        if self.listener is not None:
+            listener, self.listener = self.listener, None
+            listener.stop()
+
+    def prepare(self, record):
+        # Resolve the message and traceback here, in the logging thread, but
+        # keep the record structured for the formatter on the other side
+        record = logging.makeLogRecord(vars(record))
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Never block a request on logging; drop the record instead
+            pass
+
+    def emit(self, record):
+        if self.listener is None:
+            self.acquire()
+            try:
+                if self.listener is None:
+                    self.start()
+            finally:
+                self.release()
+        super().emit(record)
+
+    def close(self):
+        self.stop()
+        for target in self.targets:
+            target.flush()
+        super().close()
@@ -0,0 +1,274 @@
+"""
+Per-request performance metrics.
+
+MetricsMiddleware times each request, counts its SQL queries and time
+(through connection.execute_wrapper), and adds up the time spent in DRF
+serializers (is_valid() and .data). The numbers go out in a Server-Timing
+header and into per-view histograms that /metrics serves in the Prometheus
+text format.
+
+Histograms live in process memory, so each worker reports its own; scrape
+every worker (or run one per container) to see them all.
+"""
+import bisect
+import contextvars
+import functools
+import hmac
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework import serializers
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Add a Server-Timing header to every response
+    'SERVER_TIMING': True,
+    # Bearer token /metrics requires; without one it's only served with DEBUG on
+    'TOKEN': None,
+}
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+UNMATCHED = '<unmatched>'
+
+current_stats = contextvars.ContextVar('request_stats', default=None)
+
+
+def get_setting(name):
+    return getattr(settings, 'METRICS', {}).get(name, DEFAULTS[name])
+
+
+class Histogram:
+    """A Prometheus histogram keyed by label values; safe to share between threads."""
+
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                # One count per bucket plus +Inf, then the sum
+                series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0]
+            series[index] += 1
+            series[-1] += value
+
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+
+    def render(self):
+        with self.lock:
+            series = {labels: list(values) for labels, values in self.series.items()}
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        bounds = [format_value(bound) for bound in self.buckets] + ['+Inf']
+        for label_values, values in sorted(series.items()):
+            labels = format_labels(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(bounds, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {format_value(values[-1])}')
+            lines.append(f'{self.name}_count{{{labels}}} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self.lock:
+            self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+
+    def render(self):
+        with self.lock:
+            series = dict(self.series)
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for label_values, value in sorted(series.items()):
+            lines.append(f'{self.name}{{{format_labels(zip(self.labels, label_values))}}} {format_value(value)}')
+        return lines
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(pairs):
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return ','.join(f'{name}="{value}"' for name, value in escaped)
+
+
+REQUESTS = Counter('zencare_http_requests_total', 'Requests by view, method and status.', ('view', 'method', 'status'))
+REQUEST_DURATION = Histogram(
+    'zencare_http_request_duration_seconds', 'Time to produce the response.', ('view', 'method'), DURATION_BUCKETS
+)
+DB_QUERIES = Histogram('zencare_http_db_queries', 'SQL queries per request.', ('view', 'method'), QUERY_BUCKETS)
+DB_DURATION = Histogram(
+    'zencare_http_db_duration_seconds', 'Time spent in SQL per request.', ('view', 'method'), DURATION_BUCKETS
+)
+SERIALIZER_DURATION = Histogram(
+    'zencare_http_serializer_duration_seconds', 'Time spent in DRF serializers per request.',
+    ('view', 'method'), DURATION_BUCKETS
+)
+RESPONSE_SIZE = Histogram(
+    'zencare_http_response_size_bytes', 'Response body size (streamed bodies without a length are skipped).',
+    ('view', 'method'), SIZE_BUCKETS
+)
+METRICS = (REQUESTS, REQUEST_DURATION, DB_QUERIES, DB_DURATION, SERIALIZER_DURATION, RESPONSE_SIZE)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'serializer_time', 'serializer_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+def timed(function):
+    """Add the call's duration to the request's serializer time; nested calls count once."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        stats = current_stats.get()
+        if stats is None or stats.serializer_depth:
+            return function(*args, **kwargs)
+        stats.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            stats.serializer_time += time.perf_counter() - start
+            stats.serializer_depth -= 1
+    wrapper.metrics_timed = True
+    return wrapper
+
+
+def instrument_serializers():
+    """Time is_valid() and .data on every DRF serializer. Safe to call more than once."""
+    for cls in (serializers.BaseSerializer, serializers.Serializer, serializers.ListSerializer):
+        attributes = vars(cls)
+        if 'is_valid' in attributes and not getattr(attributes['is_valid'], 'metrics_timed', False):
+            cls.is_valid = timed(attributes['is_valid'])
+        data = attributes.get('data')
+        if isinstance(data, property) and not getattr(data.fget, 'metrics_timed', False):
+            cls.data = property(timed(data.fget))
+
+
+def response_size(response):
+    if not response.streaming:
+        return len(response.content)
+    length = response.get('Content-Length')
+    return int(length) if length and length.isdigit() else None
+
+
+def server_timing(total, stats):
+    return (
+        f'total;dur={total * 1000:.1f}, '
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+        f'serializer;dur={stats.serializer_time * 1000:.1f}'
+    )
+
+
+def record(view, method, status, total, stats, size):
+    labels = (view, method)
+    REQUESTS.inc((view, method, str(status)))
+    REQUEST_DURATION.observe(labels, total)
+    DB_QUERIES.observe(labels, stats.queries)
+    DB_DURATION.observe(labels, stats.db_time)
+    SERIALIZER_DURATION.observe(labels, stats.serializer_time)
+    if size is not None:
+        RESPONSE_SIZE.observe(labels, size)
+
+
+class MetricsMiddleware:
+    """
+    Time each request and record it under its resolved URL name. Streaming
+    responses are measured up to the point the body starts to stream.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = get_setting('ENABLED')
+        self.server_timing = get_setting('SERVER_TIMING')
+        if self.enabled:
+            instrument_serializers()
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        total = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match._func_path) if match else UNMATCHED
+        record(view, request.method, response.status_code, total, stats, response_size(response))
+        if self.server_timing:
+            response['Server-Timing'] = server_timing(total, stats)
+        return response
+
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    for metric in METRICS:
+        metric.clear()
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint for this process's metrics."""
+    token = get_setting('TOKEN')
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -2,4 +2,22 @@ from django.middleware.csrf import CsrfViewMiddleware
 
 class DisableCSRFMiddleware(CsrfViewMiddleware):
     def process_view(self, request, callback, callback_args, callback_kwargs):
-        return None 
\ No newline at end of file
+        return None
+
+
+class RateLimitHeadersMiddleware:
+    """
+    Expose the quota recorded by zencare.throttling on the response:
+    X-RateLimit-Limit, X-RateLimit-Remaining and X-RateLimit-Reset (epoch seconds).
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        quota = getattr(request, 'rate_limit', None)
+        if quota is not None:
+            response['X-RateLimit-Limit'] = str(quota['limit'])
+            response['X-RateLimit-Remaining'] = str(quota['remaining'])
+            response['X-RateLimit-Reset'] = str(quota['reset'])
+        return response
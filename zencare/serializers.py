@@ -0,0 +1,83 @@
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def get_sparse_fields(request):
+    """
+    Parse ?fields=a,b and ?omit=c from a read request.
+
+    Returns (fields, omit): fields is None when every field was requested.
+    Write requests always get the full representation.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None, set()
+    params = getattr(request, 'query_params', request.GET)
+    fields = {name.strip() for name in params.get('fields', '').split(',') if name.strip()}
+    omit = {name.strip() for name in params.get('omit', '').split(',') if name.strip()}
+    return fields or None, omit
+
+
+def is_field_requested(name, fields, omit):
+    return name not in omit and (fields is None or name in fields)
+
+
+def trim_representation(rows, request):
+    """Apply ?fields= / ?omit= to already-serialized rows (e.g. cached snapshots)."""
+    fields, omit = get_sparse_fields(request)
+    if fields is None and not omit:
+        return rows
+    return [{key: value for key, value in row.items() if is_field_requested(key, fields, omit)} for row in rows]
+
+
+class SparseFieldsetMixin:
+    """
+    Lets clients ask for a subset of a serializer's fields with ?fields= and
+    ?omit=. Fields that aren't requested are dropped before serialization, so
+    their SerializerMethodField code never runs.
+
+    Only the top-level serializer of a read request is trimmed; nested and
+    write serializers keep all their fields.
+
+    `field_relations` maps output fields to the relations they read, so views
+    can select_related only what the response needs (see optimize_queryset).
+    """
+    field_relations = {}
+
+    def _is_root_serializer(self):
+        root = self.root
+        return root is self or (isinstance(root, serializers.ListSerializer) and root.child is self)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self._is_root_serializer():
+            return fields
+
+        requested, omit = get_sparse_fields(self.context.get('request'))
+        if requested is None and not omit:
+            return fields
+        for name in list(fields):
+            if not is_field_requested(name, requested, omit):
+                fields.pop(name)
+        return fields
+
+    @classmethod
+    def related_for_request(cls, request):
+        """Relations needed by the fields this request will actually render."""
+        requested, omit = get_sparse_fields(request)
+        related = []
+        for name, relations in cls.field_relations.items():
+            if not is_field_requested(name, requested, omit):
+                continue
+            for relation in relations:
+                if relation not in related:
+                    related.append(relation)
+        return related
+
+    @classmethod
+    def optimize_queryset(cls, queryset, request):
+        requested, omit = get_sparse_fields(request)
+        if requested is not None or omit:
+            # Drop default joins the trimmed response won't read
+            queryset = queryset.select_related(None)
+        related = cls.related_for_request(request)
+        return queryset.select_related(*related) if related else queryset
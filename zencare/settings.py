@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import sys
+import tempfile
 from datetime import timedelta
 from dotenv import load_dotenv
 import dj_database_url
@@ -46,6 +48,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # Trigram lookups for doctor search
     'rest_framework',
     'rest_framework_simplejwt',
     'corsheaders',
@@ -54,15 +57,19 @@ INSTALLED_APPS = [
     'backapp',
     'appointment',
     'notifications',  # Add notifications app
+    'analytics',  # Rollups for management reporting
 ]
 
 MIDDLEWARE = [
+    'zencare.logging.RequestIDMiddleware',  # X-Request-ID, also stamped on log records
+    'zencare.metrics.MetricsMiddleware',  # Server-Timing header and /metrics histograms
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # For serving static files
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'zencare.middleware.DisableCSRFMiddleware',  # Custom CSRF middleware that exempts all routes
+    'zencare.middleware.RateLimitHeadersMiddleware',  # X-RateLimit-* headers from zencare.throttling
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -86,9 +93,22 @@ CORS_ALLOW_HEADERS = [
     'origin',
     'user-agent',
     'x-csrftoken',
+    'upload-offset',
     'x-requested-with',
 ]
 
+# Let browser clients read the remaining-quota headers
+CORS_EXPOSE_HEADERS = [
+    'retry-after',
+    'x-ratelimit-limit',
+    'x-ratelimit-remaining',
+    'x-ratelimit-reset',
+    'upload-offset',
+    'content-range',
+    'accept-ranges',
+    'etag',
+]
+
 CORS_ALLOW_METHODS = [
     'DELETE',
     'GET',
@@ -155,6 +175,49 @@ DATABASES = {
     )
 }
 
+# Shared cache used by all workers (login counters, throttling, snapshots).
+# Redis when REDIS_URL is set, otherwise a database table that migrations
+# create (backapp 0010 runs createcachetable). Production needs Redis: throttle and
+# login failure counters rely on its atomic incr(), which the database cache
+# emulates with a read and a write that concurrent workers can interleave.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'zencare_cache',
+        }
+    }
+
+
+# Password hashing
+# PASSWORD_HASH_ITERATIONS tunes the PBKDF2 work factor; existing hashes are
+# upgraded transparently on the next successful login.
+PASSWORD_HASHERS = [
+    'backapp.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = int(os.getenv('PASSWORD_HASH_ITERATIONS', '870000'))
+
+# Login brute-force protection (failure counters live in the shared cache)
+LOGIN_PROTECTION = {
+    'ACCOUNT_FAILURE_LIMIT': 5,
+    'IP_FAILURE_LIMIT': 50,
+    'FAILURE_WINDOW': 15 * 60,  # seconds
+    'LOCKOUT_BASE': 30,  # seconds, doubled for every failure past the limit
+    'LOCKOUT_MAX': 60 * 60,
+    'TRUST_X_FORWARDED_FOR': os.getenv('TRUST_X_FORWARDED_FOR', 'False') == 'True',
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -198,6 +261,12 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Hash uploads while they stream in, for content-addressed report storage
+FILE_UPLOAD_HANDLERS = [
+    'zencare.upload_handlers.HashingMemoryFileUploadHandler',
+    'zencare.upload_handlers.HashingTemporaryFileUploadHandler',
+]
+
 # Cloudinary settings for media files in production
 if not DEBUG:
     CLOUDINARY_STORAGE = {
@@ -216,21 +285,64 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'backapp.User'
 
 # Logging configuration
+# JSON lines written from a background thread (zencare.logging), tagged with
+# the request id. SQL debug logging is sampled so DJANGO_LOG_LEVEL=DEBUG stays usable.
+#
+# LOG_FILE=- writes to stdout. Use that (or one LOG_FILE per process) when
+# running several workers, e.g. under gunicorn: RotatingFileHandler doesn't
+# coordinate between processes, so workers sharing a file lose and clobber
+# records when one of them rotates it.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+# `manage.py test` logs to a temporary file rather than into the checkout
+TESTING = sys.argv[1:2] == ['test']
+LOG_FILE = os.getenv('LOG_FILE') or str(
+    Path(tempfile.gettempdir()) / 'zencare-test.log' if TESTING else BASE_DIR / 'zencare.log'
+)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {
+            '()': 'zencare.logging.RequestIDFilter',
+        },
+        'sampling': {
+            '()': 'zencare.logging.SamplingFilter',
+            'rates': {'django.db.backends': 0.01},
+        },
+    },
+    'formatters': {
+        'json': {
+            '()': 'zencare.logging.JSONFormatter',
+        },
+    },
     'handlers': {
-        'file': {
-            'level': 'DEBUG',
-            'class': 'logging.FileHandler',
-            'filename': 'debug.log',
+        'output': {
+            'class': 'logging.StreamHandler',
+            'stream': 'ext://sys.stdout',
+            'formatter': 'json',
+        } if LOG_FILE == '-' else {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': LOG_FILE,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+            'formatter': 'json',
         },
+        # Named to sort after 'output', which it writes to
+        'queue': {
+            '()': 'zencare.logging.QueueListenerHandler',
+            'handlers': ['output'],
+            'filters': ['request_id', 'sampling'],
+        },
+    },
+    'root': {
+        'handlers': ['queue'],
+        'level': LOG_LEVEL,
     },
     'loggers': {
         'django': {
-            'handlers': ['file'],
-            'level': 'DEBUG',
-            'propagate': True,
+            'level': os.getenv('DJANGO_LOG_LEVEL', 'INFO'),
         },
     },
 }
@@ -245,13 +357,19 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # Sliding-window throttles on the shared cache, so limits hold across workers
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'zencare.throttling.AnonSlidingWindowThrottle',
+        'zencare.throttling.UserSlidingWindowThrottle',
+        'zencare.throttling.ScopedSlidingWindowThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/day',
-        'user': '1000/day'
+        'user': '1000/day',
+        # Per-view scopes (set `throttle_scope` on the view)
+        'login': '20/min',
+        'register': '10/hour',
+        'password_reset': '5/hour',
     }
 }
 
@@ -273,6 +391,73 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# Refresh token revocation (Bloom filter in front of backapp.RevokedToken)
+TOKEN_REVOCATION = {
+    'FILTER_REBUILD_INTERVAL': 300,  # seconds
+    'FILTER_FALSE_POSITIVE_RATE': 0.01,
+    'RECENT_SYNC_INTERVAL': 5,  # seconds
+}
+
+LAB_QUEUE = {
+    'LEASE_SECONDS': 30 * 60,
+    'MAX_CLAIM': 20,
+    'AUTO_ASSIGN': True,
+    'PRIORITIZE_BY_APPOINTMENT_DATE': False,
+}
+
+# Chunked report uploads (appointment.uploads); sizes in bytes
+REPORT_UPLOADS = {
+    'MAX_SIZES': {
+        'mri': 500 * 1024 * 1024,
+        'ct_scan': 500 * 1024 * 1024,
+        'x_ray': 100 * 1024 * 1024,
+        'ultrasound': 100 * 1024 * 1024,
+    },
+    'DEFAULT_MAX_SIZE': 25 * 1024 * 1024,
+    'MAX_CHUNK_SIZE': 8 * 1024 * 1024,
+}
+# Partial uploads live here; every web worker must see the same directory
+if os.getenv('REPORT_UPLOAD_SPOOL_DIR'):
+    REPORT_UPLOADS['SPOOL_DIR'] = os.getenv('REPORT_UPLOAD_SPOOL_DIR')
+
+# Report downloads (appointment.downloads). Set REPORT_DOWNLOAD_OFFLOAD to 'nginx'
+# or 'apache' when the web server can send MEDIA_ROOT files itself.
+REPORT_DOWNLOADS = {
+    'OFFLOAD': os.getenv('REPORT_DOWNLOAD_OFFLOAD') or None,
+    'NGINX_LOCATION': '/protected-media/',
+}
+
+# Thumbnails/previews of image reports (appointment.renditions)
+REPORT_RENDITIONS = {
+    'WORKERS': int(os.getenv('REPORT_RENDITION_WORKERS', 2)),
+}
+
+# Admin dashboard (admin_customization.dashboard). Counters are kept by signals;
+# run `manage.py reconcile_dashboard_counters` periodically to correct drift.
+ADMIN_DASHBOARD = {
+    'FEED_TIMEOUT': 300,
+    'FEED_SIZE': 20,
+}
+
+# Occupancy analytics (analytics.occupancy)
+ANALYTICS = {
+    'CACHE_TIMEOUT': 10 * 60,  # seconds a date range's report is reused
+    'CHUNK_SIZE': 50_000,  # appointment rows per NumPy batch
+}
+
+# Batched notification emails (bulk status changes) are sent from this many
+# background threads; 0 sends them inline after commit
+NOTIFICATIONS = {
+    'EMAIL_WORKERS': int(os.getenv('NOTIFICATION_EMAIL_WORKERS', 1)),
+}
+
+# Per-request timings (zencare.metrics); /metrics wants this bearer token
+METRICS = {
+    'ENABLED': os.getenv('METRICS_ENABLED', 'True') == 'True',
+    'SERVER_TIMING': True,
+    'TOKEN': os.getenv('METRICS_TOKEN'),
+}
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'  # For Gmail
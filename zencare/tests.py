@@ -0,0 +1,282 @@
+import json
+import logging
+import sys
+from datetime import date, time
+from pathlib import Path
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient, APIRequestFactory
+
+from appointment.models import Appointment
+from appointment.serializers import AppointmentSerializer
+from backapp.models import User
+from . import metrics
+from .logging import JSONFormatter, QueueListenerHandler, RequestIDFilter, SamplingFilter
+from .throttling import SlidingWindowRateThrottle
+
+
+class FakeClockThrottle(SlidingWindowRateThrottle):
+    rate = '10/min'
+
+    def __init__(self, cache, now):
+        super().__init__()
+        self.cache = cache
+        self.clock = now
+
+    def timer(self):
+        return self.clock
+
+    def get_cache_key(self, request, view):
+        return 'throttle:test:1'
+
+
+class SlidingWindowTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = LocMemCache('throttle-tests', {})
+        self.cache.clear()
+
+    def allow(self, now):
+        request = SimpleNamespace()
+        throttle = FakeClockThrottle(self.cache, now)
+        return throttle.allow_request(request, None), throttle, request
+
+    def test_limit_within_window(self):
+        for _ in range(10):
+            self.assertTrue(self.allow(30)[0])
+
+        allowed, throttle, request = self.allow(45)
+        self.assertFalse(allowed)
+        self.assertEqual(throttle.wait(), 15)
+        self.assertEqual(request.rate_limit, {'limit': 10, 'remaining': 0, 'reset': 60})
+
+    def test_previous_window_is_weighted(self):
+        for _ in range(10):
+            self.allow(30)
+
+        # Halfway into the next window the 10 earlier requests weigh 5
+        results = [self.allow(90)[0] for _ in range(6)]
+        self.assertEqual(results, [True] * 5 + [False])
+
+        # A window later they no longer count
+        self.assertTrue(self.allow(150)[0])
+
+    def test_remaining(self):
+        for _ in range(3):
+            allowed, _, request = self.allow(10)
+        self.assertTrue(allowed)
+        self.assertEqual(request.rate_limit['remaining'], 7)
+
+
+class ThrottleResponseTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_rate_limit_headers(self):
+        response = self.client.post('/api/v1/auth/login/', {}, format='json', HTTP_HOST='localhost')
+
+        self.assertEqual(response.status_code, 400)
+        # The login scope (20/min) is the tightest limit
+        self.assertEqual(response['X-RateLimit-Limit'], '20')
+        self.assertEqual(response['X-RateLimit-Remaining'], '19')
+        self.assertTrue(response['X-RateLimit-Reset'].isdigit())
+
+    def test_throttled(self):
+        for _ in range(20):
+            self.client.post('/api/v1/auth/login/', {}, format='json', HTTP_HOST='localhost')
+
+        response = self.client.post('/api/v1/auth/login/', {}, format='json', HTTP_HOST='localhost')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(response['X-RateLimit-Remaining'], '0')
+
+
+class SparseFieldsetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = User.objects.create_user(email='doc@example.com', password='x', user_type='doctor', profession='dentist')
+        cls.patient = User.objects.create_user(email='pat@example.com', password='x', user_type='patient')
+        Appointment.objects.create(
+            patient=cls.patient, doctor=cls.doctor, appointment_date=date(2030, 5, 6), appointment_time=time(9),
+            symptoms='cough',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+
+    def rows(self, **params):
+        response = self.client.get('/api/v1/appointment/', params, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_fields(self):
+        self.assertEqual(self.rows(fields='id,status'), [{'id': Appointment.objects.get().pk, 'status': 'pending'}])
+
+    def test_omit(self):
+        [row] = self.rows(omit='symptoms,doctor_name')
+        self.assertNotIn('symptoms', row)
+        self.assertNotIn('doctor_name', row)
+        self.assertIn('patient_name', row)
+
+    def test_unused_joins_dropped(self):
+        factory = APIRequestFactory()
+        queryset = Appointment.objects.select_related('doctor', 'patient')
+
+        trimmed = AppointmentSerializer.optimize_queryset(queryset, factory.get('/', {'fields': 'id,status'}))
+        self.assertNotIn('JOIN', str(trimmed.query))
+
+        names = AppointmentSerializer.optimize_queryset(queryset, factory.get('/', {'fields': 'id,doctor_name'}))
+        self.assertEqual(str(names.query).count('JOIN'), 1)
+
+        # Writes always get the full representation
+        write = AppointmentSerializer.optimize_queryset(queryset, factory.post('/?fields=id'))
+        self.assertEqual(str(write.query).count('JOIN'), 2)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class LoggingTests(TestCase):
+
+    def make_record(self, name='appointment.views', level=logging.INFO, msg='hello %s', args=('world',), **extra):
+        record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_request_id_header(self):
+        client = APIClient()
+        response = client.get('/api/v1/appointment/', HTTP_HOST='localhost', HTTP_X_REQUEST_ID='abc-123')
+        self.assertEqual(response['X-Request-ID'], 'abc-123')
+
+        response = client.get('/api/v1/appointment/', HTTP_HOST='localhost', HTTP_X_REQUEST_ID='bad id\n')
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
+
+    def test_request_id_on_records(self):
+        patient = User.objects.create_user(email='pat@example.com', password='x', user_type='patient')
+        client = APIClient()
+        client.force_authenticate(patient)
+        handler = ListHandler()
+        handler.addFilter(RequestIDFilter())
+        logger = logging.getLogger('appointment.views')
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        self.addCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.DEBUG)
+
+        client.post('/api/v1/appointment/create/', {'doctor': 0, 'symptoms': 'private'},
+                    format='json', HTTP_HOST='localhost', HTTP_X_REQUEST_ID='req-1')
+
+        self.assertTrue(handler.records)
+        self.assertEqual({record.request_id for record in handler.records}, {'req-1'})
+        # Only field names are logged, never the values
+        self.assertNotIn('private', ' '.join(record.getMessage() for record in handler.records))
+
+    def test_json_formatter(self):
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            record = self.make_record(request_id='req-1', appointment_id=7)
+            record.exc_info = sys.exc_info()
+
+        entry = json.loads(JSONFormatter().format(record))
+
+        self.assertEqual(entry['message'], 'hello world')
+        self.assertEqual(entry['level'], 'INFO')
+        self.assertEqual(entry['logger'], 'appointment.views')
+        self.assertEqual(entry['request_id'], 'req-1')
+        self.assertEqual(entry['appointment_id'], 7)
+        self.assertIn('ValueError: boom', entry['exception'])
+
+    def test_sampling_filter(self):
+        sampler = SamplingFilter(rates={'django.db.backends': 0})
+
+        self.assertFalse(sampler.filter(self.make_record('django.db.backends', logging.DEBUG)))
+        self.assertFalse(sampler.filter(self.make_record('django.db.backends.schema', logging.DEBUG)))
+        self.assertTrue(sampler.filter(self.make_record('django.db.backends', logging.WARNING)))
+        self.assertTrue(sampler.filter(self.make_record('django.db', logging.DEBUG)))
+
+    def test_test_runs_log_outside_the_checkout(self):
+        self.assertFalse(Path(settings.LOG_FILE).resolve().is_relative_to(Path(settings.BASE_DIR).resolve()))
+
+    def test_queue_handler(self):
+        target = ListHandler()
+        target.set_name('test-list')
+        self.addCleanup(target.close)
+        handler = QueueListenerHandler(['test-list'])
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            record = self.make_record(request_id='req-1')
+            record.exc_info = sys.exc_info()
+        handler.handle(record)
+        # Stopping drains the queue
+        handler.close()
+
+        [written] = target.records
+        self.assertEqual(written.getMessage(), 'hello world')
+        self.assertEqual(written.request_id, 'req-1')
+        self.assertIn('ValueError: boom', written.exc_text)
+        self.assertIsNone(written.exc_info)
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    @override_settings(METRICS={'TOKEN': 'secret'})
+    def test_request_metrics(self):
+        patient = User.objects.create_user(email='pat@example.com', password='x', user_type='patient')
+        doctor = User.objects.create_user(email='doc@example.com', password='x', user_type='doctor', profession='dentist')
+        Appointment.objects.create(patient=patient, doctor=doctor, appointment_date=date(2030, 5, 6), appointment_time=time(9))
+        client = APIClient()
+        client.force_authenticate(patient)
+
+        response = client.get('/api/v1/appointment/', HTTP_HOST='localhost')
+
+        self.assertEqual(response.status_code, 200)
+        timing = dict(part.strip().split(';', 1) for part in response['Server-Timing'].split(','))
+        self.assertEqual(set(timing), {'total', 'db', 'serializer'})
+        self.assertRegex(timing['db'], r'desc="[1-9]\d* queries"')
+
+        self.assertEqual(self.client.get('/metrics', HTTP_HOST='localhost').status_code, 403)
+        response = self.client.get('/metrics', HTTP_HOST='localhost', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('zencare_http_requests_total{view="appointment:appointment-list",method="GET",status="200"} 1', body)
+        self.assertIn('zencare_http_request_duration_seconds_count{view="appointment:appointment-list",method="GET"} 1', body)
+        self.assertIn('zencare_http_response_size_bytes_bucket{view="appointment:appointment-list",method="GET",le="+Inf"} 1', body)
+        # The list was serialized, so some time was recorded
+        sample = next(line for line in body.splitlines()
+                      if line.startswith('zencare_http_serializer_duration_seconds_sum{view="appointment:appointment-list"'))
+        self.assertGreater(float(sample.rsplit(' ', 1)[1]), 0)
+
+    def test_histogram(self):
+        histogram = metrics.Histogram('test_queries', 'Queries.', ('view',), (1, 5))
+        for value in (0, 1, 3, 7):
+            histogram.observe(('a',), value)
+
+        self.assertEqual(histogram.render()[2:], [
+            'test_queries_bucket{view="a",le="1"} 2',
+            'test_queries_bucket{view="a",le="5"} 3',
+            'test_queries_bucket{view="a",le="+Inf"} 4',
+            'test_queries_sum{view="a"} 11',
+            'test_queries_count{view="a"} 4',
+        ])
@@ -0,0 +1,136 @@
+from django.core.cache import cache as default_cache
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    """
+    Sliding-window counter throttle backed by the shared cache.
+
+    Instead of storing a history list per client, each client has one counter
+    per fixed window. The previous window's count is weighted by how much of
+    it still overlaps the sliding window, so every check is a single
+    get_many plus one incr, no matter how many requests were made.
+    Counters are shared by all workers as long as CACHES points at a shared
+    backend. Only Redis makes incr() atomic: the database cache implements it
+    as a read followed by a write, so concurrent requests can lose increments
+    and the limits become approximate. Production needs REDIS_URL.
+    """
+    cache = default_cache
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window = self.duration
+        bucket = int(self.now // window)
+        current_key = f'{self.key}:{bucket}'
+        previous_key = f'{self.key}:{bucket - 1}'
+
+        counts = self.cache.get_many([current_key, previous_key])
+        elapsed = (self.now % window) / window
+        self.estimate = counts.get(previous_key, 0) * (1 - elapsed) + counts.get(current_key, 0)
+        self.reset = (bucket + 1) * window
+
+        allowed = self.estimate < self.num_requests
+        if allowed:
+            # Keep the counter long enough to serve as the next "previous" window
+            self.cache.add(current_key, 0, window * 2)
+            try:
+                self.cache.incr(current_key)
+            except ValueError:
+                self.cache.set(current_key, 1, window * 2)
+            self.estimate += 1
+
+        self.record_quota(request)
+        return allowed
+
+    def record_quota(self, request):
+        """Remember the tightest quota seen so middleware can expose it as headers."""
+        remaining = max(int(self.num_requests - self.estimate), 0)
+        http_request = getattr(request, '_request', request)
+        quota = getattr(http_request, 'rate_limit', None)
+        if quota is None or remaining < quota['remaining']:
+            http_request.rate_limit = {
+                'limit': self.num_requests,
+                'remaining': remaining,
+                'reset': int(self.reset),
+            }
+
+    def wait(self):
+        return max(self.reset - self.now, 0)
+
+
+class AnonSlidingWindowThrottle(SlidingWindowRateThrottle):
+    """
+    Limits the rate of API calls that may be made by anonymous users,
+    keyed by client IP.
+    """
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None  # Only throttle unauthenticated requests.
+
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_ident(request)
+        }
+
+
+class UserSlidingWindowThrottle(SlidingWindowRateThrottle):
+    """
+    Limits the rate of API calls that may be made by a given user,
+    keyed by user id (or client IP for anonymous requests).
+    """
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': ident
+        }
+
+
+class ScopedSlidingWindowThrottle(SlidingWindowRateThrottle):
+    """
+    Per-view limits: views set `throttle_scope` and the rate is looked up in
+    DEFAULT_THROTTLE_RATES under that name. Views without a scope are not
+    throttled by this class.
+    """
+    scope_attr = 'throttle_scope'
+
+    def __init__(self):
+        # Skip SimpleRateThrottle.__init__: it looks up the rate for
+        # self.scope, which is only known once allow_request() has the view
+        pass
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': ident
+        }
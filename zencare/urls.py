@@ -24,6 +24,7 @@ from django.views.generic import RedirectView
 from django.contrib.auth import views as auth_views
 from admin_customization.admin import zencare_admin  # Import the custom admin site
 from django.views.decorators.csrf import csrf_exempt
+from zencare.metrics import metrics_view
 
 urlpatterns = [
     path('', RedirectView.as_view(url='/api/v1/')),  # Redirect root URL to API homepage
@@ -31,6 +32,8 @@ urlpatterns = [
     path('api/v1/', include('backapp.urls')),
     path('api/v1/appointment/', include('appointment.urls')),
     path('api/v1/', include('notifications.urls')),  # Include notifications URLs
+    path('api/v1/analytics/', include('analytics.urls')),
+    path('metrics', metrics_view, name='metrics'),
     # Password reset URLs - with CSRF exemption for API access
     path('api/v1/auth/password_reset/', csrf_exempt(auth_views.PasswordResetView.as_view()), name='password_reset'),
     path('api/v1/auth/password_reset/done/', csrf_exempt(auth_views.PasswordResetDoneView.as_view()), name='password_reset_done'),